@@ -1,17 +1,51 @@
-from flask import Flask, render_template, jsonify, send_file, session, request, redirect, url_for
-from datetime import datetime
-import io
-import matplotlib.pyplot as plt
-import matplotlib
-matplotlib.use('Agg')  # Use Agg backend for non-interactive mode
-import seaborn as sns
-from utils.stocks import get_stock_data, get_historical_stock_data
+from flask import Flask, render_template, jsonify, make_response, session, request, redirect, url_for, Response, g
+from flask.json.provider import DefaultJSONProvider
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from dotenv import load_dotenv
+load_dotenv()  # Load API keys and tuning settings before the providers read them
+from utils.stocks import get_stock_data
 from utils.weather import get_weather_data, get_historical_weather_data
-from utils.news import get_space_news
+from utils.news import get_space_news, get_news_page, search_news
+from utils.news_store import news_store, tokenize
+from utils.dashboard import get_dashboard_data, get_dashboard_snapshot, split_tracked, PLANETS
+from utils.snapshot import snapshot
+from utils.scheduler import start_prefetching, refresh_tracked_symbols
+from utils.chart_cache import chart_cache, data_version
+from utils.charts import submit_render, CHART_RENDER_TIMEOUT
+from utils.downsample import lttb_indices
+from utils.ratelimit import get_budget_status
+from utils.series import OHLCVSeries
+from utils.indicators import (parse_indicators, get_indicator_history, get_stock_indicators, indicators_to_json,
+                              INDICATOR_HISTORY_DAYS)
+from utils.watchlist import (get_user_watchlist, set_user_watchlist, page_symbols, MAX_WATCHLIST_SIZE,
+                             MAX_ANONYMOUS_WATCHLIST_SIZE)
+from utils.broadcast import broadcaster, encode_snapshot
+from utils.response_cache import response_cache, supported_encodings
+from utils.metrics import Histogram, render_metrics
+from utils.preload import preload
+
+class DashboardJSONProvider(DefaultJSONProvider):
+    """JSON provider that also serializes OHLCV history series."""
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, OHLCVSeries):
+            return o.to_dict()
+        return DefaultJSONProvider.default(o)
+
+# Import any stacks configured with PRELOAD now rather than on first use
+preload()
 
 app = Flask(__name__)
+app.json = DashboardJSONProvider(app)
 app.secret_key = 'your-secret-key-here'  # Required for session
 
+# Keep dashboard data warm in the background so requests only read the snapshot
+PREFETCH_ENABLED = os.getenv('PREFETCH_ENABLED', '1') == '1'
+
 # Default card order
 DEFAULT_CARD_ORDER = ['weather', 'stocks', 'news']
 
@@ -23,144 +57,201 @@ def set_card_order(new_order):
     """Set the new card order in session."""
     session['card_order'] = new_order
 
-# Set dark theme for plots
-plt.style.use('dark_background')
-sns.set_theme(style="darkgrid")
+# Stocks shown per page on the dashboard and by /api/stocks
+STOCKS_PAGE_SIZE = int(os.getenv('STOCKS_PAGE_SIZE', 50))
+MAX_STOCKS_PAGE_SIZE = 200
+
+# Articles per page from /api/news and /api/news/search
+NEWS_PAGE_SIZE = int(os.getenv('NEWS_PAGE_SIZE', 20))
+MAX_NEWS_PAGE_SIZE = 100
+
+def get_user_id():
+    """Return the id the user's server-side watchlist is stored under, creating one if needed."""
+    if 'user_id' not in session:
+        session['user_id'] = uuid.uuid4().hex
+        g.new_session = True
+    return session['user_id']
+
+def get_watchlist_limit():
+    """Return how many symbols the user may save: few until their browser has sent the session cookie back."""
+    get_user_id()
+    return MAX_ANONYMOUS_WATCHLIST_SIZE if g.get('new_session') else MAX_WATCHLIST_SIZE
+
+def get_paging(default_per_page, max_per_page, total=None):
+    """Return (page, per_page) from ?page= and ?per_page=, kept within the known pages when total is given."""
+    per_page = min(max(request.args.get('per_page', default_per_page, type=int) or default_per_page, 1),
+                   max_per_page)
+    page = max(request.args.get('page', 1, type=int) or 1, 1)
+    if total is not None:
+        page = min(page, max(1, -(-total // per_page)))
+    return page, per_page
+
+def add_paging_headers(response, endpoint, page, per_page, total, **args):
+    """Send the total count and the neighbouring pages in X-Total-Count and Link headers."""
+    response.headers['X-Total-Count'] = str(total)
+    links = []
+    if page > 1:
+        links.append(f'<{url_for(endpoint, page=page - 1, per_page=per_page, **args)}>; rel="prev"')
+    if page * per_page < total:
+        links.append(f'<{url_for(endpoint, page=page + 1, per_page=per_page, **args)}>; rel="next"')
+    if links:
+        response.headers['Link'] = ', '.join(links)
+    return response
+
+def get_stock_page():
+    """Return (symbols on the requested page, page, per_page, total) of the user's watchlist."""
+    symbols = get_user_watchlist(get_user_id())
+    page, per_page = get_paging(STOCKS_PAGE_SIZE, MAX_STOCKS_PAGE_SIZE, len(symbols))
+    return page_symbols(symbols, page, per_page), page, per_page, len(symbols)
+
+def update_watchlist(symbols):
+    """Save the user's watchlist and start fetching any symbols that are new."""
+    symbols = set_user_watchlist(get_user_id(), symbols, get_watchlist_limit())
+    refresh_tracked_symbols()
+    return symbols
+
+# Render parameters shared by every chart; part of the chart cache key
+CHART_PARAMS = {'figsize': (10, 6), 'dpi': 100}
+
+# Indicators drawn over stock charts unless the request asks for others with ?overlays=
+CHART_STOCK_OVERLAYS = os.getenv('CHART_STOCK_OVERLAYS', 'sma:10,bollinger:20')
 
-def check_api_limits(data):
-    """Check if any API calls have hit their limits."""
+# Seconds browsers may reuse a chart before revalidating it with its ETag
+CHART_MAX_AGE = int(os.getenv('CHART_MAX_AGE', 60))
+
+# Pixel width assumed by /api/charts/* when the browser does not send ?width=;
+# series are cut down to one point per pixel
+CHART_DEFAULT_WIDTH = int(os.getenv('CHART_DEFAULT_WIDTH', 800))
+MAX_CHART_WIDTH = 4096
+
+def check_api_limits():
+    """Check if any API has used up its call budget for today."""
     api_limits = []
-    
-    # Check weather API limits
-    if isinstance(data.get('weather_data'), dict):
-        for planet, weather in data['weather_data'].items():
-            if weather.get('note') and ('API limit' in weather['note'] or 'quota' in weather['note'].lower()):
-                api_limits.append(f"Weather API ({planet}): {weather['note']}")
-    
-    # Check stock API limits
-    if isinstance(data.get('stocks_data'), dict):
-        for symbol, stock in data['stocks_data'].items():
-            if stock.get('note') and ('API limit' in stock['note'] or 'quota' in stock['note'].lower()):
-                api_limits.append(f"Stock API ({symbol}): {stock['note']}")
-    
-    # Check news API limits
-    if isinstance(data.get('news_data'), dict) and data['news_data'].get('note'):
-        if 'API limit' in data['news_data']['note'] or 'quota' in data['news_data']['note'].lower():
-            api_limits.append(f"News API: {data['news_data']['note']}")
-    
+    for budget in get_budget_status():
+        if not budget['exhausted']:
+            continue
+        if budget['quota'] is not None and budget['used'] >= budget['quota']:
+            api_limits.append(f"{budget['name']}: daily quota of {budget['quota']} calls used")
+        else:
+            api_limits.append(f"{budget['name']}: the provider reported its limit was reached")
     return api_limits
 
-def generate_stock_chart(symbol):
-    """Generate a stock price history chart using Matplotlib."""
-    try:
-        # Get historical data
-        historical_data = get_historical_stock_data(symbol)
-        if not historical_data:
-            return None
-
-        # Create figure and axis
-        fig, ax = plt.subplots(figsize=(10, 6))
-        
-        # Plot the data
-        ax.plot(historical_data['timestamp'], historical_data['close'], 
-                label='Close Price', linewidth=2)
-        
-        # Customize the plot
-        ax.set_title(f'{symbol} Stock Price History', pad=20)
-        ax.set_xlabel('Date')
-        ax.set_ylabel('Price ($)')
-        ax.grid(True, alpha=0.3)
-        ax.legend()
-        
-        # Rotate x-axis labels for better readability
-        plt.xticks(rotation=45)
-        
-        # Adjust layout to prevent label cutoff
-        plt.tight_layout()
-        
-        # Save plot to a bytes buffer
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png', dpi=100, bbox_inches='tight')
-        buf.seek(0)
-        plt.close()
-        
-        return buf
-    except Exception as e:
-        print(f"Error generating stock chart: {e}")
-        return None
+def generate_stock_chart(symbol, historical_data, indicators=None):
+    """Submit a stock price history chart render and return a Future of its PNG bytes."""
+    overlays, bands = [], []
+    for label, outputs in (indicators or {}).items():
+        name = label.replace('_', ' ').upper()
+        if 'upper' in outputs:
+            bands.append((name, outputs['lower'], outputs['upper']))
+            overlays.append((f'{name} middle', outputs['middle']))
+        else:
+            overlays.extend((name, values) for values in outputs.values())
+    return submit_render(dates=historical_data.dates,
+                         values=historical_data.close,
+                         title=f'{symbol} Stock Price History',
+                         ylabel='Price ($)',
+                         label='Close Price',
+                         overlays=overlays,
+                         bands=bands,
+                         **CHART_PARAMS)
+
+def generate_weather_chart(planet, historical_data):
+    """Submit a weather history chart render and return a Future of its PNG bytes."""
+    return submit_render(dates=[data['date'] for data in historical_data],
+                         values=[data['temperature'] for data in historical_data],
+                         title=f'{planet.capitalize()} Temperature History',
+                         ylabel='Temperature (°C)',
+                         label='Temperature',
+                         **CHART_PARAMS)
 
-def generate_weather_chart(planet):
-    """Generate a weather history chart using Matplotlib."""
+def weather_chart_series(planet, historical_data, points):
+    """Return a weather history as JSON-ready lists, oldest day first, cut down to `points` days."""
+    days = sorted(historical_data, key=lambda data: data['date'])
+    temperatures = [data.get('temperature') for data in days]
+    keep = lttb_indices([float('nan') if value is None else value for value in temperatures], points)
+    return {
+        'planet': planet,
+        'date': [days[index]['date'] for index in keep],
+        'temperature': [temperatures[index] for index in keep]
+    }
+
+def get_chart_points(total):
+    """Return how many of total points to send for the ?width= the browser draws the chart at."""
+    width = min(max(request.args.get('width', CHART_DEFAULT_WIDTH, type=int) or CHART_DEFAULT_WIDTH, 1),
+                MAX_CHART_WIDTH)
+    return min(width, total)
+
+@app.before_request
+def ensure_prefetching():
+    """Start the prefetch scheduler in whichever process serves requests."""
+    if PREFETCH_ENABLED:
+        start_prefetching()
+
+# Expose Prometheus metrics on /metrics
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'
+
+# Add a Server-Timing header breaking each response's time down (data, render, total)
+TIMING_HEADERS = os.getenv('TIMING_HEADERS', '0') == '1'
+
+REQUEST_LATENCY = Histogram('dashboard_request_seconds',
+                            'Time to produce a response, by endpoint, method and status.',
+                            ['endpoint', 'method', 'status'])
+CHART_RENDERS = Histogram('dashboard_chart_render_seconds',
+                          'Chart render latency, including the wait for a render worker.',
+                          ['chart'])
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    g.timings = []
+
+@contextmanager
+def server_timing(name):
+    """Time a block of the current request for the Server-Timing header."""
+    started = time.perf_counter()
     try:
-        # Get historical data
-        historical_data = get_historical_weather_data(planet)
-        if not historical_data:
-            print(f"No historical data available for {planet}")
-            return None
-
-        # Create figure and axis
-        fig, ax = plt.subplots(figsize=(10, 6))
-        
-        # Extract dates and temperatures
-        try:
-            # Extract data from the list of dictionaries
-            dates = [data['date'] for data in historical_data]
-            temperatures = [data['temperature'] for data in historical_data]
-            
-            # Convert string dates to datetime objects
-            dates = [datetime.strptime(date, '%Y-%m-%d') for date in dates]
-            
-            # Plot temperature data
-            ax.plot(dates, temperatures, 
-                    label='Temperature', linewidth=2)
-            
-            # Customize the plot
-            ax.set_title(f'{planet.capitalize()} Temperature History', pad=20)
-            ax.set_xlabel('Date')
-            ax.set_ylabel('Temperature (°C)')
-            ax.grid(True, alpha=0.3)
-            ax.legend()
-            
-            # Rotate x-axis labels for better readability
-            plt.xticks(rotation=45)
-            
-            # Adjust layout to prevent label cutoff
-            plt.tight_layout()
-            
-            # Save plot to a bytes buffer
-            buf = io.BytesIO()
-            plt.savefig(buf, format='png', dpi=100, bbox_inches='tight')
-            buf.seek(0)
-            plt.close()
-            
-            return buf
-            
-        except (KeyError, ValueError) as e:
-            print(f"Error processing weather data: {e}")
-            return None
-            
-    except Exception as e:
-        print(f"Error generating weather chart: {e}")
-        return None
+        yield
+    finally:
+        g.timings.append((name, time.perf_counter() - started))
+
+@app.after_request
+def record_request_timing(response):
+    if 'request_started' not in g:
+        return response
+    elapsed = time.perf_counter() - g.request_started
+    REQUEST_LATENCY.observe(elapsed, endpoint=request.endpoint or 'unmatched', method=request.method,
+                            status=response.status_code)
+    if TIMING_HEADERS:
+        timings = g.timings + [('total', elapsed)]
+        response.headers['Server-Timing'] = ', '.join(f'{name};dur={seconds * 1000:.1f}' for name, seconds in timings)
+    return response
+
+def get_current_data(symbols):
+    """Return data for all sections, from the prefetched snapshot when enabled."""
+    if PREFETCH_ENABLED:
+        return get_dashboard_snapshot(symbols)
+    return get_dashboard_data(symbols)
 
 @app.route('/')
 def index():
     """Render the main dashboard page."""
-    # Get data for all sections
-    weather_data = get_weather_data()
-    stocks_data = get_stock_data()
-    news_data = get_space_news()
+    # Get data for all sections, with one page of the user's watchlist
+    symbols, page, per_page, total = get_stock_page()
+    with server_timing('data'):
+        data = get_current_data(symbols)
+    return render_dashboard(data, page, per_page, total)
+
+def render_dashboard(data, page, per_page, total):
+    """Render the dashboard page around data for one page of the user's watchlist."""
+    weather_data = data['weather_data']
+    stocks_data = data['stocks_data']
+    news_data = data['news_data']
     
     # Default selected planet for weather chart
     selected_planet = 'earth'
     
     # Check for API limits
-    data = {
-        'weather_data': weather_data,
-        'stocks_data': stocks_data,
-        'news_data': news_data
-    }
-    api_limits = check_api_limits(data)
+    api_limits = check_api_limits()
     
     # Get current card order
     card_order = get_card_order()
@@ -171,7 +262,11 @@ def index():
                          news_data=news_data,
                          selected_planet=selected_planet,
                          api_limits=api_limits,
-                         card_order=card_order)
+                         card_order=card_order,
+                         live_updates=PREFETCH_ENABLED,
+                         stocks_page=page,
+                         stocks_pages=max(1, -(-total // per_page)),
+                         stocks_total=total)
 
 @app.route('/reorder', methods=['POST'])
 def reorder():
@@ -181,39 +276,339 @@ def reorder():
         set_card_order(new_order)
     return redirect(url_for('index'))
 
+@app.route('/watchlist/add', methods=['POST'])
+def add_to_watchlist():
+    """Add a symbol to the user's watchlist."""
+    symbols = get_user_watchlist(get_user_id())
+    try:
+        update_watchlist(symbols + [request.form.get('symbol', '')])
+    except ValueError as e:
+        print(f"Rejected watchlist change: {str(e)}")
+        return jsonify({'error': str(e)}), 400
+    return redirect(url_for('index'))
+
+@app.route('/watchlist/remove', methods=['POST'])
+def remove_from_watchlist():
+    """Remove a symbol from the user's watchlist."""
+    symbol = request.form.get('symbol', '')
+    update_watchlist([s for s in get_user_watchlist(get_user_id()) if s != symbol])
+    return redirect(url_for('index'))
+
 @app.route('/reset-order')
 def reset_order():
     """Reset card order to default."""
     session.pop('card_order', None)
     return redirect(url_for('index'))
 
+# Seconds between keep-alive comments on an idle event stream
+STREAM_HEARTBEAT = float(os.getenv('STREAM_HEARTBEAT', 15))
+
+# Seconds before a stream is closed so the browser reconnects (and resumes with Last-Event-ID)
+STREAM_MAX_AGE = float(os.getenv('STREAM_MAX_AGE', 300))
+
+# Longest a long-poll request for /api/updates is held open
+LONG_POLL_TIMEOUT = float(os.getenv('LONG_POLL_TIMEOUT', 25))
+
+def live_updates_unavailable():
+    return jsonify({'error': 'Live updates need the prefetch scheduler (PREFETCH_ENABLED=1)'}), 503
+
+def is_visible(event, symbols):
+    """Return True if the event concerns a card this client shows."""
+    return event.section != 'stocks_data' or event.key in symbols
+
+def read_snapshot(symbols, timeout=None, quotes=None):
+    """Return the current snapshot version and the encoded dashboard payload for symbols."""
+    version = broadcaster.version
+    return version, encode_snapshot(get_dashboard_snapshot(symbols, timeout, quotes))
+
+@app.route('/stream')
+def stream():
+    """Push dashboard changes as Server-Sent Events.
+
+    Clients first get a `snapshot` event with every card, then one `update`
+    event per changed card. Every event carries the snapshot version as its
+    id, so a reconnecting browser resumes where it left off.
+    """
+    if not PREFETCH_ENABLED:
+        return live_updates_unavailable()
+    symbols = set(get_user_watchlist(get_user_id()))
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+
+    def events():
+        version = last_event_id
+        yield f'retry: {int(STREAM_HEARTBEAT * 1000)}\n\n'
+        closes_at = time.monotonic() + STREAM_MAX_AGE
+        while time.monotonic() < closes_at:
+            pending = [] if version is None else broadcaster.wait(version, STREAM_HEARTBEAT)
+            version, messages = stream_messages(version, pending, symbols)
+            yield from messages
+
+    return event_stream(events())
+
+def stream_messages(version, pending, symbols, snapshot_timeout=None, quotes=None):
+    """Return (new version, SSE messages) for the events a stream client waited for."""
+    if pending is None or version is None:
+        # New client, one that fell further behind than the buffer reaches, or one ahead of this worker
+        version, data = read_snapshot(symbols, snapshot_timeout, quotes)
+        return version, [f'id: {version}\nevent: snapshot\ndata: {data}\n\n']
+    if not pending:
+        return version, [': keep-alive\n\n']
+    return pending[-1].version, [f'id: {event.version}\nevent: update\ndata: {event.data}\n\n'
+                                 for event in pending if is_visible(event, symbols)]
+
+def event_stream(events):
+    """Wrap an iterator of SSE messages in an unbuffered event-stream response."""
+    response = Response(events, mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/updates')
+def updates():
+    """Long-poll fallback for /stream.
+
+    Waits until the snapshot moves past ?since= and returns the changed
+    cards as {"version", "events"}; without `since`, or when it is too old,
+    returns {"version", "snapshot"} with every card instead.
+    """
+    if not PREFETCH_ENABLED:
+        return live_updates_unavailable()
+    symbols = set(get_user_watchlist(get_user_id()))
+    since = request.args.get('since', type=int)
+    pending = None if since is None else broadcaster.wait(since, LONG_POLL_TIMEOUT)
+    return updates_response(since, pending, symbols)
+
+def updates_response(since, pending, symbols, snapshot_timeout=None, quotes=None):
+    """Answer a long-poll with the events after since, or the whole snapshot if pending is None."""
+    if pending is None:
+        version, data = read_snapshot(symbols, snapshot_timeout, quotes)
+        body = f'{{"version": {version}, "snapshot": {data}}}'
+    else:
+        version = pending[-1].version if pending else since
+        visible = ', '.join(event.data for event in pending if is_visible(event, symbols))
+        body = f'{{"version": {version}, "events": [{visible}]}}'
+    response = make_response(body)
+    response.mimetype = 'application/json'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+# Seconds browsers and CDNs may reuse an /api/* response before revalidating it
+API_MAX_AGE = int(os.getenv('API_MAX_AGE', 30))
+
+def send_json(key, build, private=False):
+    """Send a JSON body serialized and compressed once per data version.
+
+    `key` names the snapshot versions the body is built from (None when
+    there is no snapshot), `build` returns the data. Conditional requests
+    are answered with 304 using the body's ETag.
+    """
+    cached = response_cache.get(key, lambda: app.json.dumps(build()).encode('utf-8'))
+    encoding = request.accept_encodings.best_match(supported_encodings(), default='identity')
+    body, etag = cached.encoded(encoding)
+
+    response = make_response(body)
+    response.mimetype = 'application/json'
+    if body is not cached.body:
+        response.content_encoding = encoding
+    response.vary.add('Accept-Encoding')
+    response.set_etag(etag)
+    if private:
+        response.cache_control.private = True
+    else:
+        response.cache_control.public = True
+    response.cache_control.max_age = API_MAX_AGE
+    return response.make_conditional(request)
+
 @app.route('/api/weather')
 def weather():
-    return jsonify(get_weather_data())
+    if PREFETCH_ENABLED:
+        return send_json(('weather', snapshot.versions('weather_data', PLANETS)),
+                         lambda: get_dashboard_snapshot()['weather_data'])
+    return send_json(None, get_weather_data)
+
+def get_stocks_key(symbols):
+    """Return the snapshot versions a page of quotes is built from, or None if some are fetched per request."""
+    if split_tracked(symbols)[1]:
+        # Symbols the scheduler does not track have no snapshot version to key the body on
+        return None
+    return ('stocks', tuple(symbols), snapshot.versions('stocks_data', symbols))
 
 @app.route('/api/stocks')
 def stocks():
-    return jsonify(get_stock_data())
+    """Return quotes for one page of the user's watchlist.
+
+    Paging follows ?page= and ?per_page=; the total count and neighbouring
+    pages are sent in the X-Total-Count and Link headers.
+    """
+    symbols, page, per_page, total = get_stock_page()
+    # Watchlists are per user, so only the browser may cache the page
+    if PREFETCH_ENABLED:
+        response = send_json(get_stocks_key(symbols),
+                             lambda: get_dashboard_snapshot(symbols)['stocks_data'], private=True)
+    else:
+        response = send_json(None, lambda: get_stock_data(symbols), private=True)
+    return add_paging_headers(response, 'stocks', page, per_page, total)
+
+@app.route('/api/watchlist', methods=['GET', 'PUT'])
+def watchlist():
+    """Return or replace the user's watchlist ({"symbols": [...]})."""
+    if request.method == 'PUT':
+        symbols = (request.get_json(silent=True) or {}).get('symbols')
+        if not isinstance(symbols, list) or not all(isinstance(symbol, str) for symbol in symbols):
+            return jsonify({'error': 'Expected a JSON body like {"symbols": ["BA", "LMT"]}'}), 400
+        try:
+            return jsonify({'symbols': update_watchlist(symbols)})
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    return jsonify({'symbols': get_user_watchlist(get_user_id())})
+
+# Indicators returned by /api/stocks/<symbol>/indicators unless ?indicators= lists others
+DEFAULT_INDICATORS = 'sma,ema,bollinger,rsi,returns,volatility'
+
+@app.route('/api/stocks/<symbol>/indicators')
+def stock_indicators(symbol):
+    """Return technical indicators over a stock's recent history."""
+    days = request.args.get('days', 30, type=int)
+    if not days or not 1 <= days <= INDICATOR_HISTORY_DAYS:
+        return jsonify({'error': f'days must be between 1 and {INDICATOR_HISTORY_DAYS}'}), 400
+    try:
+        indicators = parse_indicators(request.args.get('indicators', DEFAULT_INDICATORS))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(get_stock_indicators(symbol, indicators, days))
 
 @app.route('/api/news')
 def news():
-    return jsonify(get_space_news())
+    """Return one page of ingested news articles, newest first.
+
+    Served from the local article store, so paging never spends NewsAPI
+    quota; paging works like /api/stocks.
+    """
+    if not PREFETCH_ENABLED:
+        # Polls NewsAPI for new articles once the last poll is older than its TTL
+        get_space_news()
+    return news_page_response()
+
+def news_page_response():
+    """Send the page of stored articles asked for by ?page= and ?per_page=."""
+    page, per_page = get_paging(NEWS_PAGE_SIZE, MAX_NEWS_PAGE_SIZE)
+    articles, total = get_news_page(page, per_page)
+    response = send_json(('news', page, per_page, news_store.version()),
+                         lambda: {'articles': articles, 'page': page, 'per_page': per_page, 'total': total})
+    return add_paging_headers(response, 'news', page, per_page, total)
+
+@app.route('/api/news/search')
+def news_search():
+    """Full-text search over ingested articles: ?q= terms must all match, best matches first."""
+    query = request.args.get('q', '')
+    terms = tokenize(query)
+    if not terms:
+        return jsonify({'error': 'Expected search terms in ?q='}), 400
+    page, per_page = get_paging(NEWS_PAGE_SIZE, MAX_NEWS_PAGE_SIZE)
+    # The index answers in milliseconds; the response cache still compresses each body once
+    articles, total = search_news(query, page, per_page)
+    response = send_json(('news_search', query, page, per_page, news_store.version()),
+                         lambda: {'query': query, 'articles': articles, 'page': page, 'per_page': per_page,
+                                  'total': total})
+    return add_paging_headers(response, 'news_search', page, per_page, total, q=query)
+
+def send_chart(chart):
+    """Send a cached chart with validators, answering conditional requests with 304."""
+    response = make_response(chart.png)
+    response.mimetype = 'image/png'
+    response.set_etag(chart.etag)
+    response.last_modified = chart.last_modified
+    response.cache_control.public = True
+    response.cache_control.max_age = CHART_MAX_AGE
+    return response.make_conditional(request)
 
 @app.route('/charts/stocks/<symbol>')
 def stock_chart(symbol):
     """Generate and return a stock price history chart."""
-    chart_buffer = generate_stock_chart(symbol)
-    if chart_buffer:
-        return send_file(chart_buffer, mimetype='image/png')
-    return jsonify({'error': 'Unable to generate stock chart'}), 500
+    try:
+        overlays = parse_indicators(request.args.get('overlays', CHART_STOCK_OVERLAYS), overlays_only=True)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    with server_timing('data'):
+        historical_data, indicators = get_indicator_history(symbol, overlays)
+    if not historical_data:
+        return jsonify({'error': 'Unable to generate stock chart'}), 500
+    
+    # Only render when the data or render parameters changed since the last render
+    key = ('stocks', symbol, data_version(historical_data), tuple(overlays), tuple(sorted(CHART_PARAMS.items())))
+    def render():
+        with server_timing('render'), CHART_RENDERS.time(chart='stocks'):
+            return generate_stock_chart(symbol, historical_data, indicators).result(timeout=CHART_RENDER_TIMEOUT)
+
+    try:
+        chart = chart_cache.get_or_render(key, render)
+    except Exception as e:
+        print(f"Error generating stock chart: {e}")
+        return jsonify({'error': 'Unable to generate stock chart'}), 500
+    return send_chart(chart)
 
 @app.route('/charts/weather/<planet>')
 def weather_chart(planet):
     """Generate and return a weather history chart."""
-    chart_buffer = generate_weather_chart(planet)
-    if chart_buffer:
-        return send_file(chart_buffer, mimetype='image/png')
-    return jsonify({'error': 'Unable to generate weather chart'}), 500
+    with server_timing('data'):
+        historical_data = get_historical_weather_data(planet)
+    if not historical_data:
+        print(f"No historical data available for {planet}")
+        return jsonify({'error': 'Unable to generate weather chart'}), 500
+    
+    # Only render when the data or render parameters changed since the last render
+    key = ('weather', planet, data_version(historical_data), tuple(sorted(CHART_PARAMS.items())))
+    def render():
+        with server_timing('render'), CHART_RENDERS.time(chart='weather'):
+            return generate_weather_chart(planet, historical_data).result(timeout=CHART_RENDER_TIMEOUT)
+
+    try:
+        chart = chart_cache.get_or_render(key, render)
+    except Exception as e:
+        print(f"Error generating weather chart: {e}")
+        return jsonify({'error': 'Unable to generate weather chart'}), 500
+    return send_chart(chart)
+
+@app.route('/api/charts/stocks/<symbol>')
+def stock_chart_data(symbol):
+    """Return the series behind a stock chart for drawing in the browser.
+
+    Takes ?overlays= like /charts/stocks/<symbol>; the series are cut down
+    to one point per pixel of ?width=, and the body is cached per data
+    version like the other /api/* responses.
+    """
+    try:
+        overlays = parse_indicators(request.args.get('overlays', CHART_STOCK_OVERLAYS), overlays_only=True)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    with server_timing('data'):
+        historical_data, indicators = get_indicator_history(symbol, overlays)
+    if not historical_data:
+        return jsonify({'error': 'Unable to load stock chart data'}), 500
+    points = get_chart_points(len(historical_data))
+    return send_json(('chart_stocks', symbol, data_version(historical_data), tuple(overlays), points),
+                     lambda: indicators_to_json(symbol, historical_data, indicators, points))
+
+@app.route('/api/charts/weather/<planet>')
+def weather_chart_data(planet):
+    """Return the series behind a weather chart for drawing in the browser, sized like /api/charts/stocks."""
+    with server_timing('data'):
+        historical_data = get_historical_weather_data(planet)
+    if not historical_data:
+        print(f"No historical data available for {planet}")
+        return jsonify({'error': 'Unable to load weather chart data'}), 500
+    points = get_chart_points(len(historical_data))
+    return send_json(('chart_weather', planet, data_version(historical_data), points),
+                     lambda: weather_chart_series(planet, historical_data, points))
+
+@app.route('/metrics')
+def metrics():
+    """Export request, upstream, quota, fallback and cache metrics in the Prometheus text format."""
+    if not METRICS_ENABLED:
+        return jsonify({'error': 'Metrics are disabled (METRICS_ENABLED=0)'}), 404
+    return Response(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 if __name__ == '__main__':
     app.run(debug=True) 
\ No newline at end of file
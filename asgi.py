@@ -0,0 +1,259 @@
+"""ASGI entry point: serves the dashboard from an event loop instead of a thread per request.
+
+    pip install uvicorn asgiref
+    uvicorn asgi:app --workers 4
+
+The routes that wait (the dashboard page, /api/weather, /api/stocks,
+/api/news, /stream and /api/updates) run as coroutines inside a Flask
+request context, so waiting on a provider, the snapshot or the
+broadcaster holds no thread. Their short database reads (the user's
+watchlist, stored news, quota counts) still run on the default thread
+pool. Every other route runs the ordinary Flask app through asgiref's
+WsgiToAsgi. `python app.py` and WSGI servers keep serving the
+synchronous app unchanged.
+"""
+import io
+import os
+import sys
+import time
+import asyncio
+from asgiref.sync import ThreadSensitiveContext
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from flask import request
+from werkzeug.exceptions import HTTPException
+from app import (app as flask_app, PREFETCH_ENABLED, STREAM_HEARTBEAT, STREAM_MAX_AGE, LONG_POLL_TIMEOUT,
+                 get_stock_page, get_user_id, server_timing, render_dashboard, send_json, get_stocks_key,
+                 add_paging_headers, news_page_response, live_updates_unavailable, stream_messages, event_stream,
+                 updates_response)
+from utils.dashboard import (async_get_dashboard_data, async_get_dashboard_snapshot, async_wait_for_dashboard,
+                             get_dashboard_snapshot, PLANETS)
+from utils.weather import async_get_weather_data
+from utils.stocks import async_get_stock_data
+from utils.news import async_get_space_news
+from utils.snapshot import snapshot
+from utils.broadcast import broadcaster
+from utils.watchlist import get_user_watchlist
+from utils.scheduler import start_prefetching
+
+# Most requests served by the routes that stay synchronous at once (forms, watchlist, search, indicators, charts, metrics)
+ASGI_SYNC_THREADS = int(os.getenv('ASGI_SYNC_THREADS', 32))
+
+_sync_app = WsgiToAsgi(flask_app)
+_sync_slots = asyncio.Semaphore(ASGI_SYNC_THREADS)
+
+async def get_current_data(symbols):
+    """Return data for all sections, from the prefetched snapshot when enabled."""
+    if PREFETCH_ENABLED:
+        return await async_get_dashboard_snapshot(symbols)
+    return await async_get_dashboard_data(symbols)
+
+async def index():
+    """Render the main dashboard page."""
+    symbols, page, per_page, total = await asyncio.to_thread(get_stock_page)
+    with server_timing('data'):
+        data = await get_current_data(symbols)
+    return await asyncio.to_thread(render_dashboard, data, page, per_page, total)
+
+async def weather():
+    if PREFETCH_ENABLED:
+        await async_wait_for_dashboard()
+        return send_json(('weather', snapshot.versions('weather_data', PLANETS)),
+                         lambda: get_dashboard_snapshot(timeout=0)['weather_data'])
+    data = await async_get_weather_data()
+    return send_json(None, lambda: data)
+
+async def stocks():
+    """Return quotes for one page of the user's watchlist."""
+    symbols, page, per_page, total = await asyncio.to_thread(get_stock_page)
+    if PREFETCH_ENABLED:
+        quotes = await async_wait_for_dashboard(symbols)
+        response = send_json(get_stocks_key(symbols),
+                             lambda: get_dashboard_snapshot(symbols, timeout=0, quotes=quotes)['stocks_data'],
+                             private=True)
+    else:
+        data = await async_get_stock_data(symbols)
+        response = send_json(None, lambda: data, private=True)
+    return add_paging_headers(response, 'stocks', page, per_page, total)
+
+async def news():
+    """Return one page of ingested news articles, newest first."""
+    if not PREFETCH_ENABLED:
+        await async_get_space_news()
+    return await asyncio.to_thread(news_page_response)
+
+async def stream():
+    """Push dashboard changes as Server-Sent Events, waiting on the broadcaster without a thread."""
+    if not PREFETCH_ENABLED:
+        return live_updates_unavailable()
+    symbols = set(await asyncio.to_thread(get_user_watchlist, get_user_id()))
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+
+    async def events():
+        version = last_event_id
+        yield f'retry: {int(STREAM_HEARTBEAT * 1000)}\n\n'
+        closes_at = time.monotonic() + STREAM_MAX_AGE
+        while time.monotonic() < closes_at:
+            pending = [] if version is None else await broadcaster.async_wait(version, STREAM_HEARTBEAT)
+            quotes = None
+            if pending is None or version is None:
+                quotes = await async_wait_for_dashboard(symbols)
+            version, messages = stream_messages(version, pending, symbols, snapshot_timeout=0, quotes=quotes)
+            for message in messages:
+                yield message
+
+    return event_stream(events())
+
+async def updates():
+    """Long-poll fallback for /stream, waiting on the broadcaster without a thread."""
+    if not PREFETCH_ENABLED:
+        return live_updates_unavailable()
+    symbols = set(await asyncio.to_thread(get_user_watchlist, get_user_id()))
+    since = request.args.get('since', type=int)
+    pending = None if since is None else await broadcaster.async_wait(since, LONG_POLL_TIMEOUT)
+    quotes = None
+    if pending is None:
+        quotes = await async_wait_for_dashboard(symbols)
+    return updates_response(since, pending, symbols, snapshot_timeout=0, quotes=quotes)
+
+# Flask endpoints served by a coroutine instead of their synchronous view
+ASYNC_VIEWS = {
+    'index': index,
+    'weather': weather,
+    'stocks': stocks,
+    'news': news,
+    'stream': stream,
+    'updates': updates
+}
+
+def build_environ(scope, body):
+    """Return the WSGI environ for an ASGI HTTP scope and its request body, translated by asgiref."""
+    instance = WsgiToAsgiInstance(flask_app)
+    instance.scope = scope
+    return instance.build_environ(scope, io.BytesIO(body))
+
+def encode_headers(headers):
+    return [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+async def wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+def match_async_view(scope):
+    """Return (coroutine view, view args) for the request, or (None, None) to let Flask serve it."""
+    root_path = scope.get('root_path', '')
+    path = scope['path'][len(root_path):] if scope['path'].startswith(root_path) else scope['path']
+    adapter = flask_app.url_map.bind('localhost', script_name=root_path or None,
+                                     url_scheme=scope.get('scheme', 'http'))
+    try:
+        endpoint, view_args = adapter.match(path, method=scope['method'])
+    except HTTPException:
+        # Not found, wrong method or a redirect: Flask answers those
+        return None, None
+    view = ASYNC_VIEWS.get(endpoint)
+    return (view, view_args) if view is not None else (None, None)
+
+async def run_async_view(view, view_args, environ, receive, send):
+    """Dispatch one request to a coroutine view with Flask's request hooks, sessions and error handling."""
+    with flask_app.request_context(environ):
+        try:
+            rv = flask_app.preprocess_request()
+            if rv is None:
+                rv = await view(**view_args)
+        except Exception as e:
+            try:
+                rv = flask_app.handle_user_exception(e)
+            except Exception as e:
+                rv = flask_app.handle_exception(e)
+        response = flask_app.finalize_request(rv)
+        try:
+            if hasattr(response.response, '__aiter__'):
+                await send({'type': 'http.response.start', 'status': response.status_code,
+                            'headers': encode_headers(response.get_wsgi_headers(environ).to_wsgi_list())})
+                await send_stream(response.response, receive, send)
+            else:
+                body, status, headers = response.get_wsgi_response(environ)
+                await send({'type': 'http.response.start', 'status': int(status.split(' ', 1)[0]),
+                            'headers': encode_headers(headers)})
+                await send({'type': 'http.response.body', 'body': b''.join(body)})
+        finally:
+            response.close()
+
+async def send_stream(chunks, receive, send):
+    """Send an async iterator of str chunks until it ends or the client disconnects."""
+    async def pump():
+        try:
+            async for chunk in chunks:
+                await send({'type': 'http.response.body', 'body': chunk.encode('utf-8'), 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            await chunks.aclose()
+
+    # A closed connection is only noticed by reading, so watch for it alongside the stream
+    streaming = asyncio.ensure_future(pump())
+    disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+    await asyncio.wait({streaming, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+    for task in (streaming, disconnected):
+        task.cancel()
+    await asyncio.gather(streaming, disconnected, return_exceptions=True)
+    if not streaming.cancelled():
+        streaming.result()  # Raise any error from the stream itself
+
+async def run_sync_app(scope, receive, send):
+    """Serve one request with the Flask app through asgiref, at most ASGI_SYNC_THREADS at a time."""
+    # WsgiToAsgi runs thread-sensitive code, which would share one thread
+    # between all requests unless each gets its own context
+    async with _sync_slots, ThreadSensitiveContext():
+        await _sync_app(scope, receive, send)
+
+async def serve_lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            # Each worker process runs this after the server forks it, the right time to start threads
+            if PREFETCH_ENABLED:
+                start_prefetching()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def app(scope, receive, send):
+    """The ASGI application."""
+    if scope['type'] == 'lifespan':
+        await serve_lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return  # No websocket routes; the server closes the connection
+    view, view_args = match_async_view(scope)
+    if view is None:
+        await run_sync_app(scope, receive, send)
+        return
+    body = await read_body(receive)
+    if body is None:
+        return
+    await run_async_view(view, view_args, build_environ(scope, body), receive, send)
+
+def get_uvicorn():
+    """Return the uvicorn module, or None if it is not installed."""
+    try:
+        import uvicorn
+        return uvicorn
+    except ImportError:
+        return None
+
+if __name__ == '__main__':
+    uvicorn = get_uvicorn()
+    if uvicorn is None:
+        print("Serving asgi:app needs an ASGI server: pip install uvicorn, or run it with e.g. hypercorn")
+        sys.exit(1)
+    uvicorn.run(app, port=int(os.getenv('PORT', 5000)))
@@ -0,0 +1,239 @@
+"""Load-test the dashboard and report latency percentiles and upstream call counts.
+
+Against a running server:
+
+    python bench/run.py --base-url http://127.0.0.1:5000 --stub-url http://127.0.0.1:8900
+
+Or fully offline, starting the stub providers and the app itself:
+
+    python bench/run.py --spawn --concurrency 16 --duration 30
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_PATHS = ['/', '/api/weather', '/api/stocks', '/api/news', '/charts/stocks/BA', '/charts/weather/earth']
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def wait_until_up(url, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.get(url, timeout=2)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise SystemExit(f'{url} did not come up within {timeout}s')
+
+def spawn_servers(stub_args, app_env, state_dir, workers=1):
+    """Start the stub providers and `workers` app processes on free ports.
+
+    The app processes share one state directory, like the workers of one
+    host. Returns (processes, base_urls, stub_url).
+    """
+    stub_port = free_port()
+    stub_url = f'http://127.0.0.1:{stub_port}'
+
+    env = dict(os.environ)
+    env.update({
+        'OPENWEATHER_API_KEY': 'bench', 'NASA_API_KEY': 'bench',
+        'ALPHA_VANTAGE_API_KEY': 'bench', 'NEWS_API_KEY': 'bench',
+        'OPENWEATHER_BASE_URL': stub_url, 'NASA_API_BASE_URL': stub_url,
+        'ALPHA_VANTAGE_BASE_URL': stub_url, 'NEWS_API_BASE_URL': stub_url,
+        # yfinance talks to Yahoo directly and cannot be redirected to the stub
+        'STOCK_QUOTE_SOURCE': 'alphavantage',
+        'QUOTA_LEDGER_PATH': os.path.join(state_dir, 'quota_ledger.json'),
+        'TIMESERIES_DB_PATH': os.path.join(state_dir, 'timeseries.db'),
+        'WATCHLIST_DB_PATH': os.path.join(state_dir, 'watchlists.db'),
+        'NEWS_DB_PATH': os.path.join(state_dir, 'news.db'),
+        'CACHE_DB_PATH': os.path.join(state_dir, 'cache.db'),
+    })
+    env.update(app_env)
+
+    stub = subprocess.Popen([sys.executable, os.path.join(ROOT, 'bench', 'stub_providers.py'),
+                             '--port', str(stub_port)] + stub_args, cwd=ROOT, env=env)
+    wait_until_up(f'{stub_url}/_stats')
+    processes, base_urls = [stub], []
+    for _ in range(workers):
+        app_port = free_port()
+        processes.insert(0, subprocess.Popen([sys.executable, '-m', 'flask', '--app', 'app', 'run',
+                                              '--port', str(app_port), '--with-threads', '--no-reload'],
+                                             cwd=ROOT, env=env, stdout=subprocess.DEVNULL,
+                                             stderr=subprocess.DEVNULL))
+        base_urls.append(f'http://127.0.0.1:{app_port}')
+    for base_url in base_urls:
+        wait_until_up(base_url)
+    return processes, base_urls, stub_url
+
+def upstream_stats(stub_url):
+    if not stub_url:
+        return None
+    try:
+        return requests.get(f'{stub_url}/_stats', timeout=5).json()
+    except requests.RequestException as e:
+        print(f"Error reading stub stats: {str(e)}")
+        return None
+
+class LoadRun:
+    """Issues requests round-robin over paths (and app servers) from a pool of workers and records each latency."""
+
+    def __init__(self, base_urls, paths, duration, total_requests):
+        self.base_urls = [base_url.rstrip('/') for base_url in base_urls]
+        self.paths = paths
+        self.duration = duration
+        self.total_requests = total_requests
+        self.samples = {path: [] for path in paths}
+        self.errors = {path: 0 for path in paths}
+        self._issued = 0
+        self._lock = threading.Lock()
+
+    def next_path(self):
+        with self._lock:
+            if self.total_requests is not None and self._issued >= self.total_requests:
+                return None
+            if self.total_requests is None and time.perf_counter() >= self._deadline:
+                return None
+            path = self.paths[self._issued % len(self.paths)]
+            base_url = self.base_urls[self._issued // len(self.paths) % len(self.base_urls)]
+            self._issued += 1
+            return base_url, path
+
+    def worker(self):
+        # One session per worker keeps connections alive, like a browser would
+        session = requests.Session()
+        session.headers['Accept-Encoding'] = 'gzip, br'
+        while True:
+            target = self.next_path()
+            if target is None:
+                return
+            base_url, path = target
+            started = time.perf_counter()
+            try:
+                response = session.get(base_url + path, timeout=60)
+                failed = response.status_code >= 400
+            except requests.RequestException:
+                failed = True
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.samples[path].append(elapsed)
+                if failed:
+                    self.errors[path] += 1
+
+    def run(self, concurrency):
+        self._deadline = time.perf_counter() + self.duration
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for _ in range(concurrency):
+                pool.submit(self.worker)
+        return time.perf_counter() - started
+
+def percentile(values, fraction):
+    """Return the value below which `fraction` of values fall (nearest rank)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))]
+
+def summarize(samples, errors):
+    return {'requests': len(samples), 'errors': errors,
+            'p50_ms': round(percentile(samples, 0.50) * 1000, 2),
+            'p95_ms': round(percentile(samples, 0.95) * 1000, 2),
+            'p99_ms': round(percentile(samples, 0.99) * 1000, 2),
+            'max_ms': round(max(samples, default=0) * 1000, 2)}
+
+def upstream_delta(before, after):
+    """Return per-provider call, error and quota-refusal counts between two /_stats readings."""
+    if before is None or after is None:
+        return None
+    return {provider: {field: after[provider][field] - before[provider][field]
+                       for field in ('calls', 'errors', 'quota_refusals')}
+            for provider in after}
+
+def build_report(load, elapsed, upstream):
+    all_samples = [sample for samples in load.samples.values() for sample in samples]
+    overall = summarize(all_samples, sum(load.errors.values()))
+    overall['elapsed_s'] = round(elapsed, 2)
+    overall['throughput_rps'] = round(len(all_samples) / elapsed, 1) if elapsed else 0.0
+    return {'overall': overall,
+            'paths': {path: summarize(load.samples[path], load.errors[path]) for path in load.paths},
+            'upstream': upstream}
+
+def print_report(report):
+    overall = report['overall']
+    print(f"{overall['requests']} requests in {overall['elapsed_s']}s "
+          f"({overall['throughput_rps']} req/s), {overall['errors']} errors")
+    print(f"{'path':32} {'requests':>9} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for path, stats in [('all', overall)] + list(report['paths'].items()):
+        print(f"{path:32} {stats['requests']:>9} {stats['errors']:>7} "
+              f"{stats['p50_ms']:>9} {stats['p95_ms']:>9} {stats['p99_ms']:>9}")
+    if report['upstream']:
+        print('upstream calls during the run:')
+        for provider, counts in report['upstream'].items():
+            print(f"  {provider:16} {counts['calls']:>6} calls, {counts['errors']} errors, "
+                  f"{counts['quota_refusals']} quota refusals")
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--base-url', default='http://127.0.0.1:5000', help='dashboard to load')
+    parser.add_argument('--stub-url', help='stub provider server to read upstream call counts from')
+    parser.add_argument('--spawn', action='store_true',
+                        help='start the stub providers and the app on free ports for this run')
+    parser.add_argument('--stub-arg', action='append', default=[], metavar='ARG',
+                        help='extra argument for the spawned stub, e.g. --stub-arg=--error-rate=0.05')
+    parser.add_argument('--app-workers', type=int, default=1,
+                        help='app processes to spawn; requests are spread over them like a load balancer would')
+    parser.add_argument('--app-env', action='append', default=[], metavar='NAME=VALUE',
+                        help='extra environment for the spawned app, e.g. --app-env PREFETCH_ENABLED=0')
+    parser.add_argument('--concurrency', type=int, default=8, help='simultaneous clients')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds to run for')
+    parser.add_argument('--requests', type=int, help='stop after this many requests instead of after --duration')
+    parser.add_argument('--warmup', type=int, default=0, help='requests per path sent before measuring')
+    parser.add_argument('--paths', nargs='+', default=DEFAULT_PATHS, help='paths requested round-robin')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    processes = []
+    base_urls, stub_url = [args.base_url], args.stub_url
+    # Quota ledger, time-series, watchlist, news and cache databases of the spawned app
+    state_dir = tempfile.TemporaryDirectory(prefix='dashboard-bench-')
+    if args.spawn:
+        app_env = dict(item.split('=', 1) for item in args.app_env)
+        processes, base_urls, stub_url = spawn_servers(args.stub_arg, app_env, state_dir.name, args.app_workers)
+
+    try:
+        if args.warmup:
+            LoadRun(base_urls, args.paths, 0, args.warmup * len(args.paths) * len(base_urls)).run(1)
+        before = upstream_stats(stub_url)
+        load = LoadRun(base_urls, args.paths, args.duration, args.requests)
+        elapsed = load.run(args.concurrency)
+        report = build_report(load, elapsed, upstream_delta(before, upstream_stats(stub_url)))
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+        state_dir.cleanup()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+if __name__ == '__main__':
+    main()
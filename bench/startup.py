@@ -0,0 +1,102 @@
+"""Measure how long a fresh process takes to import the app and serve its first request.
+
+Each run starts a new interpreter, like a new web worker or pod would:
+
+    python bench/startup.py --runs 5 --budget 1.5
+    python bench/startup.py --path /api/weather --env PREFETCH_ENABLED=0
+
+Exits with status 1 when the median startup time exceeds --budget, or when
+a module that should load lazily was imported by `import app`, so it can
+guard cold starts in CI.
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Stacks that must only be imported on first use, not when the app loads
+LAZY_MODULES = ['pandas', 'alpha_vantage', 'yfinance', 'matplotlib', 'seaborn']
+
+# Runs in the child interpreter: time `import app` and the optional first request
+PROBE = """
+import sys, json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+modules = sorted(name for name in sys.modules if '.' not in name)
+status = None
+if {path!r}:
+    status = app.app.test_client().get({path!r}).status_code
+finished = time.perf_counter()
+print(json.dumps({{'import_s': imported - started, 'first_request_s': finished - imported if {path!r} else None,
+                  'status': status, 'modules': modules}}))
+"""
+
+def run_probe(path, env):
+    output = subprocess.run([sys.executable, '-c', PROBE.format(path=path)], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    # Providers may print warnings; the probe's report is the last line
+    return json.loads(output.strip().splitlines()[-1])
+
+def slowest_imports(env, count):
+    """Return the `count` top-level imports of `import app` with the largest cumulative time (us)."""
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True).stderr
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Names are indented two spaces per level below a one-space margin
+        if name.startswith(' ' * 3) and not name.startswith(' ' * 4) and name.strip() != 'app':
+            imports.append((int(cumulative), name.strip()))
+    return sorted(imports, reverse=True)[:count]
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='fresh processes to time')
+    parser.add_argument('--path', default='', help='also time the first request to this path')
+    parser.add_argument('--env', action='append', default=[], metavar='NAME=VALUE',
+                        help='extra environment for the measured processes')
+    parser.add_argument('--budget', type=float, help='fail if the median startup time exceeds this many seconds')
+    parser.add_argument('--top', type=int, default=10, help='slowest direct imports of app.py to list')
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    env = dict(os.environ)
+    env.update(dict(item.split('=', 1) for item in args.env))
+
+    results = [run_probe(args.path, env) for _ in range(args.runs)]
+    imports = [result['import_s'] for result in results]
+    startups = [result['import_s'] + (result['first_request_s'] or 0) for result in results]
+    print(f"import app: median {statistics.median(imports) * 1000:.0f} ms, "
+          f"min {min(imports) * 1000:.0f} ms, max {max(imports) * 1000:.0f} ms over {args.runs} runs")
+    if args.path:
+        firsts = [result['first_request_s'] for result in results]
+        print(f"first request to {args.path} (status {results[-1]['status']}): "
+              f"median {statistics.median(firsts) * 1000:.0f} ms")
+
+    print('slowest direct imports:')
+    for cumulative, name in slowest_imports(env, args.top):
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    failed = False
+    if not env.get('PRELOAD'):
+        eager = [name for name in LAZY_MODULES if name in results[-1]['modules']]
+        if eager:
+            print(f"FAIL: imported at startup instead of on first use: {', '.join(eager)}")
+            failed = True
+    median = statistics.median(startups)
+    if args.budget is not None:
+        verdict = 'FAIL' if median > args.budget else 'ok'
+        print(f"{verdict}: median startup {median:.3f}s against a budget of {args.budget:.3f}s")
+        failed = failed or median > args.budget
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
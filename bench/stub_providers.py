@@ -0,0 +1,319 @@
+"""Local stand-ins for the OpenWeatherMap, NASA InSight, Alpha Vantage and NewsAPI endpoints.
+
+One threaded HTTP server answers all four providers with deterministic
+payloads from the simulation engine, shaped like the real APIs. Latency,
+error rates and quota refusals can be set per provider. Point the
+dashboard at it with:
+
+    OPENWEATHER_BASE_URL=http://127.0.0.1:8900
+    NASA_API_BASE_URL=http://127.0.0.1:8900
+    ALPHA_VANTAGE_BASE_URL=http://127.0.0.1:8900
+    NEWS_API_BASE_URL=http://127.0.0.1:8900
+    STOCK_QUOTE_SOURCE=alphavantage
+
+plus any non-empty API keys. GET /_stats returns the calls each provider
+received, and POST /_reset clears them.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from utils.simulation import simulate_stock_series, simulate_days, choose, date_strings, uniform
+
+PROVIDERS = ['openweathermap', 'nasa', 'alphavantage', 'newsapi']
+
+# Bodies each provider sends when it refuses a call for quota reasons: (status, body)
+QUOTA_RESPONSES = {
+    'openweathermap': (429, {'cod': 429, 'message': 'Your account is temporary blocked due to exceeding of '
+                                                    'requests limitation of your subscription type.'}),
+    'nasa': (429, {'error': {'code': 'OVER_RATE_LIMIT', 'message': 'You have exceeded your rate limit.'}}),
+    'alphavantage': (200, {'Information': 'Thank you for using Alpha Vantage! Our standard API rate limit '
+                                          'is 25 requests per day.'}),
+    'newsapi': (429, {'status': 'error', 'code': 'rateLimited',
+                      'message': 'You have made too many requests recently.'})
+}
+
+# Alpha Vantage's per-minute throttling message, sent for random quota refusals
+ALPHA_VANTAGE_THROTTLED = {'Note': 'Thank you for using Alpha Vantage! Our standard API call frequency is '
+                                   '5 calls per minute and 500 calls per day.'}
+
+class ProviderSettings:
+    """Latency, failure and quota behaviour of one stubbed provider."""
+
+    def __init__(self, latency, jitter, error_rate, quota_rate, daily_quota):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.quota_rate = quota_rate
+        self.daily_quota = daily_quota
+
+class StubState:
+    """Call counters and random draws shared by every request thread."""
+
+    def __init__(self, settings, seed):
+        self.settings = settings
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.stats = {provider: {'calls': 0, 'errors': 0, 'quota_refusals': 0, 'paths': {}}
+                          for provider in PROVIDERS}
+
+    def record(self, provider, path):
+        """Count a call and decide its outcome: 'ok', 'error', 'quota' or 'throttled'."""
+        settings = self.settings[provider]
+        with self._lock:
+            stats = self.stats[provider]
+            stats['calls'] += 1
+            stats['paths'][path] = stats['paths'].get(path, 0) + 1
+            delay = settings.latency + self._random.uniform(0, settings.jitter)
+            if settings.daily_quota is not None and stats['calls'] > settings.daily_quota:
+                outcome = 'quota'
+            elif self._random.random() < settings.error_rate:
+                outcome = 'error'
+            elif self._random.random() < settings.quota_rate:
+                outcome = 'throttled'
+            else:
+                outcome = 'ok'
+            if outcome == 'error':
+                stats['errors'] += 1
+            elif outcome != 'ok':
+                stats['quota_refusals'] += 1
+        return outcome, delay
+
+    def snapshot(self):
+        with self._lock:
+            return json.loads(json.dumps(self.stats))
+
+def today():
+    return datetime.now().strftime('%Y-%m-%d')
+
+def owm_current(params):
+    city = params.get('q', 'New York')
+    dates, values = simulate_days('stub_weather', city, 1, {
+        'temp': (5, 30), 'humidity': (30, 90), 'wind': (0.5, 9)
+    })
+    condition = choose('stub_weather', city, 'condition', dates, ['Clear', 'Clouds', 'Rain', 'Mist'])[0]
+    return {'cod': 200, 'name': city, 'weather': [{'main': condition}],
+            'main': {'temp': round(float(values['temp'][0]), 2), 'humidity': int(values['humidity'][0])},
+            'wind': {'speed': round(float(values['wind'][0]), 2)}}
+
+def owm_geocode(params):
+    name = params.get('q', 'New York')
+    dates = np.array([np.datetime64('2000-01-01')])
+    lat = float(uniform('stub_geo', name, 'lat', dates, -60, 60)[0])
+    lon = float(uniform('stub_geo', name, 'lon', dates, -180, 180)[0])
+    return [{'name': name, 'lat': round(lat, 4), 'lon': round(lon, 4), 'country': 'XX'}]
+
+def owm_timemachine(params):
+    moment = datetime.fromtimestamp(int(params.get('dt', time.time())))
+    location = f"{params.get('lat')},{params.get('lon')}"
+    dates, values = simulate_days('stub_weather', location, 1, {
+        'temp': (5, 30), 'humidity': (30, 90), 'wind_speed': (0.5, 9)
+    }, end=moment.strftime('%Y-%m-%d'))
+    condition = choose('stub_weather', location, 'condition', dates, ['Clear', 'Clouds', 'Rain', 'Mist'])[0]
+    return {'lat': params.get('lat'), 'lon': params.get('lon'),
+            'current': {'dt': int(moment.timestamp()), 'temp': round(float(values['temp'][0]), 2),
+                        'humidity': int(values['humidity'][0]),
+                        'wind_speed': round(float(values['wind_speed'][0]), 2),
+                        'weather': [{'main': condition}]}}
+
+def insight_feed(params):
+    # The feed covers the last seven sols and moves on by one sol a day
+    dates, values = simulate_days('stub_insight', 'mars', 7, {
+        'at': (-100, -10), 'spread': (10, 40), 'hws': (2, 10), 'pre': (650, 760)
+    })
+    first_sol = int((dates[0] - np.datetime64('2018-11-26')).astype(int))
+    feed = {'sol_keys': [], 'validity_checks': {}}
+    for index, date in enumerate(date_strings(dates)):
+        sol = str(first_sol + index)
+        average = float(values['at'][index])
+        spread = float(values['spread'][index])
+        feed['sol_keys'].append(sol)
+        feed[sol] = {
+            'AT': {'av': round(average, 3), 'mn': round(average - spread, 3), 'mx': round(average + spread, 3)},
+            'HWS': {'av': round(float(values['hws'][index]), 3)},
+            'PRE': {'av': round(float(values['pre'][index]), 3)},
+            'First_UTC': f'{date}T00:00:00Z',
+            'Last_UTC': f'{date}T23:59:59Z',
+            'Season': 'winter'
+        }
+    return feed
+
+def alpha_vantage(params):
+    function = params.get('function')
+    symbol = params.get('symbol', 'BA').upper()
+    if function == 'GLOBAL_QUOTE':
+        series = simulate_stock_series(symbol, 100.0, 2)
+        price, previous = float(series.close[-1]), float(series.close[-2])
+        return {'Global Quote': {
+            '01. symbol': symbol,
+            '02. open': f'{series.open[-1]:.4f}',
+            '03. high': f'{series.high[-1]:.4f}',
+            '04. low': f'{series.low[-1]:.4f}',
+            '05. price': f'{price:.4f}',
+            '06. volume': str(int(series.volume[-1])),
+            '07. latest trading day': today(),
+            '08. previous close': f'{previous:.4f}',
+            '09. change': f'{price - previous:.4f}',
+            '10. change percent': f'{(price - previous) / previous * 100:.4f}%'
+        }}
+    if function == 'TIME_SERIES_DAILY':
+        days = 1000 if params.get('outputsize') == 'full' else 100
+        series = simulate_stock_series(symbol, 100.0, days)
+        bars = {}
+        # Newest first, like the real API
+        for date, open_, high, low, close, volume in reversed(list(series.rows())):
+            bars[date] = {'1. open': f'{open_:.4f}', '2. high': f'{high:.4f}', '3. low': f'{low:.4f}',
+                          '4. close': f'{close:.4f}', '5. volume': str(volume)}
+        return {'Meta Data': {'1. Information': 'Daily Prices (open, high, low, close) and Volumes',
+                              '2. Symbol': symbol, '3. Last Refreshed': today(),
+                              '4. Output Size': 'Full size' if days > 100 else 'Compact',
+                              '5. Time Zone': 'US/Eastern'},
+                'Time Series (Daily)': bars}
+    if function == 'OVERVIEW':
+        return {'Symbol': symbol, 'AssetType': 'Common Stock', 'Name': f'{symbol} Aerospace Inc',
+                'Exchange': 'NYSE', 'Currency': 'USD', 'Sector': 'INDUSTRIALS'}
+    return {'Error Message': f'Invalid API call. Unknown function {function}.'}
+
+def news_everything(params):
+    # Articles change every hour so incremental ingestion has something to pick up
+    now = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    articles = []
+    for index in range(20):
+        published = now - timedelta(minutes=37 * index)
+        dates = np.array([np.datetime64(published.strftime('%Y-%m-%d'))])
+        topic = choose('stub_news', published.isoformat(), 'topic', dates,
+                       ['Mars rover', 'lunar lander', 'Starship test', 'orbital station', 'satellite launch'])[0]
+        articles.append({
+            'source': {'id': None, 'name': ['Space Wire', 'Orbit Daily', 'Launch Report'][index % 3]},
+            'author': 'Stub Reporter',
+            'title': f'{topic.capitalize()} update {published:%H:%M}',
+            'description': f'Simulated coverage of the latest {topic} news for load testing.',
+            'url': f'https://news.example/{published:%Y%m%d%H%M}/{index}',
+            'urlToImage': None,
+            'publishedAt': published.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'content': f'Simulated {topic} article body.'
+        })
+    return {'status': 'ok', 'totalResults': len(articles), 'articles': articles}
+
+# path -> (provider, payload builder)
+ROUTES = {
+    '/data/2.5/weather': ('openweathermap', owm_current),
+    '/geo/1.0/direct': ('openweathermap', owm_geocode),
+    '/data/2.5/onecall/timemachine': ('openweathermap', owm_timemachine),
+    '/insight_weather/': ('nasa', insight_feed),
+    '/query': ('alphavantage', alpha_vantage),
+    '/v2/everything': ('newsapi', news_everything)
+}
+
+def make_handler(state, verbose):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            if url.path == '/_stats':
+                return self.send_json(200, state.snapshot())
+            route = ROUTES.get(url.path)
+            if route is None:
+                return self.send_json(404, {'message': 'Not found'})
+
+            provider, build = route
+            outcome, delay = state.record(provider, url.path)
+            time.sleep(delay)
+            if outcome == 'error':
+                return self.send_json(500, {'message': 'Simulated upstream failure'})
+            if outcome == 'quota':
+                return self.send_json(*QUOTA_RESPONSES[provider])
+            if outcome == 'throttled':
+                if provider == 'alphavantage':
+                    return self.send_json(200, ALPHA_VANTAGE_THROTTLED)
+                return self.send_json(*QUOTA_RESPONSES[provider])
+            params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            return self.send_json(200, build(params))
+
+        def do_POST(self):
+            if urlsplit(self.path).path == '/_reset':
+                state.reset()
+                return self.send_json(200, {'status': 'reset'})
+            return self.send_json(404, {'message': 'Not found'})
+
+        def send_json(self, status, payload):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            if verbose:
+                super().log_message(format, *args)
+
+    return StubHandler
+
+def parse_setting(values, default, cast=float):
+    """Parse repeated VALUE or PROVIDER=VALUE options into a per-provider dict."""
+    settings = {provider: default for provider in PROVIDERS}
+    for value in values or []:
+        provider, _, setting = value.rpartition('=')
+        if provider and provider not in PROVIDERS:
+            raise SystemExit(f'Unknown provider {provider!r}; expected one of {", ".join(PROVIDERS)}')
+        for name in ([provider] if provider else PROVIDERS):
+            settings[name] = cast(setting)
+    return settings
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--latency', action='append', metavar='[PROVIDER=]SECONDS',
+                        help='base response time (default 0.05)')
+    parser.add_argument('--jitter', action='append', metavar='[PROVIDER=]SECONDS',
+                        help='extra random response time, up to this much (default 0.02)')
+    parser.add_argument('--error-rate', action='append', metavar='[PROVIDER=]FRACTION',
+                        help='fraction of calls answered with HTTP 500 (default 0)')
+    parser.add_argument('--quota-rate', action='append', metavar='[PROVIDER=]FRACTION',
+                        help='fraction of calls refused with the provider\'s rate-limit response (default 0)')
+    parser.add_argument('--daily-quota', action='append', metavar='[PROVIDER=]CALLS',
+                        help='calls served before every further call gets the quota-exhausted response')
+    parser.add_argument('--seed', type=int, default=0, help='seed for latency, error and quota draws')
+    parser.add_argument('--verbose', action='store_true', help='log every request')
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    latency = parse_setting(args.latency, 0.05)
+    jitter = parse_setting(args.jitter, 0.02)
+    error_rate = parse_setting(args.error_rate, 0.0)
+    quota_rate = parse_setting(args.quota_rate, 0.0)
+    daily_quota = parse_setting(args.daily_quota, None, int)
+    settings = {provider: ProviderSettings(latency[provider], jitter[provider], error_rate[provider],
+                                           quota_rate[provider], daily_quota[provider])
+                for provider in PROVIDERS}
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(StubState(settings, args.seed), args.verbose))
+    server.daemon_threads = True
+    print(f'Stub providers listening on http://{args.host}:{server.server_port}', flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
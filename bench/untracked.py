@@ -0,0 +1,81 @@
+"""Check that watchlist symbols the prefetch scheduler does not track are served promptly with provider data.
+
+Loads the app with prefetching on, no provider keys (so quotes come from
+the simulated provider) and a small MAX_TRACKED_SYMBOLS, saves a watchlist
+that reaches past it and times the first /api/stocks request for it:
+
+    python bench/untracked.py --budget 2
+
+Exits with status 1 when that request takes longer than --budget, or when
+an untracked symbol comes back with the static fallback quote instead of
+fetched data, so it can run in CI.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The default shared watchlist fills five of the tracked slots
+SHARED_SYMBOLS = 5
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--symbols', nargs='+', default=['BA', 'LMT', 'AAPL', 'MSFT', 'GOOG'],
+                        help='watchlist to save; all but one of the symbols not on the shared list go untracked')
+    parser.add_argument('--budget', type=float, default=2.0,
+                        help='seconds the first /api/stocks request for the watchlist may take')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    state_dir = tempfile.TemporaryDirectory(prefix='dashboard-untracked-')
+    os.environ.update({
+        # Room for the shared list and one symbol of the saved watchlist
+        'MAX_TRACKED_SYMBOLS': str(SHARED_SYMBOLS + 1), 'PREFETCH_ENABLED': '1',
+        # Blank keys keep the check off the real APIs' quotas; without a key, quotes come from
+        # the simulated Alpha Vantage path, so every symbol has data
+        'OPENWEATHER_API_KEY': '', 'NASA_API_KEY': '', 'NEWS_API_KEY': '',
+        'STOCK_QUOTE_SOURCE': 'alphavantage', 'ALPHA_VANTAGE_API_KEY': '',
+        'QUOTA_LEDGER_PATH': os.path.join(state_dir.name, 'quota_ledger.json'),
+        'TIMESERIES_DB_PATH': os.path.join(state_dir.name, 'timeseries.db'),
+        'WATCHLIST_DB_PATH': os.path.join(state_dir.name, 'watchlists.db'),
+        'NEWS_DB_PATH': os.path.join(state_dir.name, 'news.db'),
+        'CACHE_DB_PATH': os.path.join(state_dir.name, 'cache.db'),
+    })
+    sys.path.insert(0, ROOT)
+    from app import app
+    from utils.watchlist import get_tracked_symbols
+
+    client = app.test_client()
+    # Let the first prefetch publish the tracked symbols
+    client.get('/api/stocks')
+    saved = client.put('/api/watchlist', json={'symbols': args.symbols})
+    if saved.status_code != 200:
+        raise SystemExit(f'Saving the watchlist failed: {saved.get_data(as_text=True)}')
+    tracked = set(get_tracked_symbols())
+    untracked = [symbol for symbol in args.symbols if symbol not in tracked]
+
+    started = time.perf_counter()
+    quotes = client.get('/api/stocks', query_string={'per_page': len(args.symbols)}).get_json()
+    elapsed = time.perf_counter() - started
+    state_dir.cleanup()
+
+    fallbacks = [symbol for symbol in args.symbols
+                 if symbol not in quotes or quotes[symbol].get('note') == 'Using fallback data due to API issues']
+    report = {'elapsed_s': round(elapsed, 3), 'budget_s': args.budget, 'untracked': untracked,
+              'fallbacks': fallbacks}
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"/api/stocks took {report['elapsed_s']}s (budget {args.budget}s) with "
+              f"{', '.join(untracked) or 'no symbols'} untracked; fallback quotes: {', '.join(fallbacks) or 'none'}")
+    if not untracked or elapsed > args.budget or fallbacks:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+import os
+import json
+import threading
+from collections import deque, namedtuple
+from utils.snapshot import snapshot
+from utils.concurrency import AsyncWaiters
+
+# Number of recent changes kept so reconnecting clients can catch up
+STREAM_BUFFER_SIZE = int(os.getenv('STREAM_BUFFER_SIZE', 1024))
+
+StreamEvent = namedtuple('StreamEvent', ['version', 'section', 'key', 'data'])
+
+def card_payload(section, value):
+    """Return the part of a snapshot value the dashboard cards display."""
+    if section == 'stocks_data' and isinstance(value, dict):
+        # Price history is only used by the charts and would dominate every update
+        return {field: item for field, item in value.items() if field != 'historical_data'}
+    return value
+
+def encode_update(section, key, value):
+    return json.dumps({'section': section, 'key': key, 'value': card_payload(section, value)}, default=str)
+
+def encode_snapshot(data):
+    """Encode a whole dashboard payload in the same shape as the incremental updates."""
+    return json.dumps({section: ({key: card_payload(section, value) for key, value in values.items()}
+                                 if section != 'news_data' else values)
+                       for section, values in data.items()}, default=str)
+
+class Broadcaster:
+    """Fans snapshot changes out to every connected live-update client.
+
+    Each change is encoded once when it is published and kept in a ring
+    buffer; clients only read from the buffer, so N viewers cost one encode
+    per change and never trigger an upstream call.
+    """
+
+    def __init__(self, size):
+        self._events = deque(maxlen=size)
+        self._changed = threading.Condition()
+        self._async_waiters = AsyncWaiters()
+        self.version = 0
+
+    def publish(self, version, section, key, value):
+        event = StreamEvent(version, section, key, encode_update(section, key, value))
+        with self._changed:
+            self._events.append(event)
+            self.version = version
+            self._changed.notify_all()
+        self._async_waiters.notify_all()
+
+    def events_since(self, version):
+        """Return the events after version, or None if the client has to start from a full snapshot.
+
+        That is when some events have already left the buffer, or when
+        version is ahead of this process's counter: the client saw another
+        worker, or this one before a restart.
+        """
+        with self._changed:
+            if version > self.version:
+                return None
+            if version == self.version:
+                return []
+            if not self._events or self._events[0].version > version + 1:
+                return None
+            return [event for event in self._events if event.version > version]
+
+    def wait(self, version, timeout):
+        """Block until there are events after version or timeout passes, then return them.
+
+        Returns at once when version is not one this process can wait from.
+        """
+        with self._changed:
+            self._changed.wait_for(lambda: self.version != version, timeout)
+        return self.events_since(version)
+
+    async def async_wait(self, version, timeout):
+        """Coroutine version of wait: holds no thread while the client waits."""
+        await self._async_waiters.wait_for(lambda: self.version != version, timeout)
+        return self.events_since(version)
+
+# The broadcaster shared by every /stream and /api/updates client
+broadcaster = Broadcaster(STREAM_BUFFER_SIZE)
+snapshot.subscribe(broadcaster.publish)
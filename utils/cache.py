@@ -0,0 +1,322 @@
+import os
+import time
+import pickle
+import asyncio
+import hashlib
+import threading
+import functools
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from utils.concurrency import MAX_PROVIDER_WORKERS
+from utils.metrics import record_cache_lookup
+from utils.singleflight import SingleFlight
+from utils.cache_backend import shared_backend, CACHE_LOCK_TTL, CACHE_LOCK_WAIT
+
+# Per data source cache settings: (seconds until an entry goes stale, maximum entries).
+# TTLs can be overridden with CACHE_TTL_<NAME>, e.g. CACHE_TTL_NEWS=600
+CACHE_SETTINGS = {
+    'earth_weather': (600, 8),
+    'mars_weather': (3600, 4),
+    'mars_feed': (3600, 1),
+    'weather_history': (3600, 32),
+    'geocode': (30 * 86400, 256),
+    'stock_quote': (300, 1024),
+    'stock_batch': (300, 64),
+    'company_name': (7 * 86400, 4096),
+    'stock_history': (3600, 1024),
+    'news': (900, 4),
+    'watchlist': (30, 4)
+}
+
+# How long past its TTL a stale entry may still be served while it refreshes.
+# Older entries are treated as missing and reloaded on the caller's thread
+STALE_GRACE = float(os.getenv('CACHE_STALE_GRACE', 86400))
+
+# Background refreshes run here so callers never wait on upstream latency
+_refresh_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='cache-refresh')
+
+# Misses awaited from the event loop load here, one thread per key in flight
+_load_executor = ThreadPoolExecutor(max_workers=MAX_PROVIDER_WORKERS, thread_name_prefix='cache-load')
+
+# How often a worker waiting on another worker's load checks for its result
+LOCK_POLL_INTERVAL = 0.05
+
+# Seconds until a key whose provider failed is retried, instead of the full TTL
+FALLBACK_TTL = float(os.getenv('CACHE_FALLBACK_TTL', 30))
+
+class ProviderFallback(Exception):
+    """Raised by a cached loader whose provider failed, carrying the fallback payload.
+
+    The cache keeps serving its last value for the key if it has one, the
+    fallback otherwise, and lets it go stale after FALLBACK_TTL so the
+    provider is tried again soon. Lookups return that value; refreshes
+    raise ProviderFallback with it, so the scheduler still backs off.
+    """
+
+    def __init__(self, value, reason):
+        super().__init__(reason)
+        self.value = value
+
+class TTLCache:
+    """A bounded LRU cache whose entries go stale after `ttl` seconds.
+
+    Stale entries are still returned immediately while a single background
+    refresh replaces them, and concurrent misses for a key share one load.
+    With a shared backend, entries are also written
+    there, a worker that misses adopts another worker's fresh entry, and
+    only one worker at a time calls the loader for a key.
+    """
+
+    def __init__(self, name, ttl, maxsize, backend=None, namespace=None):
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.backend = backend
+        self.namespace = namespace or name
+        self._entries = OrderedDict()  # key -> (value, stored_at)
+        self._refreshing = set()
+        self._flights = SingleFlight(name)
+        self._lock = threading.Lock()
+
+    def get_or_load(self, key, loader):
+        """Return the cached value for key, calling loader() to fill or refresh it."""
+        found, value = self._lookup(key, loader)
+        if found:
+            return value
+        try:
+            value, adopted = self._load(key, loader, self.ttl)
+        except ProviderFallback as e:
+            value, adopted = e.value, False
+        record_cache_lookup(self.name, 'shared' if adopted else 'miss')
+        return value
+
+    async def async_get_or_load(self, key, loader):
+        """Coroutine version of get_or_load that never blocks the event loop.
+
+        Hits are answered on the loop. A miss runs loader() on a pool thread,
+        and every coroutine missing the same key awaits that one load.
+        """
+        found, value = self._lookup(key, loader)
+        if found:
+            return value
+        future = self._flights.submit(key, lambda: self._load_once(key, loader, self.ttl), _load_executor)
+        try:
+            value, adopted = await asyncio.wrap_future(future)
+        except ProviderFallback as e:
+            value, adopted = e.value, False
+        record_cache_lookup(self.name, 'shared' if adopted else 'miss')
+        return value
+
+    def _lookup(self, key, loader):
+        # Returns (True, value) for a fresh or servable stale entry, else (False, None)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+
+        if entry is None or now - entry[1] > self.ttl + STALE_GRACE:
+            return False, None
+
+        value, stored_at = entry
+        if now - stored_at > self.ttl:
+            record_cache_lookup(self.name, 'stale')
+            self._schedule_refresh(key, loader)
+        else:
+            record_cache_lookup(self.name, 'hit')
+        return True, value
+
+    def load(self, key, loader, fresh_for=None):
+        """Store and return a fresh value for key.
+
+        With a shared backend, a value another worker stored less than
+        `fresh_for` seconds ago (default: the TTL) is adopted instead of
+        calling loader(), and while one worker loads a key the others wait
+        up to CACHE_LOCK_WAIT seconds for its result.
+        """
+        return self._load(key, loader, self.ttl if fresh_for is None else fresh_for)[0]
+
+    def _load(self, key, loader, fresh_for):
+        # Returns (value, True if it was adopted from another worker). Threads
+        # of this process that miss the same key together wait for one load
+        return self._flights.do(key, lambda: self._load_once(key, loader, fresh_for))
+
+    def _load_once(self, key, loader, fresh_for):
+        with self._lock:
+            entry = self._entries.get(key)
+        # A load that finished just before this one started is as good as a new one
+        if entry is not None and time.time() - entry[1] <= fresh_for:
+            return entry[0], False
+
+        if self.backend is None:
+            return self._call_loader(key, loader), False
+
+        shared_key = self._shared_key(key)
+        deadline = time.monotonic() + CACHE_LOCK_WAIT
+        token = None
+        try:
+            while True:
+                entry = self._read_shared(shared_key)
+                if entry is not None and time.time() - entry[1] <= fresh_for:
+                    self._store(key, entry)
+                    return entry[0], True
+                # Re-read once after taking the lock: the previous holder may have just finished
+                if token is not None or time.monotonic() > deadline:
+                    break
+                token = self._try_lock(shared_key)
+                if token is None:
+                    time.sleep(LOCK_POLL_INTERVAL)
+            return self._call_loader(key, loader), False
+        finally:
+            if token:
+                self._release_lock(shared_key, token)
+
+    def _call_loader(self, key, loader):
+        try:
+            value = loader()
+        except ProviderFallback as e:
+            with self._lock:
+                entry = self._entries.get(key)
+            # Keep serving the last value rather than the fallback, but not for a whole TTL
+            value = e.value if entry is None else entry[0]
+            self.set(key, value, expires_in=FALLBACK_TTL)
+            raise ProviderFallback(value, str(e)) from e
+        self.set(key, value)
+        return value
+
+    def set(self, key, value, expires_in=None):
+        """Store value under key, evicting the least recently used entry if full.
+
+        With `expires_in`, the entry goes stale after that many seconds
+        instead of the TTL.
+        """
+        stored_at = time.time()
+        if expires_in is not None:
+            stored_at -= max(0.0, self.ttl - expires_in)
+        entry = (value, stored_at)
+        self._store(key, entry)
+        if self.backend is not None:
+            self._write_shared(self._shared_key(key), entry)
+
+    def clear(self):
+        with self._lock:
+            keys = list(self._entries)
+            self._entries.clear()
+        if self.backend is not None:
+            for key in keys:
+                try:
+                    self.backend.delete(self._shared_key(key))
+                except Exception as e:
+                    print(f"Error clearing shared {self.name} cache entry {key}: {str(e)}")
+
+    def _store(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def _shared_key(self, key):
+        return f'cache:{self.namespace}:{hashlib.sha1(repr(key).encode("utf-8")).hexdigest()}'
+
+    # Backend failures only cost the sharing: the cache falls back to working per process
+
+    def _read_shared(self, shared_key):
+        try:
+            data = self.backend.get(shared_key)
+            return pickle.loads(data) if data is not None else None
+        except Exception as e:
+            print(f"Error reading shared {self.name} cache entry: {str(e)}")
+            return None
+
+    def _write_shared(self, shared_key, entry):
+        try:
+            # Stale entries may be served for STALE_GRACE past the TTL, so keep them that long
+            self.backend.set(shared_key, pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL),
+                             self.ttl + STALE_GRACE)
+        except Exception as e:
+            print(f"Error writing shared {self.name} cache entry: {str(e)}")
+
+    def _try_lock(self, shared_key):
+        try:
+            return self.backend.acquire_lock(shared_key, CACHE_LOCK_TTL)
+        except Exception as e:
+            print(f"Error locking shared {self.name} cache entry: {str(e)}")
+            return ''  # Load without the lock rather than wait on a broken backend
+
+    def _release_lock(self, shared_key, token):
+        try:
+            self.backend.release_lock(shared_key, token)
+        except Exception as e:
+            print(f"Error unlocking shared {self.name} cache entry: {str(e)}")
+
+    def _schedule_refresh(self, key, loader):
+        # Only one refresh per key may be in flight at a time
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        _refresh_executor.submit(self._refresh, key, loader)
+
+    def _refresh(self, key, loader):
+        try:
+            self.load(key, loader)
+        except Exception as e:
+            print(f"Error refreshing {self.name} cache entry {key}: {str(e)}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+def get_cache_ttl(name):
+    """Return the TTL for a data source, honouring CACHE_TTL_<NAME> overrides."""
+    ttl, _ = CACHE_SETTINGS[name]
+    return float(os.getenv(f'CACHE_TTL_{name.upper()}', ttl))
+
+def cached(name, shared=False):
+    """Cache a provider function's results using the settings for `name`.
+
+    The wrapped function gains `cache` (its TTLCache), `refresh(*args)`,
+    which bypasses the cache and stores a fresh result, and `aio(*args)`, a
+    coroutine version for the async server that loads on a pool thread
+    instead of blocking the event loop. Results stay in each process
+    unless `shared` is True, for functions whose only effect is their
+    result, which are then shared through the configured cache backend.
+    `shared='host'` shares only through a backend confined to one host,
+    for functions that also write host-local stores (the time series and
+    news stores): a worker on another host that adopted the result would
+    skip those writes. Loaders raise ProviderFallback when their provider
+    fails.
+    """
+    def decorator(func):
+        _, maxsize = CACHE_SETTINGS[name]
+        if shared == 'host':
+            backend = shared_backend if shared_backend is not None and shared_backend.host_local else None
+        else:
+            backend = shared_backend if shared else None
+        cache = TTLCache(name, get_cache_ttl(name), maxsize, backend=backend,
+                         namespace=f'{func.__module__}.{func.__qualname__}')
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items())))
+            return cache.get_or_load(key, lambda: func(*args, **kwargs))
+
+        # Every worker's prefetch scheduler refreshes on the same interval (see
+        # utils/scheduler.py); adopting results under half an interval old means
+        # one worker fetches per interval and the rest reuse its result
+        interval = float(os.getenv(f'PREFETCH_INTERVAL_{name.upper()}', cache.ttl))
+        refresh_window = min(cache.ttl, interval) / 2
+
+        def refresh(*args, **kwargs):
+            return cache.load((args, tuple(sorted(kwargs.items()))), lambda: func(*args, **kwargs),
+                              fresh_for=refresh_window)
+
+        async def aio(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items())))
+            return await cache.async_get_or_load(key, lambda: func(*args, **kwargs))
+
+        wrapper.cache = cache
+        wrapper.refresh = refresh
+        wrapper.aio = aio
+        return wrapper
+    return decorator
@@ -0,0 +1,223 @@
+import os
+import time
+import uuid
+from abc import ABC, abstractmethod
+from utils.sqlite import ThreadLocalSQLite
+
+# Where cached data is shared between worker processes: "memory" keeps it
+# per process, "sqlite" shares it between the workers of one host, "redis"
+# between every host using the same Redis-compatible server
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'memory')
+
+# SQLite file used by the sqlite backend
+CACHE_DB_PATH = os.getenv('CACHE_DB_PATH',
+                          os.path.join(os.path.dirname(os.path.dirname(__file__)), 'instance', 'cache.db'))
+
+# Server used by the redis backend
+CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+
+# Prefix of every key written, so several deployments can share one store
+CACHE_KEY_PREFIX = os.getenv('CACHE_KEY_PREFIX', 'dashboard:')
+
+# Longest a worker holds a refresh lock; it expires after this if the worker dies mid-load
+CACHE_LOCK_TTL = float(os.getenv('CACHE_LOCK_TTL', 30))
+
+# Longest a worker waits for another worker's load of the same key before loading it itself
+CACHE_LOCK_WAIT = float(os.getenv('CACHE_LOCK_WAIT', 10))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS locks (
+    name TEXT PRIMARY KEY,
+    token TEXT NOT NULL,
+    expires_at REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+class CacheBackend(ABC):
+    """Key-value storage shared by every worker, with expiring values, counters and locks.
+
+    Values are bytes. Everything here maps onto plain Redis commands (GET,
+    SET PX, DEL, INCR, SET NX PX and a compare-and-delete), so any
+    Redis-compatible store can implement it.
+    """
+
+    # True when only the workers of one host can reach the store
+    host_local = False
+
+    @abstractmethod
+    def get(self, key):
+        """Return the bytes stored under key, or None if missing or expired."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def set(self, key, value, ttl):
+        """Store bytes under key for ttl seconds."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, key):
+        raise NotImplementedError
+
+    @abstractmethod
+    def incr(self, key, ttl):
+        """Add one to the counter under key and return it; a new counter expires after ttl seconds."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def acquire_lock(self, name, ttl):
+        """Take the named lock for at most ttl seconds; return a token to release it with, or None if held."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def release_lock(self, name, token):
+        """Release the lock if token still holds it (it may have expired and been taken over)."""
+        raise NotImplementedError
+
+class SQLiteBackend(CacheBackend):
+    """CacheBackend in a SQLite file in WAL mode, shared by the worker processes of one host."""
+
+    host_local = True
+
+    # Expired rows are swept after this many writes
+    SWEEP_EVERY = 256
+
+    def __init__(self, path):
+        self._db = ThreadLocalSQLite(path, SCHEMA)
+        self._writes = 0
+
+    def get(self, key):
+        row = self._db.connect().execute("SELECT value FROM entries WHERE key = ? AND expires_at > ?",
+                                         (key, time.time())).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, value, ttl):
+        conn = self._db.connect()
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO entries (key, value, expires_at) VALUES (?, ?, ?)",
+                         (key, value, time.time() + ttl))
+        self._writes += 1
+        if self._writes % self.SWEEP_EVERY == 0:
+            with conn:
+                conn.execute("DELETE FROM entries WHERE expires_at <= ?", (time.time(),))
+                conn.execute("DELETE FROM locks WHERE expires_at <= ?", (time.time(),))
+
+    def delete(self, key):
+        conn = self._db.connect()
+        with conn:
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def incr(self, key, ttl):
+        now = time.time()
+        conn = self._db.connect()
+        with conn:
+            # The upsert takes the write lock, so the read below sees our own increment
+            conn.execute("INSERT INTO entries (key, value, expires_at) VALUES (?, 1, ?) "
+                         "ON CONFLICT (key) DO UPDATE SET "
+                         "value = CASE WHEN expires_at > ? THEN value + 1 ELSE 1 END, "
+                         "expires_at = CASE WHEN expires_at > ? THEN expires_at ELSE excluded.expires_at END",
+                         (key, now + ttl, now, now))
+            return conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()[0]
+
+    def acquire_lock(self, name, ttl):
+        now = time.time()
+        token = uuid.uuid4().hex
+        conn = self._db.connect()
+        with conn:
+            cursor = conn.execute("INSERT INTO locks (name, token, expires_at) VALUES (?, ?, ?) "
+                                  "ON CONFLICT (name) DO UPDATE SET token = excluded.token, "
+                                  "expires_at = excluded.expires_at WHERE locks.expires_at <= ?",
+                                  (name, token, now + ttl, now))
+        return token if cursor.rowcount else None
+
+    def release_lock(self, name, token):
+        conn = self._db.connect()
+        with conn:
+            conn.execute("DELETE FROM locks WHERE name = ? AND token = ?", (name, token))
+
+def get_redis():
+    """Return the redis module, or None if it is not installed."""
+    try:
+        import redis
+        return redis
+    except ImportError:
+        return None
+
+class RedisBackend(CacheBackend):
+    """CacheBackend on a Redis-compatible server, shared by every host that uses it."""
+
+    # Deletes the lock only if it still holds our token, in one atomic step
+    RELEASE_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+    def __init__(self, url):
+        self._client = get_redis().Redis.from_url(url)
+
+    def get(self, key):
+        return self._client.get(key)
+
+    def set(self, key, value, ttl):
+        self._client.set(key, value, px=max(1, int(ttl * 1000)))
+
+    def delete(self, key):
+        self._client.delete(key)
+
+    def incr(self, key, ttl):
+        value = self._client.incr(key)
+        if value == 1:
+            self._client.pexpire(key, max(1, int(ttl * 1000)))
+        return value
+
+    def acquire_lock(self, name, ttl):
+        token = uuid.uuid4().hex
+        if self._client.set(f'lock:{name}', token, nx=True, px=max(1, int(ttl * 1000))):
+            return token
+        return None
+
+    def release_lock(self, name, token):
+        self._client.eval(self.RELEASE_SCRIPT, 1, f'lock:{name}', token)
+
+class PrefixedBackend(CacheBackend):
+    """Adds CACHE_KEY_PREFIX to every key and lock name of another backend."""
+
+    def __init__(self, backend, prefix):
+        self._backend = backend
+        self._prefix = prefix
+        self.host_local = backend.host_local
+
+    def get(self, key):
+        return self._backend.get(self._prefix + key)
+
+    def set(self, key, value, ttl):
+        self._backend.set(self._prefix + key, value, ttl)
+
+    def delete(self, key):
+        self._backend.delete(self._prefix + key)
+
+    def incr(self, key, ttl):
+        return self._backend.incr(self._prefix + key, ttl)
+
+    def acquire_lock(self, name, ttl):
+        return self._backend.acquire_lock(self._prefix + name, ttl)
+
+    def release_lock(self, name, token):
+        self._backend.release_lock(self._prefix + name, token)
+
+def create_backend(kind=CACHE_BACKEND):
+    """Return the configured shared backend, or None to keep cached data in each process."""
+    if kind == 'sqlite':
+        return PrefixedBackend(SQLiteBackend(CACHE_DB_PATH), CACHE_KEY_PREFIX)
+    if kind == 'redis':
+        if get_redis() is None:
+            print("CACHE_BACKEND=redis needs the redis package; keeping cached data per process")
+            return None
+        return PrefixedBackend(RedisBackend(CACHE_REDIS_URL), CACHE_KEY_PREFIX)
+    if kind != 'memory':
+        print(f"Unknown CACHE_BACKEND '{kind}'; keeping cached data per process")
+    return None
+
+# The backend shared by the provider caches, the chart cache and the quota ledger
+shared_backend = create_backend()
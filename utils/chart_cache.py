@@ -0,0 +1,185 @@
+import os
+import json
+import time
+import pickle
+import hashlib
+import threading
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timezone
+from utils.metrics import record_cache_lookup
+from utils.cache_backend import shared_backend, CACHE_LOCK_TTL, CACHE_LOCK_WAIT
+from utils.singleflight import SingleFlight
+
+# Rendered PNGs kept in memory; older ones can still be served from CHART_CACHE_DIR
+CHART_CACHE_SIZE = int(os.getenv('CHART_CACHE_SIZE', 64))
+
+# Optional directory that rendered charts are spilled to, shared across restarts
+CHART_CACHE_DIR = os.getenv('CHART_CACHE_DIR')
+
+# How long rendered charts are kept in the shared cache backend, if one is configured
+CHART_SHARED_TTL = float(os.getenv('CHART_SHARED_TTL', 86400))
+
+# How often a worker waiting on another worker's render checks for the result
+RENDER_POLL_INTERVAL = 0.05
+
+CachedChart = namedtuple('CachedChart', ['png', 'etag', 'last_modified'])
+
+def data_version(data):
+    """Return a short, stable fingerprint of the data a chart is drawn from."""
+    if hasattr(data, 'fingerprint'):
+        return data.fingerprint()
+    encoded = json.dumps(data, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha1(encoded).hexdigest()[:16]
+
+class ChartCache:
+    """LRU cache of rendered chart PNGs keyed by chart, data version and render parameters.
+
+    Lookups fall through memory, then the spill directory, then the shared
+    cache backend, so a chart rendered by one worker is reused by the rest.
+    """
+
+    def __init__(self, maxsize, disk_dir=None, backend=None):
+        self.maxsize = maxsize
+        self.disk_dir = disk_dir
+        self.backend = backend
+        self._entries = OrderedDict()  # etag -> CachedChart
+        self._renders = SingleFlight('charts')
+        self._lock = threading.Lock()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def get(self, key):
+        """Return the CachedChart for key, or None if it has not been rendered yet."""
+        etag = self.etag_for(key)
+        with self._lock:
+            chart = self._entries.get(etag)
+            if chart is not None:
+                self._entries.move_to_end(etag)
+                record_cache_lookup('charts', 'hit')
+                return chart
+
+        result = 'hit'
+        chart = self._read_disk(etag)
+        if chart is None:
+            result = 'shared'
+            chart = self._read_shared(etag)
+        if chart is not None:
+            self._remember(chart)
+        record_cache_lookup('charts', result if chart is not None else 'miss')
+        return chart
+
+    def put(self, key, png):
+        """Store a freshly rendered PNG and return it as a CachedChart."""
+        chart = CachedChart(png, self.etag_for(key), datetime.now(timezone.utc).replace(microsecond=0))
+        self._remember(chart)
+        self._write_disk(chart)
+        self._write_shared(chart)
+        return chart
+
+    def get_or_render(self, key, render):
+        """Return the cached chart for key, calling render() for its PNG if there is none.
+
+        Concurrent requests for the same chart share one render. With a
+        shared backend only one worker renders a given chart; the others
+        wait up to CACHE_LOCK_WAIT seconds for its result.
+        """
+        chart = self.get(key)
+        if chart is not None:
+            return chart
+        etag = self.etag_for(key)
+        return self._renders.do(etag, lambda: self._render(key, etag, render))
+
+    def _render(self, key, etag, render):
+        with self._lock:
+            chart = self._entries.get(etag)
+        # A render that finished just before this one started
+        if chart is not None:
+            return chart
+        if self.backend is None:
+            return self.put(key, render())
+
+        token = self._try_lock(etag)
+        deadline = time.monotonic() + CACHE_LOCK_WAIT
+        try:
+            while token is None and time.monotonic() < deadline:
+                time.sleep(RENDER_POLL_INTERVAL)
+                chart = self._read_shared(etag)
+                if chart is not None:
+                    self._remember(chart)
+                    return chart
+                token = self._try_lock(etag)
+            return self.put(key, render())
+        finally:
+            if token:
+                self._release_lock(etag, token)
+
+    def etag_for(self, key):
+        # The key already pins the data version and render parameters, so its
+        # hash identifies the exact image without hashing the PNG itself
+        return hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+
+    def _remember(self, chart):
+        with self._lock:
+            self._entries[chart.etag] = chart
+            self._entries.move_to_end(chart.etag)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def _read_disk(self, etag):
+        if not self.disk_dir:
+            return None
+        path = os.path.join(self.disk_dir, f'{etag}.png')
+        try:
+            with open(path, 'rb') as f:
+                png = f.read()
+            modified = datetime.fromtimestamp(int(os.path.getmtime(path)), timezone.utc)
+            return CachedChart(png, etag, modified)
+        except OSError:
+            return None
+
+    def _write_disk(self, chart):
+        if not self.disk_dir:
+            return
+        path = os.path.join(self.disk_dir, f'{chart.etag}.png')
+        try:
+            # Write then rename so other workers never read a partial file
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(chart.png)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error spilling chart to disk: {str(e)}")
+
+    def _read_shared(self, etag):
+        if self.backend is None:
+            return None
+        try:
+            data = self.backend.get(f'chart:{etag}')
+            return CachedChart(*pickle.loads(data)) if data is not None else None
+        except Exception as e:
+            print(f"Error reading shared chart: {str(e)}")
+            return None
+
+    def _write_shared(self, chart):
+        if self.backend is None:
+            return
+        try:
+            self.backend.set(f'chart:{chart.etag}', pickle.dumps(tuple(chart)), CHART_SHARED_TTL)
+        except Exception as e:
+            print(f"Error writing shared chart: {str(e)}")
+
+    def _try_lock(self, etag):
+        try:
+            return self.backend.acquire_lock(f'chart:{etag}', CACHE_LOCK_TTL)
+        except Exception as e:
+            print(f"Error locking shared chart: {str(e)}")
+            return ''  # Render without the lock rather than wait on a broken backend
+
+    def _release_lock(self, etag, token):
+        try:
+            self.backend.release_lock(f'chart:{etag}', token)
+        except Exception as e:
+            print(f"Error unlocking shared chart: {str(e)}")
+
+# The chart cache shared by the chart routes
+chart_cache = ChartCache(CHART_CACHE_SIZE, CHART_CACHE_DIR, shared_backend)
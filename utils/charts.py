@@ -1,75 +1,127 @@
-import matplotlib.pyplot as plt
 import io
-import base64
+import os
+import threading
+import multiprocessing
 from datetime import datetime
-import seaborn as sns
-
-# Set the style for dark theme
-plt.style.use('dark_background')
-sns.set_palette("husl")
-
-def generate_weather_chart(historical_data, planet):
-    """Generate a weather chart for the given planet's historical data"""
-    plt.figure(figsize=(10, 6))
-    
-    # Extract data
-    dates = [datetime.strptime(d['date'], '%Y-%m-%d') for d in historical_data]
-    temperatures = [d['temperature'] for d in historical_data]
-    
-    # Create the plot
-    plt.plot(dates, temperatures, marker='o', linestyle='-', linewidth=2)
-    
-    # Customize the plot
-    plt.title(f'{planet.capitalize()} Temperature History', pad=20)
-    plt.xlabel('Date')
-    plt.ylabel('Temperature (°C)')
-    plt.grid(True, alpha=0.3)
-    
-    # Rotate x-axis labels for better readability
-    plt.xticks(rotation=45)
-    
-    # Adjust layout to prevent label cutoff
-    plt.tight_layout()
-    
-    # Save the plot to a bytes buffer
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png', dpi=100, bbox_inches='tight')
-    buf.seek(0)
-    plt.close()
-    
-    # Convert to base64 string
-    img_str = base64.b64encode(buf.read()).decode('utf-8')
-    return img_str
-
-def generate_stock_chart(historical_data, company_name):
-    """Generate a stock chart for the given company's historical data"""
-    plt.figure(figsize=(10, 6))
-    
-    # Extract data
-    dates = [datetime.strptime(d['date'], '%Y-%m-%d') for d in historical_data]
-    prices = [d['close'] for d in historical_data]
-    
-    # Create the plot
-    plt.plot(dates, prices, marker='o', linestyle='-', linewidth=2)
-    
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Number of render processes; 0 renders on the calling thread instead
+CHART_WORKERS = int(os.getenv('CHART_WORKERS', min(4, os.cpu_count() or 1)))
+
+# Seconds a route waits for a render before giving up
+CHART_RENDER_TIMEOUT = float(os.getenv('CHART_RENDER_TIMEOUT', 30))
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+_styled = False
+
+def _init_worker():
+    """Import and style Matplotlib once per render process."""
+    global _styled
+    if _styled:
+        return
+    import matplotlib
+    matplotlib.use('Agg')  # Use Agg backend for non-interactive mode
+    import matplotlib.style
+    import seaborn as sns
+
+    # Set dark theme for plots
+    matplotlib.style.use('dark_background')
+    sns.set_theme(style="darkgrid")
+    _styled = True
+
+def render_line_chart(dates, values, title, ylabel, label, figsize=(10, 6), dpi=100, marker=None,
+                      overlays=None, bands=None):
+    """Render a line chart to PNG bytes.
+
+    `overlays` are extra (label, values) lines and `bands` are shaded
+    (label, lower, upper) ranges drawn on the same axes, e.g. indicators.
+    Uses the object-oriented Figure API only, so no pyplot global state is
+    touched and renders are safe to run side by side.
+    """
+    _init_worker()
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    ax = fig.subplots()
+
+    # Plot the data
+    if len(dates) and isinstance(dates[0], str):
+        dates = [datetime.strptime(date, '%Y-%m-%d') for date in dates]
+    for band_label, lower, upper in bands or []:
+        ax.fill_between(dates, lower, upper, alpha=0.15, label=band_label)
+    ax.plot(dates, values, label=label, linewidth=2, marker=marker)
+    for overlay_label, overlay_values in overlays or []:
+        ax.plot(dates, overlay_values, label=overlay_label, linewidth=1.2, linestyle='--')
+
     # Customize the plot
-    plt.title(f'{company_name} Stock Price History', pad=20)
-    plt.xlabel('Date')
-    plt.ylabel('Price ($)')
-    plt.grid(True, alpha=0.3)
-    
+    ax.set_title(title, pad=20)
+    ax.set_xlabel('Date')
+    ax.set_ylabel(ylabel)
+    ax.grid(True, alpha=0.3)
+    ax.legend()
+
     # Rotate x-axis labels for better readability
-    plt.xticks(rotation=45)
-    
+    ax.tick_params(axis='x', labelrotation=45)
+
     # Adjust layout to prevent label cutoff
-    plt.tight_layout()
-    
-    # Save the plot to a bytes buffer
+    fig.tight_layout()
+
     buf = io.BytesIO()
-    plt.savefig(buf, format='png', dpi=100, bbox_inches='tight')
-    buf.seek(0)
-    plt.close()
-    
-    # Convert to base64 string
-    img_str = base64.b64encode(buf.read()).decode('utf-8')
-    return img_str 
\ No newline at end of file
+    fig.savefig(buf, format='png', dpi=dpi, bbox_inches='tight')
+    return buf.getvalue()
+
+def _get_pool():
+    """Return the render process pool, creating it on first use or after a fork."""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            # forkserver starts workers from a clean, single-threaded process;
+            # fall back to spawn where it is not available (Windows)
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+            if 'forkserver' in methods:
+                context.set_forkserver_preload(['matplotlib.figure', 'matplotlib.backends.backend_agg', 'seaborn'])
+            _pool = ProcessPoolExecutor(max_workers=CHART_WORKERS, mp_context=context,
+                                        initializer=_init_worker)
+            _pool_pid = os.getpid()
+        return _pool
+
+def _reset_pool(broken):
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+
+def submit_render(**chart):
+    """Queue a render_line_chart call and return a Future resolving to PNG bytes."""
+    if CHART_WORKERS <= 0:
+        future = Future()
+        try:
+            future.set_result(render_line_chart(**chart))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    pool = _get_pool()
+    try:
+        return pool.submit(render_line_chart, **chart)
+    except BrokenProcessPool:
+        # A render process died; start a fresh pool and retry once
+        _reset_pool(pool)
+        return _get_pool().submit(render_line_chart, **chart)
+
+def load_chart_stack():
+    """Import and style Matplotlib in this process, for renders on the calling thread (CHART_WORKERS=0)."""
+    _init_worker()
+
+def warm_up():
+    """Start every render process now so the first chart request does not pay for it."""
+    if CHART_WORKERS > 0:
+        pool = _get_pool()
+        for future in [pool.submit(_init_worker) for _ in range(CHART_WORKERS)]:
+            future.result()
@@ -0,0 +1,112 @@
+import os
+import time
+import asyncio
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from utils.metrics import DEADLINE_MISSES
+
+# Upper bound on upstream calls in flight at once across the whole app
+MAX_PROVIDER_WORKERS = int(os.getenv('MAX_PROVIDER_WORKERS', 16))
+
+# Seconds each provider gets before its fallback payload is used instead
+PROVIDER_TIMEOUTS = {
+    'weather': float(os.getenv('WEATHER_TIMEOUT', 5)),
+    'stocks': float(os.getenv('STOCKS_TIMEOUT', 8)),
+    'news': float(os.getenv('NEWS_TIMEOUT', 5))
+}
+
+# A single provider call: `fetch` is run on the pool, `fallback` is called
+# on the caller's thread if `fetch` raises or misses its `timeout`. The async
+# server awaits `afetch()` instead when the task has one
+Task = namedtuple('Task', ['fetch', 'fallback', 'timeout', 'afetch'], defaults=[None])
+
+_executor = ThreadPoolExecutor(max_workers=MAX_PROVIDER_WORKERS, thread_name_prefix='provider')
+
+def run_concurrently(tasks):
+    """Run a dict of Tasks on the shared pool and return a dict of their results.
+
+    All tasks start together, so the call takes about as long as the slowest
+    task (bounded by its timeout) rather than the sum of all of them.
+    """
+    started = time.monotonic()
+    futures = {key: _executor.submit(task.fetch) for key, task in tasks.items()}
+
+    results = {}
+    for key, future in futures.items():
+        task = tasks[key]
+        remaining = max(0, task.timeout - (time.monotonic() - started))
+        try:
+            results[key] = future.result(timeout=remaining)
+        except FutureTimeoutError:
+            print(f"Provider call for {key} missed its {task.timeout}s deadline, using fallback data")
+            DEADLINE_MISSES.inc()
+            future.cancel()
+            results[key] = task.fallback()
+        except Exception as e:
+            print(f"Provider call for {key} failed: {str(e)}")
+            results[key] = task.fallback()
+    return results
+
+async def gather_concurrently(tasks):
+    """Coroutine version of run_concurrently for the async server.
+
+    Tasks with an `afetch` are awaited on the event loop; the rest run on
+    the shared pool. Deadlines and fallbacks work as in run_concurrently.
+    """
+    loop = asyncio.get_running_loop()
+
+    async def run(key, task):
+        pending = task.afetch() if task.afetch is not None else loop.run_in_executor(_executor, task.fetch)
+        try:
+            return await asyncio.wait_for(pending, task.timeout)
+        except asyncio.TimeoutError:
+            print(f"Provider call for {key} missed its {task.timeout}s deadline, using fallback data")
+            DEADLINE_MISSES.inc()
+            return task.fallback()
+        except Exception as e:
+            print(f"Provider call for {key} failed: {str(e)}")
+            return task.fallback()
+
+    results = await asyncio.gather(*(run(key, task) for key, task in tasks.items()))
+    return dict(zip(tasks, results))
+
+class AsyncWaiters:
+    """Lets coroutines on any event loop wait for changes notified from ordinary threads."""
+
+    def __init__(self):
+        self._waiters = set()  # (loop, asyncio.Event) per waiting coroutine
+        self._lock = threading.Lock()
+
+    def notify_all(self):
+        """Wake every waiting coroutine; safe to call from any thread."""
+        with self._lock:
+            waiters = list(self._waiters)
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass  # The loop has closed; its waiters are gone
+
+    async def wait_for(self, predicate, timeout):
+        """Wait until predicate() is true or timeout seconds pass; returns the last predicate() result."""
+        loop = asyncio.get_running_loop()
+        waiter = (loop, asyncio.Event())
+        deadline = loop.time() + timeout
+        # Register before the first check so a change in between still wakes us
+        with self._lock:
+            self._waiters.add(waiter)
+        try:
+            while not predicate():
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return False
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), remaining)
+                except asyncio.TimeoutError:
+                    return predicate()
+                waiter[1].clear()
+            return True
+        finally:
+            with self._lock:
+                self._waiters.discard(waiter)
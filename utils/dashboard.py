@@ -0,0 +1,118 @@
+import asyncio
+from utils.concurrency import run_concurrently, gather_concurrently, PROVIDER_TIMEOUTS
+from utils.snapshot import snapshot
+from utils.weather import get_weather_tasks
+from utils.stocks import get_stock_tasks, get_fallback_quote, merge_quotes, get_stock_data, async_get_stock_data
+from utils.watchlist import get_watchlist, get_tracked_symbols
+from utils.news import get_news_task
+
+# Planets on the weather card
+PLANETS = ['earth', 'mars']
+
+def get_dashboard_data(symbols=None):
+    """Fetch weather, stock and news data for the dashboard in one concurrent batch.
+
+    Every provider call (each planet, each ticker or batch of tickers and the
+    news feed) is flattened into a single fan-out so the page waits for the
+    slowest call rather than for all of them in turn. `symbols` defaults to
+    the shared watchlist.
+    """
+    if symbols is None:
+        symbols = get_watchlist()
+    return build_dashboard_data(run_concurrently(get_dashboard_tasks(symbols)), symbols)
+
+async def async_get_dashboard_data(symbols=None):
+    """Coroutine version of get_dashboard_data for the async server."""
+    if symbols is None:
+        symbols = get_watchlist()
+    return build_dashboard_data(await gather_concurrently(get_dashboard_tasks(symbols)), symbols)
+
+def get_dashboard_tasks(symbols):
+    """Return every provider task of the dashboard, keyed by (section, key)."""
+    tasks = {('news', None): get_news_task()}
+    for planet, task in get_weather_tasks().items():
+        tasks[('weather', planet)] = task
+    for key, task in get_stock_tasks(symbols).items():
+        tasks[('stocks', key)] = task
+    return tasks
+
+def build_dashboard_data(results, symbols):
+    """Arrange the results of the dashboard tasks into the dashboard payload."""
+    data = {'weather_data': {}, 'stocks_data': {}, 'news_data': results[('news', None)]}
+    stock_results = {}
+    for (section, key), result in results.items():
+        if section == 'weather':
+            data['weather_data'][key] = result
+        elif section == 'stocks':
+            stock_results[key] = result
+    data['stocks_data'] = merge_quotes(stock_results, symbols)
+    return data
+
+def get_dashboard_snapshot(symbols=None, timeout=None, quotes=None):
+    """Return the dashboard data published by the prefetch scheduler.
+
+    Right after startup the first prefetch may still be running, so this
+    waits up to `timeout` seconds (the longest provider deadline by default)
+    for the cards the scheduler fetches, and fills any card that is still
+    missing with its fallback payload. Symbols the scheduler does not track
+    are fetched for this request through the quote caches, unless `quotes`
+    already holds them. `symbols` defaults to the shared watchlist.
+    """
+    if symbols is None:
+        symbols = get_watchlist()
+    if timeout is None:
+        timeout = max(PROVIDER_TIMEOUTS.values())
+    tracked, untracked = split_tracked(symbols)
+    if quotes is None:
+        quotes = get_stock_data(untracked) if untracked else {}
+    snapshot.wait_for(lambda current: is_complete(current, tracked), timeout)
+
+    # Rebuild the sections in display order, since jobs publish in completion order
+    data = snapshot.read()
+    weather_data = {}
+    for planet, task in get_weather_tasks().items():
+        weather_data[planet] = data['weather_data'].get(planet) or task.fallback()
+    stocks_data = {}
+    for symbol in symbols:
+        stocks_data[symbol] = (quotes.get(symbol) or data['stocks_data'].get(symbol)
+                               or get_fallback_quote(symbol))
+    news_data = data['news_data'] if data['news_data'] is not None else get_news_task().fallback()
+
+    return {'weather_data': weather_data, 'stocks_data': stocks_data, 'news_data': news_data}
+
+async def async_wait_for_dashboard(symbols=None, timeout=None):
+    """Wait without blocking the event loop until the snapshot covers every tracked card, or timeout passes.
+
+    Fetches the symbols the scheduler does not track meanwhile and returns
+    their quotes, so get_dashboard_snapshot(symbols, timeout=0, quotes=...)
+    returns at once.
+    """
+    if symbols is None:
+        symbols = get_watchlist()
+    if timeout is None:
+        timeout = max(PROVIDER_TIMEOUTS.values())
+    tracked, untracked = split_tracked(symbols, await get_tracked_symbols.aio())
+    if not untracked:
+        await snapshot.async_wait_for(lambda current: is_complete(current, tracked), timeout)
+        return {}
+    _, quotes = await asyncio.gather(
+        snapshot.async_wait_for(lambda current: is_complete(current, tracked), timeout),
+        async_get_stock_data(untracked))
+    return quotes
+
+async def async_get_dashboard_snapshot(symbols=None, timeout=None):
+    """Coroutine version of get_dashboard_snapshot for the async server."""
+    quotes = await async_wait_for_dashboard(symbols, timeout)
+    return get_dashboard_snapshot(symbols, timeout=0, quotes=quotes)
+
+def split_tracked(symbols, tracked=None):
+    """Return (symbols the prefetch scheduler fetches, symbols it does not), each in order."""
+    tracked = set(get_tracked_symbols() if tracked is None else tracked)
+    return [symbol for symbol in symbols if symbol in tracked], [symbol for symbol in symbols if symbol not in tracked]
+
+def is_complete(current, symbols):
+    """Return True once every dashboard card and symbol has been published at least once."""
+    stocks_data = current.get('stocks_data')
+    return (current.get('news_data') is not None
+            and set(current.get('weather_data')) >= set(PLANETS)
+            and all(symbol in stocks_data for symbol in symbols))
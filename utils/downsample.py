@@ -0,0 +1,47 @@
+import numpy as np
+
+def lttb_indices(values, points):
+    """Return the positions of at most `points` values that keep the line's shape.
+
+    Largest-Triangle-Three-Buckets: the first and last values are always
+    kept, and each bucket in between keeps the value forming the largest
+    triangle with the previous pick and the next bucket's average, so
+    peaks and troughs survive. Missing values (NaN) are interpolated for
+    the selection only. Every position is returned when there are no more
+    values than points; a single point keeps the latest value.
+    """
+    if points < 1:
+        raise ValueError(f"points must be at least 1, got {points}")
+    values = np.asarray(values, dtype=np.float64)
+    count = len(values)
+    if count <= points:
+        return np.arange(count)
+    if points == 1:
+        return np.array([count - 1])
+    if points == 2:
+        return np.array([0, count - 1])
+
+    x = np.arange(count, dtype=np.float64)
+    missing = np.isnan(values)
+    if missing.all():
+        return np.linspace(0, count - 1, points).astype(int)
+    if missing.any():
+        values = np.interp(x, x[~missing], values[~missing])
+
+    # Buckets for the interior points; the first and last points are their own
+    edges = np.linspace(1, count - 1, points - 1).astype(int)
+    selected = np.empty(points, dtype=int)
+    selected[0], selected[-1] = 0, count - 1
+    previous = 0
+    for bucket in range(points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        if bucket + 2 < len(edges):
+            next_x = x[end:edges[bucket + 2]].mean()
+            next_y = values[end:edges[bucket + 2]].mean()
+        else:
+            next_x, next_y = x[-1], values[-1]
+        # Twice the triangle's area; the constant factor does not change the pick
+        area = np.abs((x[previous] - next_x) * (values[start:end] - values[previous])
+                      - (x[previous] - x[start:end]) * (next_y - values[previous]))
+        previous = selected[bucket + 1] = start + int(np.argmax(area))
+    return selected
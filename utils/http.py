@@ -0,0 +1,85 @@
+import os
+import threading
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from utils.concurrency import MAX_PROVIDER_WORKERS
+from utils.ratelimit import acquire, record_retry, report_throttled
+from utils.metrics import upstream_call
+
+# Seconds to wait for a connection and then for each read from the upstream API
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 3.05))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', 10))
+
+# Extra attempts on connection errors and 5xx responses
+HTTP_RETRIES = int(os.getenv('HTTP_RETRIES', 2))
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+def _accept_encoding():
+    # requests decompresses gzip and deflate itself; brotli only when a decoder is installed
+    try:
+        import brotli  # noqa: F401
+        return 'gzip, deflate, br'
+    except ImportError:
+        return 'gzip, deflate'
+
+class LedgerRetry(Retry):
+    """Retry that counts every extra attempt against the provider's daily budget."""
+
+    def __init__(self, *args, provider=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.provider = provider
+
+    def new(self, **kwargs):
+        retry = super().new(**kwargs)
+        retry.provider = self.provider
+        return retry
+
+    def increment(self, *args, **kwargs):
+        # Raises instead of returning once the retries are used up, so only real attempts are counted
+        retry = super().increment(*args, **kwargs)
+        record_retry(self.provider)
+        return retry
+
+def get_session(provider, url):
+    """Return the pooled keep-alive session for the provider's host serving url."""
+    host = urlsplit(url).netloc
+    with _sessions_lock:
+        session = _sessions.get((provider, host))
+        if session is None:
+            # 429 is not retried: the caller backs off instead of spending more of the budget
+            retry = LedgerRetry(total=HTTP_RETRIES,
+                                backoff_factor=0.5,
+                                status_forcelist=[500, 502, 503, 504],
+                                allowed_methods=['GET'],
+                                # A long Retry-After would pin the worker; the scheduler backs off instead
+                                respect_retry_after_header=False,
+                                raise_on_status=False,
+                                provider=provider)
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=MAX_PROVIDER_WORKERS, max_retries=retry)
+            session = requests.Session()
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers['Accept-Encoding'] = _accept_encoding()
+            _sessions[(provider, host)] = session
+        return session
+
+def http_get(provider, url, params=None):
+    """GET url through the provider's rate limit, on a pooled session with timeouts.
+
+    Raises QuotaExceeded without touching the network once the provider's
+    budget is spent. A 429 response is returned as-is and marks the
+    provider throttled, so its prefetch job backs off.
+    """
+    acquire(provider)
+    with upstream_call(provider) as call:
+        response = get_session(provider, url).get(url, params=params,
+                                                  timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+        if response.status_code >= 400:
+            call.outcome = 'error'
+    if response.status_code == 429:
+        report_throttled(provider)
+    return response
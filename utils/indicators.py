@@ -0,0 +1,281 @@
+import os
+import threading
+from collections import OrderedDict, namedtuple
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from utils.stocks import get_historical_stock_data, INDICATOR_HISTORY_DAYS
+from utils.timeseries import timeseries
+from utils.downsample import lttb_indices
+
+# Number of (symbol, indicator, window) results kept in memory
+INDICATOR_CACHE_SIZE = int(os.getenv('INDICATOR_CACHE_SIZE', 512))
+
+# Standard deviations between the Bollinger middle band and the outer bands
+BOLLINGER_WIDTH = 2
+
+# Trading days per year, used to annualise volatility
+TRADING_DAYS = 252
+
+def _rolling_mean(values, window):
+    out = np.full(len(values), np.nan)
+    if len(values) >= window:
+        out[window - 1:] = sliding_window_view(values, window).mean(axis=1)
+    return out
+
+def _rolling_std(values, window, ddof=0):
+    out = np.full(len(values), np.nan)
+    if len(values) >= window:
+        out[window - 1:] = sliding_window_view(values, window).std(axis=1, ddof=ddof)
+    return out
+
+def _smooth(seed, values, alpha):
+    # Exponential smoothing y[i] = y[i-1] + alpha * (x[i] - y[i-1]) starting from seed.
+    # pandas is slow to import, so it is only loaded once an indicator needs it
+    import pandas as pd
+    smoothed = pd.Series(np.concatenate(([seed], values))).ewm(alpha=alpha, adjust=False).mean()
+    return smoothed.to_numpy()[1:]
+
+def _returns(values):
+    out = np.full(len(values), np.nan)
+    out[1:] = values[1:] / values[:-1] - 1
+    return out
+
+def sma(values, window, seed=None):
+    """Simple moving average of the last `window` closes."""
+    return {'sma': _rolling_mean(values, window)}
+
+def bollinger(values, window, seed=None):
+    """Moving average with bands BOLLINGER_WIDTH standard deviations either side."""
+    middle = _rolling_mean(values, window)
+    spread = BOLLINGER_WIDTH * _rolling_std(values, window)
+    return {'middle': middle, 'upper': middle + spread, 'lower': middle - spread}
+
+def daily_returns(values, window=None, seed=None):
+    """Fractional change of each close from the previous one."""
+    return {'returns': _returns(values)}
+
+def volatility(values, window, seed=None):
+    """Annualised standard deviation of daily returns over `window` days."""
+    out = np.full(len(values), np.nan)
+    out[1:] = _rolling_std(_returns(values)[1:], window, ddof=1) * np.sqrt(TRADING_DAYS)
+    return {'volatility': out}
+
+def ema(values, window, seed=None):
+    """Exponential moving average, seeded with the simple average of the first window."""
+    alpha = 2 / (window + 1)
+    if seed is not None:
+        return {'ema': _smooth(seed['ema'], values, alpha)}
+    out = np.full(len(values), np.nan)
+    if len(values) >= window:
+        out[window - 1] = values[:window].mean()
+        out[window:] = _smooth(out[window - 1], values[window:], alpha)
+    return {'ema': out}
+
+def rsi(values, window, seed=None):
+    """Wilder's relative strength index.
+
+    The smoothed average gain and loss are kept as hidden outputs so a later
+    day can be added without recomputing the whole series.
+    """
+    changes = np.diff(values)
+    gains = np.clip(changes, 0, None)
+    losses = np.clip(-changes, 0, None)
+    avg_gain = np.full(len(values), np.nan)
+    avg_loss = np.full(len(values), np.nan)
+    if seed is not None:
+        avg_gain[1:] = _smooth(seed['_gain'], gains, 1 / window)
+        avg_loss[1:] = _smooth(seed['_loss'], losses, 1 / window)
+    elif len(changes) >= window:
+        avg_gain[window] = gains[:window].mean()
+        avg_loss[window] = losses[:window].mean()
+        avg_gain[window + 1:] = _smooth(avg_gain[window], gains[window:], 1 / window)
+        avg_loss[window + 1:] = _smooth(avg_loss[window], losses[window:], 1 / window)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        strength = 100 - 100 / (1 + avg_gain / avg_loss)
+    # No losses at all over the window means maximum strength
+    strength = np.where((avg_loss == 0) & ~np.isnan(avg_gain), 100.0, strength)
+    return {'rsi': strength, '_gain': avg_gain, '_loss': avg_loss}
+
+# kernel(values, window, seed) returns output arrays aligned with values.
+# `lookback` is how many earlier closes the first new output depends on;
+# recursive kernels also continue from `seed`, their outputs on the day before.
+Indicator = namedtuple('Indicator', ['kernel', 'default_window', 'lookback', 'recursive', 'overlay'])
+
+INDICATORS = {
+    'sma': Indicator(sma, 20, lambda window: window - 1, False, True),
+    'ema': Indicator(ema, 12, lambda window: 0, True, True),
+    'bollinger': Indicator(bollinger, 20, lambda window: window - 1, False, True),
+    'rsi': Indicator(rsi, 14, lambda window: 1, True, False),
+    'returns': Indicator(daily_returns, None, lambda window: 1, False, False),
+    'volatility': Indicator(volatility, 20, lambda window: window, False, False)
+}
+
+def parse_indicators(spec, overlays_only=False):
+    """Parse a spec like 'sma:20,rsi,bollinger:10' into (name, window) pairs.
+
+    Raises ValueError for unknown indicators or unusable windows.
+    """
+    parsed = []
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        name, _, window = item.partition(':')
+        name = name.lower()
+        indicator = INDICATORS.get(name)
+        if indicator is None:
+            raise ValueError(f"Unknown indicator '{name}'")
+        if overlays_only and not indicator.overlay:
+            raise ValueError(f"'{name}' cannot be drawn over the price chart")
+        if indicator.default_window is None:
+            parsed.append((name, None))
+            continue
+        if not window:
+            window = indicator.default_window
+        elif not window.isdigit() or not 2 <= int(window) <= INDICATOR_HISTORY_DAYS:
+            raise ValueError(f"Window for '{name}' must be between 2 and {INDICATOR_HISTORY_DAYS}")
+        parsed.append((name, int(window)))
+    return parsed
+
+IndicatorState = namedtuple('IndicatorState', ['dates', 'close', 'outputs'])
+
+class IndicatorEngine:
+    """Indicator results per (symbol, indicator, window), extended as new days arrive.
+
+    When the time-series store appends days for a symbol, every cached
+    indicator of that symbol is recomputed only from the first changed day,
+    using the kernel's lookback (or its previous state for recursive ones).
+    """
+
+    def __init__(self, maxsize, history):
+        self.maxsize = maxsize
+        self.history = history
+        self._entries = OrderedDict()  # (symbol, name, window) -> IndicatorState
+        self._lock = threading.Lock()
+
+    def compute(self, symbol, name, window, series):
+        """Return the indicator's outputs aligned with series."""
+        key = (symbol, name, window)
+        with self._lock:
+            state = self._entries.get(key)
+            if state is not None:
+                self._entries.move_to_end(key)
+
+        if state is None or not len(state.dates) or series.dates[0] < state.dates[0]:
+            state = self._update(name, window, None, series)
+        else:
+            state = self._update(name, window, state, series)
+        self._store(key, state)
+
+        # The cached state can reach further back than the requested series
+        offset = np.searchsorted(state.dates, series.dates[0])
+        return {output: values[offset:offset + len(series)]
+                for output, values in state.outputs.items() if not output.startswith('_')}
+
+    def append(self, symbol, series):
+        """Extend every cached indicator of symbol with newly stored days."""
+        if not series:
+            return
+        with self._lock:
+            keys = [key for key in self._entries if key[0] == symbol]
+        for key in keys:
+            with self._lock:
+                state = self._entries.get(key)
+            if state is None or series.dates[0] < state.dates[0]:
+                continue
+            _, name, window = key
+            self._store(key, self._update(name, window, state, series))
+
+    def _update(self, name, window, state, series):
+        if state is None:
+            dates, close, start, prior = series.dates, series.close, 0, {}
+        else:
+            # Keep cached days before the series starts and take the series from there on
+            keep = np.searchsorted(state.dates, series.dates[0])
+            dates = np.concatenate((state.dates[:keep], series.dates))
+            close = np.concatenate((state.close[:keep], series.close))
+            overlap = min(len(state.dates), len(dates))
+            unchanged = ((state.dates[:overlap] == dates[:overlap]) &
+                         (state.close[:overlap] == close[:overlap]))
+            start = overlap if unchanged.all() else int(np.argmin(unchanged))
+            if start == len(dates) == len(state.dates):
+                return state
+            prior = {output: values[:start] for output, values in state.outputs.items()}
+
+        indicator = INDICATORS[name]
+        seed = None
+        if start and indicator.recursive:
+            seed = {output: values[start - 1] for output, values in prior.items()}
+            if any(np.isnan(value) for value in seed.values()):
+                # Still warming up on the day before; start over
+                start, seed = 0, None
+        begin = max(0, start - indicator.lookback(window)) if start else 0
+
+        computed = indicator.kernel(close[begin:], window, seed)
+        outputs = {output: np.concatenate((prior.get(output, np.empty(0))[:start], values[start - begin:]))
+                   for output, values in computed.items()}
+
+        # Only the most recent days are kept; older ones no longer affect new outputs
+        if len(dates) > self.history:
+            trim = len(dates) - self.history
+            dates, close = dates[trim:], close[trim:]
+            outputs = {output: values[trim:] for output, values in outputs.items()}
+        return IndicatorState(dates, close, outputs)
+
+    def _store(self, key, state):
+        with self._lock:
+            self._entries[key] = state
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+indicator_engine = IndicatorEngine(INDICATOR_CACHE_SIZE, INDICATOR_HISTORY_DAYS)
+timeseries.on_stock_append(indicator_engine.append)
+
+def indicator_label(name, window):
+    return name if window is None else f'{name}_{window}'
+
+def get_indicator_history(symbol, indicators, days=30):
+    """Return the last `days` of symbol's history and the requested indicators over them.
+
+    Indicators are computed over INDICATOR_HISTORY_DAYS so their warm-up
+    period falls before the returned window. Returns (series, {label: outputs}).
+    """
+    history = get_historical_stock_data(symbol, max(days, INDICATOR_HISTORY_DAYS))
+    series = history.tail(days)
+    results = {}
+    if not series:
+        return series, results
+    for name, window in indicators:
+        outputs = indicator_engine.compute(symbol, name, window, history)
+        results[indicator_label(name, window)] = {output: values[-len(series):]
+                                                  for output, values in outputs.items()}
+    return series, results
+
+def _to_json(values):
+    # JSON has no NaN; days still warming up are null
+    return [None if np.isnan(value) else round(value, 6) for value in values.tolist()]
+
+def get_stock_indicators(symbol, indicators, days=30):
+    """Return symbol's closes and indicators over the last `days` as JSON-ready lists."""
+    series, results = get_indicator_history(symbol, indicators, days)
+    return indicators_to_json(symbol, series, results)
+
+def indicators_to_json(symbol, series, results, points=None):
+    """Return a series' closes and indicator outputs as JSON-ready lists.
+
+    With `points`, only the days picked by lttb_indices on the closes are
+    kept, the same days for every indicator.
+    """
+    keep = slice(None) if points is None else lttb_indices(series.close, points)
+    response = {
+        'symbol': symbol,
+        'date': np.datetime_as_string(series.dates[keep], unit='D').tolist(),
+        'close': series.close[keep].tolist(),
+        'indicators': {}
+    }
+    for label, outputs in results.items():
+        # Single-output indicators are returned as a plain list
+        if len(outputs) == 1:
+            response['indicators'][label] = _to_json(next(iter(outputs.values()))[keep])
+        else:
+            response['indicators'][label] = {output: _to_json(values[keep]) for output, values in outputs.items()}
+    return response
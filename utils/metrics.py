@@ -0,0 +1,191 @@
+import time
+import threading
+from types import SimpleNamespace
+from contextlib import contextmanager
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Every metric defined in this process, in the order they are exported
+REGISTRY = []
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+class Metric:
+    """A named family of samples keyed by label values, exported in the Prometheus text format."""
+
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} takes labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def samples(self):
+        """Return (suffix, label pairs, value) for every exported sample."""
+        with self._lock:
+            return [('', list(zip(self.labels, key)), value) for key, value in self._values.items()]
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for suffix, pairs, value in self.samples():
+            lines.append(f'{self.name}{suffix}{_format_labels(pairs)} {_format_value(value)}')
+        return '\n'.join(lines)
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples_by_key(self):
+        """Return {label values: count} for every labelled series."""
+        with self._lock:
+            return dict(self._values)
+
+class Gauge(Metric):
+    """A value that goes up and down; `collect` computes all values at export time instead of set()."""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labels=(), collect=None):
+        super().__init__(name, documentation, labels)
+        self._collect = collect
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self):
+        if self._collect is None:
+            return super().samples()
+        try:
+            values = self._collect()
+        except Exception as e:
+            print(f"Error collecting {self.name}: {str(e)}")
+            return []
+        return [('', list(zip(self.labels, key)), value) for key, value in values.items()]
+
+class Histogram(Metric):
+    """Counts observations into cumulative `le` buckets, plus their sum and count."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        with self._lock:
+            values = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        samples = []
+        for key, counts, total in values:
+            pairs = list(zip(self.labels, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                samples.append(('_bucket', pairs + [('le', _format_value(bound))], cumulative))
+            samples.append(('_sum', pairs, total))
+            samples.append(('_count', pairs, cumulative))
+        return samples
+
+def render_metrics():
+    """Return every registered metric in the Prometheus text exposition format."""
+    return '\n'.join(metric.render() for metric in REGISTRY) + '\n'
+
+UPSTREAM_CALLS = Counter('dashboard_upstream_calls_total',
+                         'Calls made to upstream APIs, by provider and outcome (ok or error).',
+                         ['provider', 'outcome'])
+UPSTREAM_LATENCY = Histogram('dashboard_upstream_call_seconds',
+                             'Latency of upstream API calls, including client-side retries.',
+                             ['provider'])
+QUOTA_REFUSALS = Counter('dashboard_quota_refusals_total',
+                         'Calls refused for quota reasons, locally before the call or by the provider.',
+                         ['provider', 'reason'])
+FALLBACKS = Counter('dashboard_fallbacks_total',
+                    'Payloads built from fallback or simulated data instead of a provider response.',
+                    ['source'])
+DEADLINE_MISSES = Counter('dashboard_provider_deadline_misses_total',
+                          'Concurrent provider fetches that missed their deadline.')
+CACHE_LOOKUPS = Counter('dashboard_cache_lookups_total',
+                        'Cache lookups by cache and result (hit, stale, shared or miss).',
+                        ['cache', 'result'])
+COALESCED_CALLS = Counter('dashboard_coalesced_calls_total',
+                          'Calls that waited for an identical call already in flight instead of running.',
+                          ['group'])
+
+def cache_hit_ratios():
+    """Return {(cache,): share of lookups answered from the cache} since the process started."""
+    totals = {}
+    for (cache, result), count in CACHE_LOOKUPS.samples_by_key().items():
+        hits, lookups = totals.get(cache, (0, 0))
+        totals[cache] = (hits + (count if result != 'miss' else 0), lookups + count)
+    return {(cache,): hits / lookups for cache, (hits, lookups) in totals.items() if lookups}
+
+CACHE_HIT_RATIO = Gauge('dashboard_cache_hit_ratio',
+                        'Share of lookups answered from the cache (fresh or stale) since start.',
+                        ['cache'], collect=cache_hit_ratios)
+
+@contextmanager
+def upstream_call(provider):
+    """Time one upstream API call and count its outcome.
+
+    The call counts as an error if the block raises or sets `outcome` on
+    the yielded object to 'error', e.g. for an HTTP error status.
+    """
+    call = SimpleNamespace(outcome=None)
+    started = time.perf_counter()
+    try:
+        yield call
+    except BaseException:
+        call.outcome = 'error'
+        raise
+    finally:
+        UPSTREAM_LATENCY.observe(time.perf_counter() - started, provider=provider)
+        UPSTREAM_CALLS.inc(provider=provider, outcome=call.outcome or 'ok')
+
+def record_fallback(source):
+    FALLBACKS.inc(source=source)
+
+def record_cache_lookup(cache, result):
+    CACHE_LOOKUPS.inc(cache=cache, result=result)
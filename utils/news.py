@@ -1,12 +1,154 @@
 import os
-from newsapi import NewsApiClient
-from datetime import datetime, timedelta
+from newsapi import NewsApiClient, const as newsapi_const
+from datetime import datetime, timedelta, timezone
+from utils.concurrency import Task, PROVIDER_TIMEOUTS
+from utils.cache import cached, ProviderFallback
+from utils.ratelimit import acquire, report_quota_error
+from utils.metrics import upstream_call, record_fallback
+from utils.news_store import news_store
 
+# NewsAPI base URL; point it at a local stand-in (see bench/) to run offline
+NEWS_API_BASE_URL = os.getenv('NEWS_API_BASE_URL')
+if NEWS_API_BASE_URL:
+    # The client library reads its endpoint from module constants
+    newsapi_const.EVERYTHING_URL = f"{NEWS_API_BASE_URL.rstrip('/')}/v2/everything"
+
+# NewsAPI query the local article store is filled from
+NEWS_QUERY = os.getenv('NEWS_QUERY', 'space exploration OR NASA OR SpaceX OR Blue Origin')
+
+# Hours of news fetched on the first poll, while the store is still empty
+NEWS_BACKFILL_HOURS = int(os.getenv('NEWS_BACKFILL_HOURS', 24))
+
+# Articles requested per page (NewsAPI allows at most 100)
+NEWS_FETCH_SIZE = int(os.getenv('NEWS_FETCH_SIZE', 100))
+
+# Most pages requested in one poll while catching up to the stored articles
+NEWS_MAX_PAGES = int(os.getenv('NEWS_MAX_PAGES', 5))
+
+# Articles shown on the dashboard card
+NEWS_CARD_SIZE = 5
+
+def get_poll_cursor():
+    """Return the `from` time for the next poll: the newest stored publishedAt, or the backfill window."""
+    now = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S')
+    latest = news_store.latest_published()
+    if latest is None:
+        return (datetime.now(timezone.utc) - timedelta(hours=NEWS_BACKFILL_HOURS)).strftime('%Y-%m-%dT%H:%M:%S')
+    # NewsAPI takes UTC times without the zone suffix; never poll from the future
+    return min(latest[:19], now)
+
+def ingest_news(api_key):
+    """Fetch articles published since the newest stored one and store the new ones.
+
+    Results come newest first, so pages are requested until one reaches
+    the cursor or the results run out, up to NEWS_MAX_PAGES. Nothing is
+    stored until then: the cursor only moves once the gap is filled, and a
+    failed poll is retried from the same place. The cursor is inclusive,
+    so the newest stored article comes back again and is dropped by the
+    store's deduplication. Returns the number of new articles.
+    """
+    newsapi = NewsApiClient(api_key=api_key)
+    cursor = get_poll_cursor()
+    articles = []
+    for page in range(1, NEWS_MAX_PAGES + 1):
+        acquire('newsapi')
+        try:
+            with upstream_call('newsapi'):
+                response = newsapi.get_everything(
+                    q=NEWS_QUERY,
+                    from_param=cursor,
+                    language='en',
+                    sort_by='publishedAt',
+                    page_size=NEWS_FETCH_SIZE,
+                    page=page
+                )
+        except Exception as e:
+            # Plans that cap how deep results go refuse later pages; keep what came back
+            if page > 1 and getattr(e, 'get_code', lambda: None)() == 'maximumResultsReached':
+                print(f"News API results end at page {page - 1}; older new articles were skipped")
+                break
+            raise
+        if response.get('status') != 'ok':
+            raise Exception(response.get('message', 'Unexpected News API response'))
+        batch = response.get('articles') or []
+        articles.extend(batch)
+        reached_cursor = any((article.get('publishedAt') or '')[:19] <= cursor for article in batch)
+        if reached_cursor or len(batch) < NEWS_FETCH_SIZE or len(articles) >= response.get('totalResults', 0):
+            break
+    else:
+        print(f"News API still had articles newer than {cursor} after {NEWS_MAX_PAGES} pages; older ones were skipped")
+    added = news_store.add_articles(articles)
+    news_store.prune()
+    return added
+
+# Ingests into the local article store, so results are only shared on this host
+@cached('news', shared='host')
 def get_space_news():
+    """Poll NewsAPI for new articles and return the newest stored ones for the dashboard card."""
     api_key = os.getenv('NEWS_API_KEY')
     
-    # Fallback news articles
-    fallback_articles = [
+    if not api_key:
+        return get_fallback_news('Using fallback data - News API key not configured')
+    
+    try:
+        ingest_news(api_key)
+    except Exception as e:
+        print(f"Error fetching news: {str(e)}")
+        limited = report_quota_error('newsapi', e)
+        articles = news_store.latest(NEWS_CARD_SIZE)
+        if articles:
+            # Articles ingested earlier are still worth showing
+            note = 'Showing stored articles - News API limit reached' if limited else 'Showing stored articles - News API unavailable'
+            fallback = {'articles': articles, 'timestamp': datetime.now().isoformat(), 'note': note}
+        elif limited:
+            fallback = get_fallback_news('Using fallback data - News API limit reached')
+        else:
+            fallback = get_fallback_news('Using fallback data due to connection issues')
+        raise ProviderFallback(fallback, str(e))
+    
+    articles = news_store.latest(NEWS_CARD_SIZE)
+    if not articles:
+        return get_fallback_news('Using fallback data - No articles found')
+    return {'articles': articles, 'timestamp': datetime.now().isoformat()}
+
+async def async_get_space_news():
+    """Coroutine version of get_space_news for the async server."""
+    return await get_space_news.aio()
+
+def get_news_page(page, per_page):
+    """Return (articles on a 1-based page, newest first, total) from the local store.
+
+    Serves the fallback articles while nothing has been ingested yet.
+    """
+    total = news_store.count()
+    if not total:
+        articles = get_fallback_articles()
+        return articles[(page - 1) * per_page:page * per_page], len(articles)
+    return news_store.latest(per_page, (page - 1) * per_page), total
+
+def search_news(query, page, per_page):
+    """Return (articles matching every term of query on a 1-based page, total matches)."""
+    total, articles = news_store.search(query, per_page, (page - 1) * per_page)
+    return articles, total
+
+def get_news_task():
+    """Return the fetch task for the space news feed."""
+    return Task(get_space_news,
+                lambda: get_fallback_news('Using fallback data - News API timed out'),
+                PROVIDER_TIMEOUTS['news'], get_space_news.aio)
+
+def get_fallback_news(note):
+    """Return the fallback news payload with the given note."""
+    record_fallback('news')
+    return {
+        'articles': get_fallback_articles(),
+        'timestamp': datetime.now().isoformat(),
+        'note': note
+    }
+
+def get_fallback_articles():
+    """Return the fallback news articles."""
+    return [
         {
             'title': 'NASA Announces New Mars Mission',
             'description': 'NASA reveals plans for a new Mars exploration mission scheduled for 2026.',
@@ -29,44 +171,3 @@ def get_space_news():
             'publishedAt': datetime.now().isoformat()
         }
     ]
-    
-    if not api_key:
-        return {
-            'articles': fallback_articles,
-            'timestamp': datetime.now().isoformat(),
-            'note': 'Using fallback data - News API key not configured'
-        }
-    
-    try:
-        newsapi = NewsApiClient(api_key=api_key)
-        
-        # Get news from the last 24 hours
-        from_date = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
-        
-        # Search for space-related news
-        response = newsapi.get_everything(
-            q='space exploration OR NASA OR SpaceX OR Blue Origin',
-            from_param=from_date,
-            language='en',
-            sort_by='relevancy'
-        )
-        
-        if response.get('status') == 'ok' and response.get('articles'):
-            return {
-                'articles': response['articles'][:5],  # Return top 5 articles
-                'timestamp': datetime.now().isoformat()
-            }
-        else:
-            return {
-                'articles': fallback_articles,
-                'timestamp': datetime.now().isoformat(),
-                'note': 'Using fallback data - No articles found'
-            }
-            
-    except Exception as e:
-        print(f"Error fetching news: {str(e)}")
-        return {
-            'articles': fallback_articles,
-            'timestamp': datetime.now().isoformat(),
-            'note': 'Using fallback data due to connection issues'
-        } 
\ No newline at end of file
@@ -0,0 +1,159 @@
+import os
+import re
+import hashlib
+from datetime import datetime, timedelta, timezone
+from utils.sqlite import ThreadLocalSQLite
+
+# SQLite file holding ingested news articles and their search index
+NEWS_DB_PATH = os.getenv('NEWS_DB_PATH',
+                         os.path.join(os.path.dirname(os.path.dirname(__file__)), 'instance', 'news.db'))
+
+# Articles published longer ago than this are dropped from the store and the index
+NEWS_RETENTION_DAYS = int(os.getenv('NEWS_RETENTION_DAYS', 30))
+
+# Title terms count this many times a body term when ranking search results
+TITLE_WEIGHT = 3
+
+STOP_WORDS = frozenset(
+    'a an and are as at be by for from has have in is it its of on or that the this to was were will with'.split())
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    url_hash TEXT NOT NULL UNIQUE,
+    title_hash TEXT NOT NULL UNIQUE,
+    published_at TEXT NOT NULL,
+    title TEXT, description TEXT, content TEXT, url TEXT, url_to_image TEXT,
+    source TEXT, author TEXT
+);
+CREATE INDEX IF NOT EXISTS articles_published ON articles (published_at);
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    weight INTEGER NOT NULL,
+    PRIMARY KEY (term, seq)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_seq ON postings (seq);
+"""
+
+ARTICLE_COLUMNS = 'seq, published_at, title, description, content, url, url_to_image, source, author'
+
+def tokenize(text):
+    """Split text into lower-case search terms, without stop words and single characters."""
+    return [term for term in re.findall(r'[a-z0-9]+', (text or '').lower())
+            if len(term) > 1 and term not in STOP_WORDS]
+
+def _digest(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+def normalize_title(title, source):
+    """Return the title as compared for duplicates: lower case, without a trailing " - Source"."""
+    title = ' '.join((title or '').lower().split())
+    suffix = f" - {(source or '').lower()}"
+    if source and title.endswith(suffix):
+        title = title[:-len(suffix)]
+    return title
+
+def article_terms(article):
+    """Return {term: weight} for an article; title terms weigh more than body terms."""
+    weights = {}
+    for term in tokenize(article.get('title')):
+        weights[term] = weights.get(term, 0) + TITLE_WEIGHT
+    body = ' '.join(filter(None, [article.get('description'), article.get('content'),
+                                  (article.get('source') or {}).get('name')]))
+    for term in tokenize(body):
+        weights[term] = weights.get(term, 0) + 1
+    return weights
+
+def to_article(row):
+    """Turn a stored row back into the NewsAPI article shape the dashboard renders."""
+    _, published_at, title, description, content, url, url_to_image, source, author = row
+    return {'title': title, 'description': description, 'content': content, 'url': url,
+            'urlToImage': url_to_image, 'source': {'name': source}, 'author': author,
+            'publishedAt': published_at}
+
+class NewsStore:
+    """Deduplicated news articles with an inverted index for full-text search.
+
+    Articles are keyed by a hash of their URL and of their normalized title,
+    so the same story polled twice, or syndicated under another URL, is
+    stored once. The `postings` table maps each term to the articles that
+    contain it and is clustered by term, so a search reads one contiguous
+    posting list per query term.
+    """
+
+    def __init__(self, path):
+        self._db = ThreadLocalSQLite(path, SCHEMA)
+
+    def add_articles(self, articles):
+        """Store and index the articles not seen before; returns how many were new."""
+        conn = self._db.connect()
+        added = 0
+        with conn:
+            for article in articles:
+                url, title = article.get('url'), article.get('title')
+                published_at = article.get('publishedAt')
+                if not url or not title or not published_at or title == '[Removed]':
+                    continue
+                source = (article.get('source') or {}).get('name')
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO articles (url_hash, title_hash, published_at, title, description, "
+                    "content, url, url_to_image, source, author) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (_digest(url), _digest(normalize_title(title, source)), published_at, title,
+                     article.get('description'), article.get('content'), url, article.get('urlToImage'),
+                     source, article.get('author')))
+                if cursor.rowcount:
+                    conn.executemany("INSERT INTO postings (term, seq, weight) VALUES (?, ?, ?)",
+                                     ((term, cursor.lastrowid, weight)
+                                      for term, weight in article_terms(article).items()))
+                    added += 1
+        return added
+
+    def prune(self, days=NEWS_RETENTION_DAYS):
+        """Drop articles (and their postings) published more than `days` ago."""
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=days)).strftime('%Y-%m-%dT%H:%M:%SZ')
+        conn = self._db.connect()
+        with conn:
+            # postings_seq turns this into index lookups; the primary key is clustered by term
+            conn.execute("DELETE FROM postings WHERE seq IN "
+                         "(SELECT seq FROM articles WHERE published_at < ?)", (cutoff,))
+            return conn.execute("DELETE FROM articles WHERE published_at < ?", (cutoff,)).rowcount
+
+    def latest_published(self):
+        """Return the newest publishedAt stored, the cursor for the next poll, or None."""
+        return self._db.connect().execute("SELECT MAX(published_at) FROM articles").fetchone()[0]
+
+    def version(self):
+        """Return a value that changes whenever articles are added or pruned."""
+        return self._db.connect().execute("SELECT MAX(seq), COUNT(*) FROM articles").fetchone()
+
+    def count(self):
+        return self._db.connect().execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+
+    def latest(self, limit, offset=0):
+        """Return the newest articles, newest first."""
+        rows = self._db.connect().execute(
+            f"SELECT {ARTICLE_COLUMNS} FROM articles ORDER BY published_at DESC, seq DESC LIMIT ? OFFSET ?",
+            (limit, offset))
+        return [to_article(row) for row in rows]
+
+    def search(self, query, limit, offset=0):
+        """Return (total matches, one page of articles) containing every term of query, best first."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return 0, []
+        placeholders = ', '.join('?' * len(terms))
+        # Articles whose posting lists contain every query term, ranked by summed term weight
+        matches = (f"SELECT seq, SUM(weight) AS score FROM postings WHERE term IN ({placeholders}) "
+                   f"GROUP BY seq HAVING COUNT(*) = ?")
+        conn = self._db.connect()
+        total = conn.execute(f"SELECT COUNT(*) FROM ({matches})", (*terms, len(terms))).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT {', '.join('a.' + column for column in ARTICLE_COLUMNS.split(', '))} "
+            f"FROM ({matches}) AS m JOIN articles AS a ON a.seq = m.seq "
+            f"ORDER BY m.score DESC, a.published_at DESC LIMIT ? OFFSET ?",
+            (*terms, len(terms), limit, offset))
+        return total, [to_article(row) for row in rows]
+
+# The article store shared by the news fetcher and the news routes
+news_store = NewsStore(NEWS_DB_PATH)
@@ -0,0 +1,37 @@
+import os
+import time
+from utils.stocks import get_alpha_vantage, get_yfinance
+from utils.charts import load_chart_stack, warm_up
+
+# Heavy stacks imported when the app loads instead of on first use, e.g.
+# "providers,charts" in the master process of a pre-forking server
+PRELOAD = os.getenv('PRELOAD', '')
+
+def load_providers():
+    """Import the stock provider clients and pandas, which they and the indicators use."""
+    get_alpha_vantage()
+    get_yfinance()
+    import pandas  # noqa: F401
+
+# Stack name -> loader. `render_pool` starts the chart processes, so call it
+# after forking (e.g. in gunicorn's post_worker_init), not before
+PRELOADERS = {
+    'providers': load_providers,
+    'charts': load_chart_stack,
+    'render_pool': warm_up
+}
+
+def preload(stacks=None):
+    """Load the named stacks (PRELOAD by default) now and return the seconds each took."""
+    if stacks is None:
+        stacks = [stack.strip() for stack in PRELOAD.split(',') if stack.strip()]
+    timings = {}
+    for stack in stacks:
+        loader = PRELOADERS.get(stack)
+        if loader is None:
+            print(f"Unknown preload stack '{stack}', expected one of {', '.join(PRELOADERS)}")
+            continue
+        started = time.perf_counter()
+        loader()
+        timings[stack] = time.perf_counter() - started
+    return timings
@@ -0,0 +1,261 @@
+import os
+import json
+import time
+import threading
+from datetime import datetime, timezone
+from utils.metrics import Gauge, QUOTA_REFUSALS
+from utils.cache_backend import shared_backend
+
+# Per provider limits: (sustained calls per second, burst size, calls allowed per UTC day).
+# Daily quotas can be overridden with QUOTA_<PROVIDER>_DAILY, e.g. QUOTA_NEWSAPI_DAILY=500
+PROVIDER_LIMITS = {
+    'openweathermap': (1.0, 10, 1000),   # 60 calls/minute on the free tier
+    'nasa': (1000 / 3600, 30, None),    # 1,000 calls/hour with a DEMO_KEY
+    'alphavantage': (5 / 60, 5, 500),   # 5 calls/minute and 500 calls/day
+    'newsapi': (1.0, 5, 100),           # 100 calls/day
+    'yahoo': (2.0, 5, None)
+}
+
+# Display names used when reporting exhausted budgets on the dashboard
+PROVIDER_NAMES = {
+    'openweathermap': 'Weather API (Earth)',
+    'nasa': 'Weather API (Mars)',
+    'alphavantage': 'Stock API (Alpha Vantage)',
+    'newsapi': 'News API',
+    'yahoo': 'Stock API (Yahoo Finance)'
+}
+
+# Longest a caller waits for a rate-limit token before failing fast
+RATE_LIMIT_MAX_WAIT = float(os.getenv('RATE_LIMIT_MAX_WAIT', 1))
+
+# Where daily quota counters are kept so they survive restarts
+QUOTA_LEDGER_PATH = os.getenv('QUOTA_LEDGER_PATH',
+                              os.path.join(os.path.dirname(os.path.dirname(__file__)), 'instance', 'quota_ledger.json'))
+
+class QuotaExceeded(Exception):
+    """Raised instead of making an upstream call that the provider would refuse."""
+
+    def __init__(self, provider, reason):
+        super().__init__(f"{PROVIDER_NAMES.get(provider, provider)}: {reason}")
+        self.provider = provider
+        self.reason = reason
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, max_wait):
+        """Take a token, waiting up to max_wait seconds. Returns False if none became available."""
+        deadline = time.monotonic() + max_wait
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+class QuotaLedger:
+    """Counts calls per provider per UTC day and persists the counts to a JSON file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._day = None
+        self._counts = {}
+        self._exhausted = set()
+        self._load()
+
+    def used(self, provider):
+        with self._lock:
+            self._roll_over()
+            return self._counts.get(provider, 0)
+
+    def is_exhausted(self, provider):
+        limit = get_daily_quota(provider)
+        with self._lock:
+            self._roll_over()
+            if provider in self._exhausted:
+                return True
+            return limit is not None and self._counts.get(provider, 0) >= limit
+
+    def record(self, provider):
+        with self._lock:
+            self._roll_over()
+            self._counts[provider] = self._counts.get(provider, 0) + 1
+            self._save()
+
+    def mark_exhausted(self, provider):
+        """Record that the provider itself refused us for quota reasons today."""
+        with self._lock:
+            self._roll_over()
+            self._exhausted.add(provider)
+            self._save()
+
+    def _roll_over(self):
+        today = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+        if self._day != today:
+            self._day = today
+            self._counts = {}
+            self._exhausted = set()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+            self._day = state['day']
+            self._counts = state['counts']
+            self._exhausted = set(state['exhausted'])
+        except (OSError, ValueError, KeyError):
+            pass
+        self._roll_over()
+
+    def _save(self):
+        state = {'day': self._day, 'counts': self._counts, 'exhausted': sorted(self._exhausted)}
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f'{self.path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Error saving quota ledger: {str(e)}")
+
+class SharedQuotaLedger:
+    """QuotaLedger kept in the shared cache backend, so every worker counts against one budget.
+
+    Counts are atomic increments on per-day keys, which expire after the day
+    is over instead of being rolled over.
+    """
+
+    # Keep a day's keys a little past midnight UTC, whatever the workers' clocks say
+    KEY_TTL = 2 * 86400
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def used(self, provider):
+        try:
+            value = self.backend.get(self._key(provider))
+            return int(value) if value is not None else 0
+        except Exception as e:
+            print(f"Error reading shared quota ledger: {str(e)}")
+            return 0
+
+    def is_exhausted(self, provider):
+        limit = get_daily_quota(provider)
+        try:
+            if self.backend.get(self._key(provider, 'exhausted')) is not None:
+                return True
+        except Exception as e:
+            print(f"Error reading shared quota ledger: {str(e)}")
+        return limit is not None and self.used(provider) >= limit
+
+    def record(self, provider):
+        try:
+            self.backend.incr(self._key(provider), self.KEY_TTL)
+        except Exception as e:
+            print(f"Error updating shared quota ledger: {str(e)}")
+
+    def mark_exhausted(self, provider):
+        """Record that the provider itself refused us for quota reasons today."""
+        try:
+            self.backend.set(self._key(provider, 'exhausted'), b'1', self.KEY_TTL)
+        except Exception as e:
+            print(f"Error updating shared quota ledger: {str(e)}")
+
+    def _key(self, provider, suffix='used'):
+        return f"quota:{datetime.now(timezone.utc).strftime('%Y-%m-%d')}:{provider}:{suffix}"
+
+def get_daily_quota(provider):
+    """Return the daily call quota for a provider, or None if it has none."""
+    _, _, daily = PROVIDER_LIMITS[provider]
+    value = os.getenv(f'QUOTA_{provider.upper()}_DAILY')
+    return int(value) if value else daily
+
+# Token buckets stay per process; daily budgets are shared when a cache backend is configured
+_buckets = {provider: TokenBucket(rate, burst) for provider, (rate, burst, _) in PROVIDER_LIMITS.items()}
+ledger = SharedQuotaLedger(shared_backend) if shared_backend is not None else QuotaLedger(QUOTA_LEDGER_PATH)
+
+# When each provider last refused a call, locally or upstream (time.monotonic())
+_last_refused = {}
+
+def acquire(provider, max_wait=None):
+    """Reserve one upstream call for provider, or raise QuotaExceeded.
+
+    Every outbound API call goes through here first, so a spent daily budget
+    or an empty token bucket fails fast instead of making a doomed request.
+    """
+    if ledger.is_exhausted(provider):
+        _last_refused[provider] = time.monotonic()
+        QUOTA_REFUSALS.inc(provider=provider, reason='daily_quota')
+        raise QuotaExceeded(provider, 'daily quota used up')
+    if not _buckets[provider].acquire(RATE_LIMIT_MAX_WAIT if max_wait is None else max_wait):
+        _last_refused[provider] = time.monotonic()
+        QUOTA_REFUSALS.inc(provider=provider, reason='rate_limit')
+        raise QuotaExceeded(provider, 'rate limit reached')
+    ledger.record(provider)
+
+def refused_since(provider, since):
+    """Return True if a call to provider was refused for quota reasons after `since`."""
+    return _last_refused.get(provider, float('-inf')) >= since
+
+def report_quota_error(provider, error):
+    """Record an upstream quota refusal, marking the provider exhausted if it was a daily limit.
+
+    Returns True when the error was a quota refusal of any kind.
+    """
+    if isinstance(error, QuotaExceeded):
+        return True
+    # NewsAPI reports quota errors with a code; Alpha Vantage only in its message text
+    code = getattr(error, 'get_code', lambda: None)()
+    message = str(error).lower()
+    if code == 'rateLimited' or 'requests per day' in message:
+        _last_refused[provider] = time.monotonic()
+        QUOTA_REFUSALS.inc(provider=provider, reason='upstream_daily_quota')
+        ledger.mark_exhausted(provider)
+        return True
+    if 'api call frequency' in message:
+        # Per-minute throttling: back off, but the daily budget is not spent
+        report_throttled(provider)
+        return True
+    return False
+
+def report_throttled(provider):
+    """Record that the provider throttled a call (e.g. HTTP 429), so its prefetch job backs off."""
+    _last_refused[provider] = time.monotonic()
+    QUOTA_REFUSALS.inc(provider=provider, reason='upstream_rate_limit')
+
+def record_retry(provider):
+    """Count a retried attempt of a call that already went through acquire() against the daily budget."""
+    ledger.record(provider)
+
+def get_budget_status():
+    """Return the current budget of every provider, for the dashboard and monitoring."""
+    status = []
+    for provider in PROVIDER_LIMITS:
+        status.append({
+            'provider': provider,
+            'name': PROVIDER_NAMES[provider],
+            'used': ledger.used(provider),
+            'quota': get_daily_quota(provider),
+            'exhausted': ledger.is_exhausted(provider)
+        })
+    return status
+
+QUOTA_USED = Gauge('dashboard_quota_used', 'Calls made to each provider so far this UTC day.', ['provider'],
+                   collect=lambda: {(provider,): ledger.used(provider) for provider in PROVIDER_LIMITS})
+QUOTA_REMAINING = Gauge('dashboard_quota_remaining', 'Calls left in each provider\'s daily quota.', ['provider'],
+                        collect=lambda: {(budget['provider'],): 0 if budget['exhausted'] else budget['quota'] - budget['used']
+                                         for budget in get_budget_status() if budget['quota'] is not None})
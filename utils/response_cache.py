@@ -0,0 +1,91 @@
+import os
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from utils.metrics import record_cache_lookup
+
+# Serialized API responses kept in memory, one per data version
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', 256))
+
+# Bodies smaller than this are sent uncompressed; compression would barely help
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 512))
+
+def get_brotli():
+    """Return the brotli module, or None if it is not installed."""
+    try:
+        import brotli
+        return brotli
+    except ImportError:
+        return None
+
+def supported_encodings():
+    """Return the content codings this server can produce, most preferred first."""
+    encodings = ['gzip', 'identity']
+    if get_brotli() is not None:
+        encodings.insert(0, 'br')
+    return encodings
+
+class CachedResponse:
+    """A serialized JSON body plus its compressed forms, each produced at most once."""
+
+    def __init__(self, body):
+        self.body = body
+        self.etag = hashlib.sha1(body).hexdigest()[:20]
+        self._encoded = {'identity': body}
+        self._lock = threading.Lock()
+
+    def encoded(self, encoding):
+        """Return (body, etag) for encoding; each coding gets its own strong ETag."""
+        if encoding == 'identity' or len(self.body) < COMPRESS_MIN_SIZE:
+            return self.body, self.etag
+        with self._lock:
+            data = self._encoded.get(encoding)
+            if data is None:
+                if encoding == 'br':
+                    data = get_brotli().compress(self.body, quality=11)
+                else:
+                    data = gzip.compress(self.body, compresslevel=9, mtime=0)
+                self._encoded[encoding] = data
+        return data, f'{self.etag}-{encoding}'
+
+class ResponseCache:
+    """LRU cache of serialized responses keyed by the data version they were built from.
+
+    When the caller cannot name a version (key None), the body is built
+    every time and cached by its content instead, so compression still
+    happens once per distinct body.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, build):
+        """Return the CachedResponse for key, calling build() for the JSON bytes on a miss."""
+        if key is not None:
+            with self._lock:
+                response = self._entries.get(key)
+                if response is not None:
+                    self._entries.move_to_end(key)
+                    record_cache_lookup('responses', 'hit')
+                    return response
+
+        record_cache_lookup('responses', 'miss')
+        body = build()
+        response = CachedResponse(body)
+        if key is None:
+            key = response.etag
+            with self._lock:
+                # Reuse the entry (and its compressed forms) for an identical body
+                response = self._entries.get(key, response)
+        with self._lock:
+            self._entries[key] = response
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return response
+
+# The response cache shared by the JSON API routes
+response_cache = ResponseCache(RESPONSE_CACHE_SIZE)
@@ -0,0 +1,162 @@
+import os
+import time
+import random
+import threading
+from utils.cache import get_cache_ttl, ProviderFallback
+from utils.snapshot import snapshot
+from utils.ratelimit import refused_since
+from utils.weather import get_earth_weather, get_mars_weather
+from utils.stocks import get_stock_quote, get_all_quotes, use_batch_quotes
+from utils.watchlist import get_tracked_symbols
+from utils.news import get_space_news
+
+# Fraction of each interval that is randomised so jobs do not fire in lockstep
+PREFETCH_JITTER = float(os.getenv('PREFETCH_JITTER', 0.1))
+
+# Longest a job is pushed back after repeated quota errors
+PREFETCH_MAX_BACKOFF = float(os.getenv('PREFETCH_MAX_BACKOFF', 3600))
+
+def get_prefetch_interval(name):
+    """Return the refresh interval for a data source, defaulting to its cache TTL."""
+    return float(os.getenv(f'PREFETCH_INTERVAL_{name.upper()}', get_cache_ttl(name)))
+
+class PrefetchJob:
+    """Refreshes one provider call on an interval and publishes it into the snapshot."""
+
+    def __init__(self, name, fetch, publish, interval, providers):
+        self.name = name
+        self.fetch = fetch
+        self.publish = publish
+        self.interval = interval
+        self.providers = providers  # Rate-limit providers the fetch calls
+        self.failures = 0
+        self.next_run = 0  # Run as soon as the scheduler starts
+
+    def run(self):
+        started = time.monotonic()
+        try:
+            self.publish(self.fetch())
+            limited = any(refused_since(provider, started) for provider in self.providers)
+        except ProviderFallback as e:
+            # Show what the cache now serves, but back off like any other failure
+            print(f"Prefetch job {self.name} fell back: {str(e)}")
+            self.publish(e.value)
+            limited = True
+        except Exception as e:
+            print(f"Error running prefetch job {self.name}: {str(e)}")
+            limited = True
+
+        if limited:
+            # Back off exponentially while the provider keeps refusing us
+            self.failures += 1
+            delay = min(self.interval * 2 ** self.failures, PREFETCH_MAX_BACKOFF)
+        else:
+            self.failures = 0
+            delay = self.interval
+        self.next_run = time.monotonic() + delay * (1 + random.uniform(-PREFETCH_JITTER, PREFETCH_JITTER))
+
+class PrefetchScheduler(threading.Thread):
+    """Background thread that keeps the dashboard snapshot warm."""
+
+    def __init__(self, jobs):
+        super().__init__(name='prefetch-scheduler', daemon=True)
+        self.jobs = jobs
+        self._stopped = threading.Event()
+        self._wake = threading.Event()
+
+    def run(self):
+        while not self._stopped.is_set():
+            self._wake.clear()
+            now = time.monotonic()
+            jobs = self.jobs
+            due = [job for job in jobs if job.next_run <= now]
+            threads = [threading.Thread(target=job.run, name=f'prefetch-{job.name}', daemon=True)
+                       for job in due]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            next_run = min(job.next_run for job in self.jobs)
+            self._wake.wait(max(0, next_run - time.monotonic()))
+
+    def update_jobs(self, jobs, run_now=()):
+        """Replace the job list, keeping the schedule of jobs that already existed.
+
+        New jobs and the ones named in run_now run straight away.
+        """
+        existing = {job.name: job for job in self.jobs}
+        updated = []
+        for job in jobs:
+            if job.name in existing:
+                job = existing[job.name]
+                if job.name in run_now:
+                    job.next_run = 0
+            updated.append(job)
+        self.jobs = updated
+        self._wake.set()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+
+def get_prefetch_jobs():
+    """Return the prefetch jobs for every card on the dashboard."""
+    jobs = [
+        PrefetchJob('earth_weather', get_earth_weather.refresh,
+                    lambda value: snapshot.publish('weather_data', value, key='earth'),
+                    get_prefetch_interval('earth_weather'), ['openweathermap']),
+        PrefetchJob('mars_weather', get_mars_weather.refresh,
+                    lambda value: snapshot.publish('weather_data', value, key='mars'),
+                    get_prefetch_interval('mars_weather'), ['nasa']),
+        PrefetchJob('news', get_space_news.refresh,
+                    lambda value: snapshot.publish('news_data', value),
+                    get_prefetch_interval('news'), ['newsapi'])
+    ]
+    if use_batch_quotes():
+        # Batched downloads refresh every tracked symbol, STOCK_BATCH_SIZE at a time
+        jobs.append(PrefetchJob('stock_batch',
+                                get_all_quotes,
+                                publish_quotes,
+                                get_prefetch_interval('stock_batch'),
+                                ['yahoo', 'alphavantage']))
+        return jobs
+    
+    for company in get_tracked_symbols():
+        jobs.append(PrefetchJob(f'stock_quote:{company}',
+                                lambda company=company: get_stock_quote.refresh(company),
+                                lambda value, company=company: snapshot.publish('stocks_data', value, key=company),
+                                get_prefetch_interval('stock_quote'),
+                                ['alphavantage']))
+    return jobs
+
+def publish_quotes(quotes):
+    """Publish a dict of symbol -> quote into the snapshot."""
+    for company, quote in quotes.items():
+        snapshot.publish('stocks_data', quote, key=company)
+
+_scheduler = None
+_scheduler_pid = None
+_scheduler_lock = threading.Lock()
+
+def start_prefetching():
+    """Start the prefetch scheduler for this process if it is not already running.
+
+    Safe to call on every request: it is a no-op once started, and restarts
+    the scheduler in forked worker processes whose copy of the thread is gone.
+    """
+    global _scheduler, _scheduler_pid
+    if _scheduler is not None and _scheduler_pid == os.getpid():
+        return
+    with _scheduler_lock:
+        if _scheduler is not None and _scheduler_pid == os.getpid():
+            return
+        _scheduler = PrefetchScheduler(get_prefetch_jobs())
+        _scheduler_pid = os.getpid()
+        _scheduler.start()
+
+def refresh_tracked_symbols():
+    """Bring the stock jobs in line with the tracked symbols after a watchlist changes."""
+    if _scheduler is None or _scheduler_pid != os.getpid():
+        return
+    _scheduler.update_jobs(get_prefetch_jobs(), run_now={'stock_batch'})
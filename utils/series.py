@@ -0,0 +1,94 @@
+import hashlib
+import numpy as np
+
+class OHLCVSeries:
+    """Daily open/high/low/close/volume history stored as parallel NumPy arrays.
+
+    `dates` is a datetime64[D] array in ascending order; the price columns
+    are float64 and `volume` is int64. Passed as-is to the chart and JSON
+    layers instead of a list of per-day dicts.
+    """
+
+    __slots__ = ('dates', 'open', 'high', 'low', 'close', 'volume')
+
+    def __init__(self, dates, open, high, low, close, volume):
+        self.dates = np.asarray(dates, dtype='datetime64[D]')
+        self.open = np.asarray(open, dtype=np.float64)
+        self.high = np.asarray(high, dtype=np.float64)
+        self.low = np.asarray(low, dtype=np.float64)
+        self.close = np.asarray(close, dtype=np.float64)
+        self.volume = np.asarray(volume, dtype=np.int64)
+
+    @classmethod
+    def from_frame(cls, frame, columns):
+        """Build a series from a pandas OHLCV frame indexed by date.
+
+        `columns` maps open/high/low/close/volume to the frame's column names.
+        """
+        dates = frame.index.values.astype('datetime64[D]')
+        order = np.argsort(dates, kind='stable')
+        return cls(dates[order], *(frame[columns[field]].to_numpy()[order]
+                                   for field in ('open', 'high', 'low', 'close', 'volume')))
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build a series from (date, open, high, low, close, volume) tuples in date order."""
+        if not rows:
+            return cls.empty()
+        return cls(*zip(*rows))
+
+    @classmethod
+    def empty(cls):
+        return cls([], [], [], [], [], [])
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __bool__(self):
+        return len(self.dates) > 0
+
+    def __eq__(self, other):
+        if not isinstance(other, OHLCVSeries):
+            return NotImplemented
+        return self.fingerprint() == other.fingerprint()
+
+    def __getitem__(self, index):
+        """Slice the series by position, e.g. series[-30:]."""
+        if not isinstance(index, slice):
+            raise TypeError('OHLCVSeries only supports slicing')
+        return OHLCVSeries(self.dates[index], self.open[index], self.high[index],
+                           self.low[index], self.close[index], self.volume[index])
+
+    def tail(self, days):
+        return self[-days:] if days else OHLCVSeries.empty()
+
+    def since(self, date):
+        """Return the days on or after date ('YYYY-MM-DD')."""
+        start = np.searchsorted(self.dates, np.datetime64(date, 'D'))
+        return self[start:]
+
+    def date_strings(self):
+        return np.datetime_as_string(self.dates, unit='D').tolist()
+
+    def rows(self):
+        """Yield (date, open, high, low, close, volume) tuples, e.g. for database inserts."""
+        return zip(self.date_strings(), self.open.tolist(), self.high.tolist(),
+                   self.low.tolist(), self.close.tolist(), self.volume.tolist())
+
+    def fingerprint(self):
+        """Return a short hash of the series contents, used as its data version."""
+        digest = hashlib.sha1()
+        for column in (self.dates, self.open, self.high, self.low, self.close, self.volume):
+            digest.update(np.ascontiguousarray(column).tobytes())
+        return digest.hexdigest()[:16]
+
+    def to_dict(self):
+        """Return the series as columnar lists for JSON responses."""
+        return {
+            'date': self.date_strings(),
+            'open': self.open.tolist(),
+            'high': self.high.tolist(),
+            'low': self.low.tolist(),
+            'close': self.close.tolist(),
+            'volume': self.volume.tolist()
+        }
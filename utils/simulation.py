@@ -0,0 +1,83 @@
+import os
+import hashlib
+from datetime import datetime
+import numpy as np
+from utils.series import OHLCVSeries
+
+# Base seed for every simulated series; another value gives a different but
+# equally reproducible data set
+SIMULATION_SEED = os.getenv('SIMULATION_SEED', '0')
+
+# Periods in days of the slow swings simulated prices follow
+PRICE_SWING_PERIODS = np.array([7.0, 23.0, 61.0, 127.0])
+
+_GOLDEN_GAMMA = np.uint64(0x9E3779B97F4A7C15)
+
+def _stream_key(source, key, stream):
+    digest = hashlib.blake2b(f'{SIMULATION_SEED}:{source}:{key}:{stream}'.encode('utf-8'), digest_size=8).digest()
+    return np.uint64(int.from_bytes(digest, 'little'))
+
+def _mix(bits):
+    # splitmix64 finaliser: a cheap, well-distributed hash over uint64 arrays
+    bits = (bits ^ (bits >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    bits = (bits ^ (bits >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return bits ^ (bits >> np.uint64(31))
+
+def date_range(days, end=None):
+    """Return `days` consecutive datetime64[D] dates ending on end (today by default)."""
+    end = np.datetime64(end or datetime.now().strftime('%Y-%m-%d'), 'D')
+    return end - np.arange(days - 1, -1, -1)
+
+def uniform(source, key, stream, dates, low=0.0, high=1.0):
+    """Return one draw in [low, high) per date.
+
+    Each draw depends only on (source, key, stream, date), so a day has the
+    same value whatever window it is generated in, and a whole window is
+    generated in a few vectorized operations.
+    """
+    days = np.asarray(dates, dtype='datetime64[D]').astype(np.int64).astype(np.uint64)
+    with np.errstate(over='ignore'):
+        bits = _mix(_stream_key(source, key, stream) + days * _GOLDEN_GAMMA)
+    return low + (high - low) * ((bits >> np.uint64(11)).astype(np.float64) * 2.0 ** -53)
+
+def choose(source, key, stream, dates, options):
+    """Return one of options per date, fixed by (source, key, stream, date)."""
+    picks = (uniform(source, key, stream, dates) * len(options)).astype(np.int64)
+    return [options[pick] for pick in picks]
+
+def swings(source, key, dates, scale):
+    """Smooth deterministic oscillation around zero, at most `scale` in size."""
+    rng = np.random.default_rng(int(_stream_key(source, key, 'swings')))
+    phases = rng.uniform(0, 2 * np.pi, len(PRICE_SWING_PERIODS))
+    weights = rng.uniform(0.5, 1.0, len(PRICE_SWING_PERIODS))
+    days = np.asarray(dates, dtype='datetime64[D]').astype(np.float64)
+    waves = np.sin(2 * np.pi * days[:, None] / PRICE_SWING_PERIODS + phases)
+    return scale * (waves @ weights) / weights.sum()
+
+def simulate_stock_series(symbol, base_price, days, end=None):
+    """Return a reproducible daily OHLCV series for symbol around base_price."""
+    dates = date_range(days, end)
+    log_price = (swings('stocks', symbol, dates, 0.15)
+                 + uniform('stocks', symbol, 'noise', dates, -0.02, 0.02))
+    closes = base_price * np.exp(log_price)
+    opens = closes * (1 + uniform('stocks', symbol, 'open', dates, -0.01, 0.01))
+    highs = np.maximum(opens, closes) * (1 + uniform('stocks', symbol, 'high', dates, 0, 0.02))
+    lows = np.minimum(opens, closes) * (1 - uniform('stocks', symbol, 'low', dates, 0, 0.02))
+    volumes = uniform('stocks', symbol, 'volume', dates, 500000, 5000000).astype(np.int64)
+    return OHLCVSeries(dates, np.round(opens, 2), np.round(highs, 2), np.round(lows, 2),
+                       np.round(closes, 2), volumes)
+
+def simulate_quote(symbol, base_price, base_volume, end=None):
+    """Return (price, change percent, volume) for symbol, consistent with its simulated history."""
+    series = simulate_stock_series(symbol, base_price, 2, end)
+    price, previous = float(series.close[-1]), float(series.close[-2])
+    volume = base_volume * (1 + uniform('quotes', symbol, 'volume', series.dates[-1:], -0.1, 0.1)[0])
+    return price, round((price - previous) / previous * 100, 2), int(volume)
+
+def simulate_days(source, key, days, ranges, end=None):
+    """Return (dates, {field: values}) with one uniform draw per day in each field's (low, high) range."""
+    dates = date_range(days, end)
+    return dates, {field: uniform(source, key, field, dates, low, high) for field, (low, high) in ranges.items()}
+
+def date_strings(dates):
+    return np.datetime_as_string(dates, unit='D').tolist()
@@ -0,0 +1,56 @@
+import threading
+from concurrent.futures import Future
+from utils.metrics import COALESCED_CALLS
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into one.
+
+    The first caller for a key runs the call; callers arriving while it is
+    in flight wait and get its result, or its exception. Nothing is kept
+    once the call finishes, so this only flattens bursts; caching the
+    result is up to the caller.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}  # key -> Future of the call in flight
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """Return fn()'s result, sharing one in-flight call among concurrent callers for key."""
+        call, leader = self._join(key)
+        if leader:
+            self._run(key, fn, call)
+        return call.result()
+
+    def submit(self, key, fn, executor):
+        """Return a Future of fn()'s result, starting fn on executor unless a call for key is in flight.
+
+        Lets event-loop code wait for a call (asyncio.wrap_future) without
+        holding a thread per waiter.
+        """
+        call, leader = self._join(key)
+        if leader:
+            executor.submit(self._run, key, fn, call)
+        return call
+
+    def _join(self, key):
+        # Returns (the call's Future, True if the caller has to run it)
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                COALESCED_CALLS.inc(group=self.name)
+                return call, False
+            call = self._calls[key] = Future()
+            # A running Future cannot be cancelled by one impatient waiter
+            call.set_running_or_notify_cancel()
+            return call, True
+
+    def _run(self, key, fn, call):
+        try:
+            call.set_result(fn())
+        except BaseException as e:
+            call.set_exception(e)
+        finally:
+            with self._lock:
+                del self._calls[key]
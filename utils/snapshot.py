@@ -0,0 +1,78 @@
+import threading
+from datetime import datetime
+from utils.concurrency import AsyncWaiters
+
+class Snapshot:
+    """In-process copy of the latest dashboard data, published by the prefetch scheduler.
+
+    Sections mirror the dashboard payload: 'weather_data' and 'stocks_data'
+    hold one entry per planet/symbol, 'news_data' holds the whole feed.
+    `version` increases every time a published value actually changes.
+    """
+
+    def __init__(self):
+        self._sections = {'weather_data': {}, 'stocks_data': {}, 'news_data': None}
+        self._changed = threading.Condition()
+        self._async_waiters = AsyncWaiters()
+        self.version = 0
+        self.updated_at = None
+        self._listeners = []
+        self._versions = {}  # (section, key) -> version of its last change
+
+    def subscribe(self, listener):
+        """Call listener(version, section, key, value) after every change, in version order."""
+        self._listeners.append(listener)
+
+    def publish(self, section, value, key=None):
+        """Store a freshly fetched value and wake anyone waiting on the snapshot."""
+        with self._changed:
+            if key is None:
+                current = self._sections[section]
+            else:
+                current = self._sections[section].get(key)
+            if current == value:
+                return
+
+            if key is None:
+                self._sections[section] = value
+            else:
+                # Copy on write so readers holding the old dict never see it change
+                entries = dict(self._sections[section])
+                entries[key] = value
+                self._sections[section] = entries
+            self.version += 1
+            self.updated_at = datetime.now()
+            self._versions[(section, key)] = self.version
+            for listener in self._listeners:
+                try:
+                    listener(self.version, section, key, value)
+                except Exception as e:
+                    print(f"Error notifying snapshot listener: {str(e)}")
+            self._changed.notify_all()
+        self._async_waiters.notify_all()
+
+    def versions(self, section, keys=(None,)):
+        """Return the version at which each key of section last changed (0 if never published)."""
+        with self._changed:
+            return tuple(self._versions.get((section, key), 0) for key in keys)
+
+    def get(self, section):
+        with self._changed:
+            return self._sections[section]
+
+    def read(self):
+        """Return a consistent copy of every section."""
+        with self._changed:
+            return dict(self._sections)
+
+    def wait_for(self, predicate, timeout):
+        """Block until predicate(snapshot) is true or timeout seconds pass."""
+        with self._changed:
+            return self._changed.wait_for(lambda: predicate(self), timeout)
+
+    async def async_wait_for(self, predicate, timeout):
+        """Coroutine version of wait_for, for the async server."""
+        return await self._async_waiters.wait_for(lambda: predicate(self), timeout)
+
+# The snapshot shared by the scheduler and the routes
+snapshot = Snapshot()
@@ -0,0 +1,29 @@
+import os
+import sqlite3
+import threading
+
+class ThreadLocalSQLite:
+    """A SQLite file in WAL mode, with one connection per thread and the schema created on first use."""
+
+    def __init__(self, path, schema):
+        self.path = path
+        self.schema = schema
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def connect(self):
+        """Return this thread's connection, opening it (and creating the schema) if needed."""
+        # sqlite3 connections cannot be shared between threads, so keep one per thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            with self._schema_lock:
+                if not self._schema_ready:
+                    conn.executescript(self.schema)
+                    self._schema_ready = True
+            self._local.conn = conn
+        return conn
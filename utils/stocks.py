@@ -1,169 +1,376 @@
 import os
+import functools
 from datetime import datetime, timedelta
-import time
-import random
-from alpha_vantage.timeseries import TimeSeries
-from alpha_vantage.fundamentaldata import FundamentalData
+from utils.concurrency import Task, run_concurrently, gather_concurrently, PROVIDER_TIMEOUTS
+from utils.cache import cached, ProviderFallback
+from utils.ratelimit import acquire, report_quota_error
+from utils.metrics import upstream_call, record_fallback
+from utils.timeseries import timeseries
+from utils.series import OHLCVSeries
+from utils.simulation import simulate_stock_series, simulate_quote
+from utils.watchlist import get_watchlist, get_tracked_symbols, get_symbol_names
 
+# Alpha Vantage base URL; point it at a local stand-in (see bench/) to run offline
+ALPHA_VANTAGE_BASE_URL = os.getenv('ALPHA_VANTAGE_BASE_URL')
+
+@functools.lru_cache(maxsize=None)
+def get_alpha_vantage():
+    """Import the Alpha Vantage client on first use; it pulls in pandas, which is slow to load."""
+    import alpha_vantage.timeseries
+    import alpha_vantage.fundamentaldata
+    if ALPHA_VANTAGE_BASE_URL:
+        # The client library has no per-instance setting for this
+        alpha_vantage.alphavantage.AlphaVantage._ALPHA_VANTAGE_API_URL = f"{ALPHA_VANTAGE_BASE_URL.rstrip('/')}/query?"
+    return alpha_vantage
+
+# Column names of the daily OHLCV frames returned by each provider
+ALPHA_VANTAGE_COLUMNS = {'open': '1. open', 'high': '2. high', 'low': '3. low', 'close': '4. close', 'volume': '5. volume'}
+YFINANCE_COLUMNS = {'open': 'Open', 'high': 'High', 'low': 'Low', 'close': 'Close', 'volume': 'Volume'}
+
+# Fills and reads the local time-series store, so results are only shared on this host
+@cached('stock_history', shared='host')
 def get_historical_stock_data(symbol, days=30):
     """Fetch historical stock data for the specified number of days"""
-    api_key = os.getenv('ALPHA_VANTAGE_API_KEY')
-    if not api_key:
-        return get_simulated_historical_data(symbol, days)
+    if use_batch_quotes():
+        # Bars are appended by the batched download covering the symbol
+        get_bulk_quotes(get_batch_for(symbol))
+    elif is_stale(timeseries.last_stock_date(symbol)):
+        api_key = os.getenv('ALPHA_VANTAGE_API_KEY')
+        if not api_key:
+            return get_simulated_historical_data(symbol, days)
+        fetch_new_stock_days(symbol, api_key, days)
     
+    # Serve the window from the local store
+    historical_data = timeseries.read_stock_series(symbol, days)
+    if not historical_data:
+        raise ProviderFallback(get_simulated_historical_data(symbol, days), f'No stored history for {symbol}')
+    return historical_data
+
+def fetch_new_stock_days(symbol, api_key, days):
+    """Append the daily bars the local store does not have yet for symbol."""
+    last_date = timeseries.last_stock_date(symbol)
     try:
-        ts = TimeSeries(key=api_key, output_format='pandas')
-        # Get daily data
-        data, meta_data = ts.get_daily(symbol=symbol, outputsize='compact')
+        ts = get_alpha_vantage().timeseries.TimeSeries(key=api_key, output_format='pandas')
+        # Get daily data; the compact series covers the last 100 trading days
+        outputsize = 'full' if last_date is None and days > 100 else 'compact'
+        acquire('alphavantage')
+        with upstream_call('alphavantage'):
+            data, meta_data = ts.get_daily(symbol=symbol, outputsize=outputsize)
         
-        # Convert to list of daily data points
-        historical_data = []
-        for date, row in data.iterrows():
-            historical_data.append({
-                'date': date.strftime('%Y-%m-%d'),
-                'open': float(row['1. open']),
-                'high': float(row['2. high']),
-                'low': float(row['3. low']),
-                'close': float(row['4. close']),
-                'volume': int(row['5. volume'])
-            })
+        historical_data = OHLCVSeries.from_frame(data, ALPHA_VANTAGE_COLUMNS)
         
-        # Return only the requested number of days
-        return historical_data[-days:]
+        # Only the latest stored day can still change; everything older is final
+        if last_date is not None:
+            historical_data = historical_data.since(last_date)
+        timeseries.append_stock_series(symbol, historical_data)
         
     except Exception as e:
         print(f"Error fetching historical data for {symbol}: {str(e)}")
-        return get_simulated_historical_data(symbol, days)
+        report_quota_error('alphavantage', e)
+
+def is_stale(last_date):
+    """Return True if a stored series ending on last_date is missing a completed trading day."""
+    if last_date is None:
+        return True
+    previous_day = datetime.now() - timedelta(days=1)
+    while previous_day.weekday() >= 5:  # Skip weekends
+        previous_day -= timedelta(days=1)
+    return last_date < previous_day.strftime('%Y-%m-%d')
 
 def get_simulated_historical_data(symbol, days):
     """Generate simulated historical stock data"""
-    base_price = {
-        'SPCE': 1.50,
-        'BA': 180.00,
-        'LMT': 450.00,
-        'NOC': 420.00,
-        'RTX': 90.00
-    }.get(symbol, 100.00)
-    
-    historical_data = []
-    current_price = base_price
-    
-    for i in range(days):
-        date = (datetime.now() - timedelta(days=days-i-1)).strftime('%Y-%m-%d')
-        daily_change = random.uniform(-0.02, 0.02)
-        current_price *= (1 + daily_change)
-        
-        historical_data.append({
-            'date': date,
-            'open': round(current_price * (1 + random.uniform(-0.01, 0.01)), 2),
-            'high': round(current_price * (1 + random.uniform(0, 0.02)), 2),
-            'low': round(current_price * (1 - random.uniform(0, 0.02)), 2),
-            'close': round(current_price, 2),
-            'volume': int(random.uniform(500000, 5000000))
-        })
+    record_fallback('stock_history')
+    return simulate_stock_series(symbol, get_fallback_entry(symbol)['current_price'], days)
+
+# Fallback data in case of connection issues
+FALLBACK_DATA = {
+    'SPCE': {'name': 'Virgin Galactic', 'current_price': 1.50, 'change': -2.5, 'volume': 1000000},
+    'BA': {'name': 'Boeing', 'current_price': 180.00, 'change': 1.2, 'volume': 5000000},
+    'LMT': {'name': 'Lockheed Martin', 'current_price': 450.00, 'change': 0.8, 'volume': 2000000},
+    'NOC': {'name': 'Northrop Grumman', 'current_price': 420.00, 'change': -0.5, 'volume': 1500000},
+    'RTX': {'name': 'Raytheon Technologies', 'current_price': 90.00, 'change': 1.5, 'volume': 3000000}
+}
+
+# Fallback for symbols without an entry above
+DEFAULT_FALLBACK = {'current_price': 100.00, 'change': 0.0, 'volume': 1000000}
+
+# Where quotes come from: 'yfinance' fetches every company in one batched
+# download, 'alphavantage' makes per-company Alpha Vantage calls
+STOCK_QUOTE_SOURCE = os.getenv('STOCK_QUOTE_SOURCE', 'yfinance')
+
+# Symbols per batched yfinance download
+STOCK_BATCH_SIZE = int(os.getenv('STOCK_BATCH_SIZE', 100))
+
+# Days of history indicators are computed over, so long windows are warmed up
+# before the days that are displayed; batched downloads fetch at least this many
+INDICATOR_HISTORY_DAYS = int(os.getenv('INDICATOR_HISTORY_DAYS', 100))
+
+def get_stock_data(symbols=None):
+    """Fetch quotes for symbols (the shared watchlist by default) in display order."""
+    if symbols is None:
+        symbols = get_watchlist()
+    api_key = os.getenv('ALPHA_VANTAGE_API_KEY')
+    if not use_batch_quotes() and not api_key:
+        print("Alpha Vantage API key not found. Using simulated data.")
+        return get_simulated_data(symbols, FALLBACK_DATA)
     
-    return historical_data
+    return merge_quotes(run_concurrently(get_stock_tasks(symbols)), symbols)
 
-def get_stock_data():
-    # List of space-related companies
-    companies = ['SPCE', 'BA', 'LMT', 'NOC', 'RTX']
-    stock_data = {}
+async def async_get_stock_data(symbols=None):
+    """Coroutine version of get_stock_data for the async server."""
+    if symbols is None:
+        symbols = get_watchlist()
+    api_key = os.getenv('ALPHA_VANTAGE_API_KEY')
+    if not use_batch_quotes() and not api_key:
+        print("Alpha Vantage API key not found. Using simulated data.")
+        return get_simulated_data(symbols, FALLBACK_DATA)
     
-    # Fallback data in case of connection issues
-    fallback_data = {
-        'SPCE': {'name': 'Virgin Galactic', 'current_price': 1.50, 'change': -2.5, 'volume': 1000000},
-        'BA': {'name': 'Boeing', 'current_price': 180.00, 'change': 1.2, 'volume': 5000000},
-        'LMT': {'name': 'Lockheed Martin', 'current_price': 450.00, 'change': 0.8, 'volume': 2000000},
-        'NOC': {'name': 'Northrop Grumman', 'current_price': 420.00, 'change': -0.5, 'volume': 1500000},
-        'RTX': {'name': 'Raytheon Technologies', 'current_price': 90.00, 'change': 1.5, 'volume': 3000000}
+    return merge_quotes(await gather_concurrently(get_stock_tasks(symbols)), symbols)
+
+def get_stock_tasks(symbols=None):
+    """Return the fetch tasks for symbols (the shared watchlist by default).
+
+    Each task resolves to a dict of symbol -> quote: one task per batch of
+    STOCK_BATCH_SIZE symbols when quotes are batched, otherwise one task per
+    company.
+    """
+    if symbols is None:
+        symbols = get_watchlist()
+    if use_batch_quotes():
+        return {
+            f'batch:{index}': Task(lambda batch=batch: get_bulk_quotes(batch),
+                                   lambda batch=batch: {company: get_fallback_quote(company) for company in batch},
+                                   PROVIDER_TIMEOUTS['stocks'],
+                                   lambda batch=batch: get_bulk_quotes.aio(batch))
+            for index, batch in enumerate(get_quote_batches(symbols))
+        }
+    return {
+        company: Task(lambda company=company: {company: get_stock_quote(company)},
+                      lambda company=company: {company: get_fallback_quote(company)},
+                      PROVIDER_TIMEOUTS['stocks'],
+                      lambda company=company: async_get_quote(company))
+        for company in symbols
+    }
+
+async def async_get_quote(company):
+    """Await one company's quote, shaped like the per-company stock task results."""
+    return {company: await get_stock_quote.aio(company)}
+
+def merge_quotes(results, symbols):
+    """Combine the results of the stock tasks into one dict in the order of symbols."""
+    quotes = {}
+    for result in results.values():
+        quotes.update(result)
+    return {company: quotes[company] for company in symbols if company in quotes}
+
+def get_quote_batches(symbols):
+    """Split symbols into the batches used for downloads.
+
+    Tracked symbols always fall into the same batches as the prefetched
+    universe, so batched downloads and their cache entries are shared
+    between the dashboard, paging and history requests.
+    """
+    tracked = get_tracked_symbols()
+    batches = get_universe_batches(tuple(tracked))
+    wanted = set(symbols)
+    selected = [batch for batch in batches if wanted.intersection(batch)]
+    untracked = tuple(sorted(wanted.difference(tracked)))
+    selected.extend(untracked[i:i + STOCK_BATCH_SIZE] for i in range(0, len(untracked), STOCK_BATCH_SIZE))
+    return selected
+
+@functools.lru_cache(maxsize=8)
+def get_universe_batches(tracked):
+    ordered = tuple(sorted(tracked))
+    return [ordered[i:i + STOCK_BATCH_SIZE] for i in range(0, len(ordered), STOCK_BATCH_SIZE)]
+
+def get_batch_for(symbol):
+    """Return the download batch that covers symbol."""
+    return get_quote_batches([symbol])[0]
+
+def get_all_quotes():
+    """Refresh quotes for every tracked symbol, downloading the batches concurrently.
+
+    A batch that misses the stocks deadline is left out rather than replaced
+    with fallback quotes; its download still finishes and fills the cache.
+    """
+    tracked = get_tracked_symbols()
+    failed = []
+
+    def refresh(batch):
+        try:
+            return get_bulk_quotes.refresh(batch)
+        except ProviderFallback as e:
+            failed.append(batch)
+            return e.value
+
+    tasks = {
+        index: Task(lambda batch=batch: refresh(batch), dict, PROVIDER_TIMEOUTS['stocks'])
+        for index, batch in enumerate(get_quote_batches(tracked))
     }
+    quotes = merge_quotes(run_concurrently(tasks), tracked)
+    if failed:
+        # Lets the prefetch job publish what is cached and still back off
+        raise ProviderFallback(quotes, f'{len(failed)} quote batches failed')
+    return quotes
+
+def use_batch_quotes():
+    """Return True if quotes should be fetched with one batched yfinance download."""
+    return STOCK_QUOTE_SOURCE == 'yfinance' and get_yfinance() is not None
+
+def get_yfinance():
+    """Return the yfinance module, or None if it is not installed."""
+    try:
+        import yfinance
+        return yfinance
+    except ImportError:
+        return None
+
+# Appends to the local time-series store, so results are only shared on this host
+@cached('stock_batch', shared='host')
+def get_bulk_quotes(companies):
+    """Fetch current quotes and recent history for all companies in one batched download."""
+    try:
+        yf = get_yfinance()
+        acquire('yahoo')
+        # One download covers every symbol and the trading days indicators need,
+        # at five per calendar week plus two weeks for holidays
+        start = datetime.now() - timedelta(days=INDICATOR_HISTORY_DAYS * 7 // 5 + 14)
+        with upstream_call('yahoo'):
+            frame = yf.download(list(companies), start=start.strftime('%Y-%m-%d'), interval='1d',
+                                group_by='ticker', auto_adjust=False, progress=False)
+    except Exception as e:
+        print(f"Error fetching batched quotes: {str(e)}")
+        report_quota_error('yahoo', e)
+        raise ProviderFallback({company: get_fallback_quote(company) for company in companies}, str(e))
+    
+    quotes = {}
+    failures = 0
+    for company in companies:
+        try:
+            rows = frame[company].dropna(subset=['Close'])
+            if len(rows) < 2:
+                raise ValueError('not enough price history')
+            
+            history = OHLCVSeries.from_frame(rows, YFINANCE_COLUMNS)
+            current_price = float(history.close[-1])
+            change_percent = (current_price - float(history.close[-2])) / float(history.close[-2]) * 100
+            
+            quotes[company] = {
+                'name': get_company_name(company),
+                'current_price': round(current_price, 2),
+                'change': round(change_percent, 2),
+                'volume': int(history.volume[-1]),
+                'historical_data': history.tail(30),
+                'timestamp': datetime.now().isoformat()
+            }
+            timeseries.append_stock_series(company, history)
+        except Exception as e:
+            print(f"Error fetching data for {company}: {str(e)}")
+            quotes[company] = get_fallback_quote(company)
+            failures += 1
+    if failures == len(companies):
+        # Nothing usable came back, which is a provider problem rather than a few bad symbols
+        raise ProviderFallback(quotes, 'No quotes in the batched download')
+    return quotes
+
+def get_company_name(company):
+    """Return a company's name from the watchlist, or looked up once and then cached long-term."""
+    name = get_symbol_names().get(company) or FALLBACK_DATA.get(company, {}).get('name')
+    if name:
+        return name
+    if not os.getenv('ALPHA_VANTAGE_API_KEY'):
+        return company
     
+    try:
+        return lookup_company_name(company)
+    except Exception as e:
+        print(f"Error fetching company overview for {company}: {str(e)}")
+        report_quota_error('alphavantage', e)
+        return company
+
+@cached('company_name', shared=True)
+def lookup_company_name(company):
+    """Look up a company's name on Alpha Vantage; failures raise so they are not cached."""
+    fd = get_alpha_vantage().fundamentaldata.FundamentalData(key=os.getenv('ALPHA_VANTAGE_API_KEY'),
+                                                            output_format='pandas')
+    # Do not hold up a batch of quotes waiting for a lookup token
+    acquire('alphavantage', max_wait=0)
+    with upstream_call('alphavantage'):
+        overview, _ = fd.get_company_overview(symbol=company)
+    return overview['Name'].iloc[0]
+
+@cached('stock_quote', shared=True)
+def get_stock_quote(company):
+    """Fetch the current quote, name and history for a single company."""
     api_key = os.getenv('ALPHA_VANTAGE_API_KEY')
     if not api_key:
-        print("Alpha Vantage API key not found. Using simulated data.")
-        return get_simulated_data(companies, fallback_data)
+        return get_simulated_data([company], FALLBACK_DATA)[company]
     
     try:
-        ts = TimeSeries(key=api_key, output_format='pandas')
-        fd = FundamentalData(key=api_key, output_format='pandas')
+        ts = get_alpha_vantage().timeseries.TimeSeries(key=api_key, output_format='pandas')
+        
+        # Get real-time quote
+        acquire('alphavantage')
+        with upstream_call('alphavantage'):
+            data, meta_data = ts.get_quote_endpoint(symbol=company)
+        
+        # Use iloc for position-based access and handle percentage conversion properly
+        current_price = float(data['05. price'].iloc[0])
+        change_percent_str = data['10. change percent'].iloc[0]
+        change_percent = float(change_percent_str.strip('%'))
+        volume = int(data['06. volume'].iloc[0])
+        
+        # Get historical data
+        historical_data = get_historical_stock_data(company)
+        
+        return {
+            'name': get_company_name(company),
+            'current_price': current_price,
+            'change': change_percent,
+            'volume': volume,
+            'historical_data': historical_data,
+            'timestamp': datetime.now().isoformat()
+        }
         
-        for company in companies:
-            try:
-                # Get real-time quote
-                data, meta_data = ts.get_quote_endpoint(symbol=company)
-                
-                # Use iloc for position-based access and handle percentage conversion properly
-                current_price = float(data['05. price'].iloc[0])
-                change_percent_str = data['10. change percent'].iloc[0]
-                change_percent = float(change_percent_str.strip('%'))
-                volume = int(data['06. volume'].iloc[0])
-                
-                # Get company overview
-                overview, _ = fd.get_company_overview(symbol=company)
-                company_name = overview['Name'].iloc[0]
-                
-                # Get historical data
-                historical_data = get_historical_stock_data(company)
-                
-                stock_data[company] = {
-                    'name': company_name,
-                    'current_price': current_price,
-                    'change': change_percent,
-                    'volume': volume,
-                    'historical_data': historical_data,
-                    'timestamp': datetime.now().isoformat()
-                }
-                
-                # Add a small delay to avoid hitting API rate limits
-                time.sleep(0.2)
-                
-            except Exception as e:
-                print(f"Error fetching data for {company}: {str(e)}")
-                stock_data[company] = {
-                    'name': fallback_data[company]['name'],
-                    'current_price': fallback_data[company]['current_price'],
-                    'change': fallback_data[company]['change'],
-                    'volume': fallback_data[company]['volume'],
-                    'historical_data': get_simulated_historical_data(company, 30),
-                    'timestamp': datetime.now().isoformat(),
-                    'note': 'Using fallback data due to API issues'
-                }
-                
     except Exception as e:
-        print(f"Error initializing Alpha Vantage: {str(e)}")
-        return get_simulated_data(companies, fallback_data)
-    
-    return stock_data
+        print(f"Error fetching data for {company}: {str(e)}")
+        report_quota_error('alphavantage', e)
+        raise ProviderFallback(get_fallback_quote(company), str(e))
+
+def get_fallback_entry(company):
+    """Return the fallback name, price, change and volume for any symbol."""
+    entry = FALLBACK_DATA.get(company)
+    if entry is None:
+        entry = dict(DEFAULT_FALLBACK, name=get_symbol_names().get(company, company))
+    return entry
+
+def get_fallback_quote(company):
+    """Return the static fallback quote for a company."""
+    record_fallback('stock_quote')
+    fallback = get_fallback_entry(company)
+    return {
+        'name': fallback['name'],
+        'current_price': fallback['current_price'],
+        'change': fallback['change'],
+        'volume': fallback['volume'],
+        'historical_data': get_simulated_historical_data(company, 30),
+        'timestamp': datetime.now().isoformat(),
+        'note': 'Using fallback data due to API issues'
+    }
 
 def get_simulated_data(companies, fallback_data):
     """Generate simulated stock data when API is unavailable"""
     stock_data = {}
     for company in companies:
-        try:
-            base_price = fallback_data[company]['current_price']
-            price_change = random.uniform(-0.02, 0.02)
-            new_price = base_price * (1 + price_change)
-            
-            base_volume = fallback_data[company]['volume']
-            volume_change = random.uniform(-0.1, 0.1)
-            new_volume = int(base_volume * (1 + volume_change))
-            
-            stock_data[company] = {
-                'name': fallback_data[company]['name'],
-                'current_price': round(new_price, 2),
-                'change': round(price_change * 100, 2),
-                'volume': new_volume,
-                'timestamp': datetime.now().isoformat(),
-                'note': 'Using simulated data due to API issues'
-            }
-        except Exception as e:
-            print(f"Error generating data for {company}: {str(e)}")
-            stock_data[company] = {
-                'name': fallback_data[company]['name'],
-                'current_price': fallback_data[company]['current_price'],
-                'change': fallback_data[company]['change'],
-                'volume': fallback_data[company]['volume'],
-                'timestamp': datetime.now().isoformat(),
-                'note': 'Using fallback data'
-            }
-    return stock_data 
\ No newline at end of file
+        fallback = fallback_data.get(company) or get_fallback_entry(company)
+        record_fallback('stock_quote')
+        price, change, volume = simulate_quote(company, fallback['current_price'], fallback['volume'])
+        stock_data[company] = {
+            'name': fallback['name'],
+            'current_price': price,
+            'change': change,
+            'volume': volume,
+            'timestamp': datetime.now().isoformat(),
+            'note': 'Using simulated data due to API issues'
+        }
+    return stock_data
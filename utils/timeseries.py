@@ -0,0 +1,114 @@
+import os
+from utils.series import OHLCVSeries
+from utils.sqlite import ThreadLocalSQLite
+
+# SQLite file holding daily stock bars and weather readings, kept across restarts
+TIMESERIES_DB_PATH = os.getenv('TIMESERIES_DB_PATH',
+                               os.path.join(os.path.dirname(os.path.dirname(__file__)), 'instance', 'timeseries.db'))
+
+STOCK_COLUMNS = ['date', 'open', 'high', 'low', 'close', 'volume']
+WEATHER_COLUMNS = ['date', 'temperature', 'condition', 'humidity', 'wind_speed', 'pressure', 'sol']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS stock_daily (
+    symbol TEXT NOT NULL,
+    date TEXT NOT NULL,
+    open REAL, high REAL, low REAL, close REAL, volume INTEGER,
+    PRIMARY KEY (symbol, date)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS weather_daily (
+    location TEXT NOT NULL,
+    date TEXT NOT NULL,
+    temperature REAL, condition TEXT, humidity REAL, wind_speed REAL, pressure REAL, sol TEXT,
+    PRIMARY KEY (location, date)
+) WITHOUT ROWID;
+"""
+
+class TimeSeriesStore:
+    """Daily stock and weather history keyed by (symbol/location, date).
+
+    Fetchers append only the days they have not stored yet, and reads are
+    range scans over the primary key, so charts never need the network for
+    days that are already on disk.
+    """
+
+    def __init__(self, path):
+        self._db = ThreadLocalSQLite(path, SCHEMA)
+        self._stock_listeners = []
+
+    def append_stock_series(self, symbol, series):
+        """Insert or update an OHLCVSeries; the latest day may still be moving intraday."""
+        if not series:
+            return
+        conn = self._db.connect()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO stock_daily (symbol, date, open, high, low, close, volume) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                ((symbol, *row) for row in series.rows()))
+        for listener in self._stock_listeners:
+            try:
+                listener(symbol, series)
+            except Exception as e:
+                print(f"Error updating after append for {symbol}: {str(e)}")
+
+    def on_stock_append(self, listener):
+        """Call listener(symbol, series) after every append_stock_series."""
+        self._stock_listeners.append(listener)
+
+    def read_stock_series(self, symbol, limit):
+        """Return the most recent `limit` daily bars for symbol as an OHLCVSeries."""
+        rows = self._db.connect().execute(
+            f"SELECT {', '.join(STOCK_COLUMNS)} FROM stock_daily WHERE symbol = ? ORDER BY date DESC LIMIT ?",
+            (symbol, limit)).fetchall()
+        rows.reverse()
+        return OHLCVSeries.from_rows(rows)
+
+    def last_stock_date(self, symbol):
+        return self._last_date('stock_daily', 'symbol', symbol)
+
+    def append_weather_days(self, location, rows):
+        self._upsert('weather_daily', 'location', location, WEATHER_COLUMNS, rows)
+
+    def read_weather_days(self, location, limit=None, start=None, end=None):
+        """Return weather readings for location, oldest first.
+
+        Either the most recent `limit` days, or every day between `start`
+        and `end` inclusive (dates as 'YYYY-MM-DD').
+        """
+        if limit is not None:
+            return self._read_latest('weather_daily', 'location', location, WEATHER_COLUMNS, limit)
+        rows = self._db.connect().execute(
+            f"SELECT {', '.join(WEATHER_COLUMNS)} FROM weather_daily "
+            "WHERE location = ? AND date BETWEEN ? AND ? ORDER BY date",
+            (location, start, end)).fetchall()
+        return [_to_record(WEATHER_COLUMNS, row) for row in rows]
+
+    def _upsert(self, table, key_column, key, columns, rows):
+        if not rows:
+            return
+        placeholders = ', '.join('?' for _ in range(len(columns) + 1))
+        values = [(key, *(row.get(column) for column in columns)) for row in rows]
+        conn = self._db.connect()
+        with conn:
+            conn.executemany(
+                f"INSERT OR REPLACE INTO {table} ({key_column}, {', '.join(columns)}) VALUES ({placeholders})",
+                values)
+
+    def _read_latest(self, table, key_column, key, columns, limit):
+        rows = self._db.connect().execute(
+            f"SELECT {', '.join(columns)} FROM {table} WHERE {key_column} = ? ORDER BY date DESC LIMIT ?",
+            (key, limit)).fetchall()
+        return [_to_record(columns, row) for row in reversed(rows)]
+
+    def _last_date(self, table, key_column, key):
+        row = self._db.connect().execute(
+            f"SELECT MAX(date) FROM {table} WHERE {key_column} = ?", (key,)).fetchone()
+        return row[0]
+
+def _to_record(columns, row):
+    # Leave out columns a source never provides (e.g. humidity on Mars)
+    return {column: value for column, value in zip(columns, row) if value is not None}
+
+# The time-series store shared by the stock and weather fetchers
+timeseries = TimeSeriesStore(TIMESERIES_DB_PATH)
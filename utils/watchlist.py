@@ -0,0 +1,206 @@
+import os
+import re
+import time
+from utils.cache import cached
+from utils.sqlite import ThreadLocalSQLite
+
+# Symbols shown when neither the environment nor the database configures a watchlist
+DEFAULT_WATCHLIST = ['SPCE', 'BA', 'LMT', 'NOC', 'RTX']
+
+# Shared watchlist as comma-separated "SYMBOL" or "SYMBOL:Company Name" entries
+STOCK_WATCHLIST = os.getenv('STOCK_WATCHLIST', '')
+
+# Optional file with one "SYMBOL" or "SYMBOL,Company Name" entry per line
+STOCK_WATCHLIST_FILE = os.getenv('STOCK_WATCHLIST_FILE')
+
+# SQLite file holding the symbol directory and every user's watchlist
+WATCHLIST_DB_PATH = os.getenv('WATCHLIST_DB_PATH',
+                              os.path.join(os.path.dirname(os.path.dirname(__file__)), 'instance', 'watchlists.db'))
+
+# Most symbols a single user can keep on their watchlist besides the shared ones
+MAX_WATCHLIST_SIZE = int(os.getenv('MAX_WATCHLIST_SIZE', 500))
+
+# Most symbols besides the shared ones a session can save before its browser has returned the session cookie
+MAX_ANONYMOUS_WATCHLIST_SIZE = int(os.getenv('MAX_ANONYMOUS_WATCHLIST_SIZE', 25))
+
+# Most symbols prefetched in total; the shared list always is, then the most recently used watchlists'
+MAX_TRACKED_SYMBOLS = int(os.getenv('MAX_TRACKED_SYMBOLS', 100))
+
+# Days a watchlist is kept (and prefetched) after its user was last seen
+WATCHLIST_EXPIRY_DAYS = float(os.getenv('WATCHLIST_EXPIRY_DAYS', 30))
+
+# Seconds between updates of a user's last-seen time, so reads rarely write
+WATCHLIST_TOUCH_INTERVAL = 3600
+
+SYMBOL_PATTERN = re.compile(r'^[A-Z0-9][A-Z0-9.\-^=]{0,14}$')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS symbols (
+    symbol TEXT PRIMARY KEY,
+    name TEXT
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS user_symbols (
+    user_id TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (user_id, symbol)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS user_watchlists (
+    user_id TEXT PRIMARY KEY,
+    last_seen REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS user_watchlists_last_seen ON user_watchlists (last_seen);
+"""
+
+def normalize_symbol(symbol):
+    """Return symbol in canonical upper case, or raise ValueError if it is not a ticker."""
+    symbol = symbol.strip().upper()
+    if not SYMBOL_PATTERN.match(symbol):
+        raise ValueError(f"'{symbol}' is not a valid ticker symbol")
+    return symbol
+
+def parse_watchlist(entries, separator):
+    """Parse "SYMBOL" / "SYMBOL<separator>Name" entries into an ordered dict of symbol -> name."""
+    watchlist = {}
+    for entry in entries:
+        symbol, _, name = entry.partition(separator)
+        if not symbol.strip() or symbol.strip().startswith('#'):
+            continue
+        try:
+            watchlist[normalize_symbol(symbol)] = name.strip() or None
+        except ValueError as e:
+            print(f"Skipping watchlist entry: {str(e)}")
+    return watchlist
+
+def load_configured_watchlist():
+    """Return the watchlist configured through STOCK_WATCHLIST and STOCK_WATCHLIST_FILE."""
+    watchlist = parse_watchlist(STOCK_WATCHLIST.split(','), ':')
+    if STOCK_WATCHLIST_FILE:
+        try:
+            with open(STOCK_WATCHLIST_FILE) as f:
+                watchlist.update(parse_watchlist(f, ','))
+        except OSError as e:
+            print(f"Error reading watchlist file: {str(e)}")
+    return watchlist
+
+class WatchlistStore:
+    """Shared symbol directory and per-user watchlists kept in SQLite."""
+
+    def __init__(self, path):
+        self._db = ThreadLocalSQLite(path, SCHEMA)
+
+    def add_symbols(self, names):
+        """Add symbol -> name entries to the shared directory."""
+        conn = self._db.connect()
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO symbols (symbol, name) VALUES (?, ?)", names.items())
+
+    def list_symbols(self):
+        return [row[0] for row in self._db.connect().execute("SELECT symbol FROM symbols ORDER BY symbol")]
+
+    def get_names(self):
+        return dict(self._db.connect().execute("SELECT symbol, name FROM symbols WHERE name IS NOT NULL"))
+
+    def get_user_symbols(self, user_id):
+        """Return the user's saved watchlist in order (possibly empty), or None if they never saved one.
+
+        Also records that the user was seen, at most once per WATCHLIST_TOUCH_INTERVAL.
+        """
+        conn = self._db.connect()
+        row = conn.execute("SELECT last_seen FROM user_watchlists WHERE user_id = ?", (user_id,)).fetchone()
+        rows = conn.execute(
+            "SELECT symbol FROM user_symbols WHERE user_id = ? ORDER BY position", (user_id,)).fetchall()
+        if row is None and not rows:
+            return None
+        now = time.time()
+        # Watchlists saved before last-seen times were kept have no row yet
+        if row is None or now - row[0] > WATCHLIST_TOUCH_INTERVAL:
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO user_watchlists (user_id, last_seen) VALUES (?, ?)",
+                             (user_id, now))
+        return [row[0] for row in rows]
+
+    def set_user_symbols(self, user_id, symbols):
+        conn = self._db.connect()
+        with conn:
+            conn.execute("DELETE FROM user_symbols WHERE user_id = ?", (user_id,))
+            conn.executemany("INSERT INTO user_symbols (user_id, symbol, position) VALUES (?, ?, ?)",
+                             ((user_id, symbol, position) for position, symbol in enumerate(symbols)))
+            conn.execute("INSERT OR REPLACE INTO user_watchlists (user_id, last_seen) VALUES (?, ?)",
+                         (user_id, time.time()))
+
+    def list_user_symbols(self, since, limit):
+        """Return up to limit symbols on watchlists seen since `since`, the most recently used ones first."""
+        return [row[0] for row in self._db.connect().execute(
+            "SELECT symbol FROM user_symbols JOIN user_watchlists USING (user_id) WHERE last_seen >= ? "
+            "GROUP BY symbol ORDER BY MAX(last_seen) DESC, symbol LIMIT ?", (since, limit))]
+
+    def prune(self, before):
+        """Delete the watchlists of users last seen before `before`."""
+        conn = self._db.connect()
+        with conn:
+            conn.execute("DELETE FROM user_symbols WHERE user_id IN "
+                         "(SELECT user_id FROM user_watchlists WHERE last_seen < ?)", (before,))
+            conn.execute("DELETE FROM user_watchlists WHERE last_seen < ?", (before,))
+
+# The watchlist store shared by the routes and the prefetch scheduler
+watchlists = WatchlistStore(WATCHLIST_DB_PATH)
+
+_configured = load_configured_watchlist()
+
+# The watchlist caches only save database reads, which each worker does as cheaply as a shared lookup
+@cached('watchlist')
+def get_watchlist():
+    """Return the shared watchlist: configured symbols, else the database directory, else the defaults."""
+    if _configured:
+        return list(_configured)
+    return watchlists.list_symbols() or list(DEFAULT_WATCHLIST)
+
+@cached('watchlist')
+def get_tracked_symbols():
+    """Return every symbol the dashboard prefetches quotes for.
+
+    That is the shared list plus the symbols of watchlists seen in the last
+    WATCHLIST_EXPIRY_DAYS, most recently used first, up to MAX_TRACKED_SYMBOLS
+    in total. The dashboard fetches symbols left out for the request that
+    shows them (see utils/dashboard.py).
+    """
+    cutoff = time.time() - WATCHLIST_EXPIRY_DAYS * 86400
+    watchlists.prune(cutoff)
+    tracked = dict.fromkeys(get_watchlist())
+    for symbol in watchlists.list_user_symbols(cutoff, MAX_TRACKED_SYMBOLS):
+        if len(tracked) >= MAX_TRACKED_SYMBOLS:
+            break
+        tracked.setdefault(symbol)
+    return list(tracked)
+
+@cached('watchlist')
+def get_symbol_names():
+    """Return company names known from the watchlist configuration and directory."""
+    names = watchlists.get_names()
+    names.update({symbol: name for symbol, name in _configured.items() if name})
+    return names
+
+def get_user_watchlist(user_id):
+    """Return the user's own watchlist, or the shared one if they have not saved any."""
+    symbols = watchlists.get_user_symbols(user_id)
+    return get_watchlist() if symbols is None else symbols
+
+def set_user_watchlist(user_id, symbols, max_size=MAX_WATCHLIST_SIZE):
+    """Replace the user's watchlist, dropping duplicates; an empty list is kept as such.
+
+    Raises ValueError for bad symbols or more than max_size symbols that are
+    not on the shared watchlist, which a new user's list starts from.
+    """
+    symbols = list(dict.fromkeys(normalize_symbol(symbol) for symbol in symbols))
+    shared = set(get_watchlist())
+    if sum(symbol not in shared for symbol in symbols) > max_size:
+        raise ValueError(f"A watchlist can hold at most {max_size} symbols besides the shared ones")
+    watchlists.set_user_symbols(user_id, symbols)
+    get_tracked_symbols.cache.clear()
+    return symbols
+
+def page_symbols(symbols, page, per_page):
+    """Return the symbols on a 1-based page."""
+    start = (page - 1) * per_page
+    return symbols[start:start + per_page]
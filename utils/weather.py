@@ -1,189 +1,283 @@
 from datetime import datetime, timedelta
-import random
 import os
-import requests
+import threading
 from typing import Dict, List, Any
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from utils.concurrency import Task, run_concurrently, gather_concurrently, PROVIDER_TIMEOUTS
+from utils.cache import cached, ProviderFallback
+from utils.http import http_get
+from utils.timeseries import timeseries
+from utils.simulation import simulate_days, date_strings
+from utils.metrics import record_fallback
 
 load_dotenv()
 
 # NASA API key - Get one from https://api.nasa.gov/
 NASA_API_KEY = os.getenv('NASA_API_KEY', 'DEMO_KEY')  # DEMO_KEY has limited requests
 
-def get_historical_weather_data(location: str, days: int = 7) -> List[Dict[str, Any]]:
-    """Fetch historical weather data for the specified location"""
-    api_key = os.getenv('OPENWEATHER_API_KEY')
-    if not api_key:
-        return get_simulated_historical_weather(location, days)
-    
-    try:
-        # Get coordinates for the location
-        geo_url = f"http://api.openweathermap.org/geo/1.0/direct?q={location}&limit=1&appid={api_key}"
-        geo_response = requests.get(geo_url)
-        geo_data = geo_response.json()
-        
-        if not geo_data:
-            raise Exception(f"Location {location} not found")
-        
-        lat, lon = geo_data[0]['lat'], geo_data[0]['lon']
-        
-        # Get historical data
-        historical_data = []
-        for i in range(days):
-            date = datetime.now() - timedelta(days=i)
-            timestamp = int(date.timestamp())
-            
-            url = f"https://api.openweathermap.org/data/2.5/onecall/timemachine?lat={lat}&lon={lon}&dt={timestamp}&units=metric&appid={api_key}"
-            response = requests.get(url)
-            data = response.json()
-            
-            if 'current' in data:
-                historical_data.append({
-                    'date': date.strftime('%Y-%m-%d'),
-                    'temperature': round(data['current']['temp'], 1),
-                    'condition': data['current']['weather'][0]['main'],
-                    'humidity': data['current']['humidity'],
-                    'wind_speed': round(data['current']['wind_speed'], 1)
-                })
-        
-        return historical_data
-        
-    except Exception as e:
-        print(f"Error fetching historical weather data: {str(e)}")
-        return get_simulated_historical_weather(location, days)
-
-def get_simulated_historical_weather(location: str, days: int) -> List[Dict[str, Any]]:
-    """Generate simulated historical weather data"""
-    base_temp = 20 if location.lower() == 'earth' else -63
-    base_humidity = 65 if location.lower() == 'earth' else 0
-    base_wind = 10 if location.lower() == 'earth' else 30
+# Provider base URLs; point them at local stand-ins (see bench/) to run offline
+OPENWEATHER_BASE_URL = os.getenv('OPENWEATHER_BASE_URL', 'https://api.openweathermap.org').rstrip('/')
+NASA_API_BASE_URL = os.getenv('NASA_API_BASE_URL', 'https://api.nasa.gov').rstrip('/')
+
+# NASA InSight Mars weather feed
+INSIGHT_WEATHER_URL = f"{NASA_API_BASE_URL}/insight_weather/"
+INSIGHT_WEATHER_PARAMS = {'api_key': NASA_API_KEY, 'feedtype': 'json', 'ver': '1.0'}
+
+# Number of stored sols shown in the Mars history chart
+MARS_HISTORY_SOLS = int(os.getenv('MARS_HISTORY_SOLS', 30))
+
+# City whose weather stands for Earth's on the dashboard
+EARTH_CITY = 'New York'
+
+# Number of days shown in the Earth history chart
+EARTH_HISTORY_DAYS = int(os.getenv('EARTH_HISTORY_DAYS', 7))
+
+# Upper bound on concurrent OpenWeatherMap requests for one history window
+WEATHER_HISTORY_WORKERS = int(os.getenv('WEATHER_HISTORY_WORKERS', 4))
+_history_executor = ThreadPoolExecutor(max_workers=WEATHER_HISTORY_WORKERS, thread_name_prefix='weather-history')
+
+def get_historical_location_weather(location: str, days: int = 7) -> List[Dict[str, Any]]:
+    """Fetch the last `days` days of weather at a location from OpenWeatherMap, newest first.
+
+    Raises if the location cannot be geocoded or no day could be fetched.
+    """
+    lat, lon = geocode_location(location)
     
-    conditions = ['Sunny', 'Partly Cloudy', 'Clear'] if location.lower() == 'earth' else ['Dusty', 'Clear', 'Dust Storm']
+    # Past days are final, so any already in the local store are reused and
+    # only the missing ones (plus today) are fetched, all at once
+    today = datetime.now().strftime('%Y-%m-%d')
+    dates = [(datetime.now() - timedelta(days=i)).strftime('%Y-%m-%d') for i in range(days)]
+    stored = {day['date']: day for day in timeseries.read_weather_days(location.lower(), start=dates[-1], end=dates[0])}
+    futures = []
+    for date in dates:
+        if date != today and date in stored:
+            continue
+        futures.append((date, _history_executor.submit(fetch_weather_day, lat, lon, date)))
     
-    historical_data = []
-    for i in range(days):
-        date = datetime.now() - timedelta(days=i)
-        temp_change = random.uniform(-2, 2)
-        humidity_change = random.uniform(-5, 5)
-        wind_change = random.uniform(-2, 2)
-        
-        historical_data.append({
-            'date': date.strftime('%Y-%m-%d'),
-            'temperature': round(base_temp + temp_change, 1),
-            'condition': random.choice(conditions),
-            'humidity': round(base_humidity + humidity_change),
-            'wind_speed': round(base_wind + wind_change, 1)
-        })
+    fetched = {}
+    for date, future in futures:
+        try:
+            fetched[date] = future.result()
+        except Exception as e:
+            print(f"Error fetching weather for {location} on {date}: {str(e)}")
+    timeseries.append_weather_days(location.lower(), [day for date, day in fetched.items() if date != today])
     
+    historical_data = [fetched.get(date) or stored[date] for date in dates if date in fetched or date in stored]
+    if not historical_data:
+        raise Exception(f"No historical weather available for {location}")
     return historical_data
 
-def get_weather_data():
-    """Get current weather data for Earth and Mars."""
-    weather_data = {}
+@cached('geocode', shared=True)
+def geocode_location(location: str):
+    """Return the (lat, lon) of a location; results are memoized since places do not move."""
+    api_key = os.getenv('OPENWEATHER_API_KEY')
+    geo_url = f"{OPENWEATHER_BASE_URL}/geo/1.0/direct"
+    geo_response = http_get('openweathermap', geo_url,
+                            params={'q': location, 'limit': 1, 'appid': api_key})
+    geo_data = geo_response.json()
+    
+    if not geo_data:
+        raise Exception(f"Location {location} not found")
+    
+    return geo_data[0]['lat'], geo_data[0]['lon']
+
+def fetch_weather_day(lat: float, lon: float, date: str) -> Dict[str, Any]:
+    """Fetch the weather at a location on a given day from the OpenWeatherMap timemachine."""
+    api_key = os.getenv('OPENWEATHER_API_KEY')
+    if date == datetime.now().strftime('%Y-%m-%d'):
+        moment = datetime.now()
+    else:
+        moment = datetime.strptime(date, '%Y-%m-%d') + timedelta(hours=12)
     
-    # Get Earth weather
-    weather_data['earth'] = get_earth_weather()
+    url = f"{OPENWEATHER_BASE_URL}/data/2.5/onecall/timemachine"
+    response = http_get('openweathermap', url,
+                        params={'lat': lat, 'lon': lon, 'dt': int(moment.timestamp()), 'units': 'metric', 'appid': api_key})
+    data = response.json()
     
-    # Get Mars weather
-    weather_data['mars'] = get_mars_weather()
+    if 'current' not in data:
+        raise Exception(data.get('message', 'No weather data returned'))
     
-    return weather_data
+    return {
+        'date': date,
+        'temperature': round(data['current']['temp'], 1),
+        'condition': data['current']['weather'][0]['main'],
+        'humidity': data['current']['humidity'],
+        'wind_speed': round(data['current']['wind_speed'], 1)
+    }
+
+def get_weather_data():
+    """Get current weather data for Earth and Mars."""
+    # Fetch both planets at the same time; a planet that misses its
+    # deadline gets its simulated payload instead
+    return run_concurrently(get_weather_tasks())
+
+async def async_get_weather_data():
+    """Coroutine version of get_weather_data for the async server."""
+    return await gather_concurrently(get_weather_tasks())
 
+def get_weather_tasks():
+    """Return the fetch tasks for current Earth and Mars weather."""
+    return {
+        'earth': Task(get_earth_weather,
+                      lambda: get_simulated_earth_weather('Using simulated data (OpenWeatherMap API timed out)'),
+                      PROVIDER_TIMEOUTS['weather'], get_earth_weather.aio),
+        'mars': Task(get_mars_weather,
+                     lambda: get_simulated_mars_weather('Using simulated Mars data (NASA API timed out)'),
+                     PROVIDER_TIMEOUTS['weather'], get_mars_weather.aio)
+    }
+
+def get_simulated_earth_weather(note):
+    """Return the simulated current Earth weather payload."""
+    record_fallback('earth_weather')
+    return {
+        'temperature': 20,
+        'condition': 'Sunny',
+        'humidity': 65,
+        'wind_speed': 10,
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'note': note
+    }
+
+def get_simulated_mars_weather(note):
+    """Return the simulated current Mars weather payload."""
+    record_fallback('mars_weather')
+    return {
+        'temperature': -63,
+        'condition': 'Clear',
+        'humidity': 0,
+        'wind_speed': 7,
+        'pressure': 700,
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'note': note
+    }
+
+@cached('earth_weather', shared=True)
 def get_earth_weather():
     """Get current weather data for Earth using OpenWeatherMap API."""
     try:
         api_key = os.getenv('OPENWEATHER_API_KEY')
         if not api_key:
-            return {
-                'temperature': 20,
-                'condition': 'Sunny',
-                'humidity': 65,
-                'wind_speed': 10,
-                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'note': 'Using simulated data (OpenWeatherMap API key not found)'
-            }
+            return get_simulated_earth_weather('Using simulated data (OpenWeatherMap API key not found)')
         
-        # Get weather for a specific location (e.g., New York)
-        city = "New York"
-        url = f"http://api.openweathermap.org/data/2.5/weather?q={city}&appid={api_key}&units=metric"
-        response = requests.get(url)
+        city = EARTH_CITY
+        url = f"{OPENWEATHER_BASE_URL}/data/2.5/weather"
+        response = http_get('openweathermap', url,
+                            params={'q': city, 'appid': api_key, 'units': 'metric'})
         data = response.json()
         
-        if response.status_code == 200:
-            return {
-                'temperature': round(data['main']['temp']),
-                'condition': data['weather'][0]['main'],
-                'humidity': data['main']['humidity'],
-                'wind_speed': round(data['wind']['speed'] * 3.6),  # Convert m/s to km/h
-                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            }
-        else:
-            return {
-                'temperature': 20,
-                'condition': 'Sunny',
-                'humidity': 65,
-                'wind_speed': 10,
-                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'note': f'Error fetching weather data: {data.get("message", "Unknown error")}'
-            }
-    except Exception as e:
+        if response.status_code != 200:
+            raise Exception(f'Error fetching weather data: {data.get("message", "Unknown error")}')
         return {
-            'temperature': 20,
-            'condition': 'Sunny',
-            'humidity': 65,
-            'wind_speed': 10,
-            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'note': f'Error: {str(e)}'
+            'temperature': round(data['main']['temp']),
+            'condition': data['weather'][0]['main'],
+            'humidity': data['main']['humidity'],
+            'wind_speed': round(data['wind']['speed'] * 3.6),  # Convert m/s to km/h
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         }
+    except Exception as e:
+        # Cached briefly; the last real reading is served instead if there is one
+        raise ProviderFallback(get_simulated_earth_weather(f'Error: {str(e)}'), str(e))
 
+@cached('mars_weather', shared=True)
 def get_mars_weather():
     """Get current weather data for Mars using NASA's InSight API."""
     try:
-        url = f"https://api.nasa.gov/insight_weather/?api_key={NASA_API_KEY}&feedtype=json&ver=1.0"
-        response = requests.get(url)
-        data = response.json()
+        load_mars_feed()
+        record = mars_store.latest()
         
-        if response.status_code == 200 and 'sol_keys' in data:
-            # Get the most recent sol (Martian day)
-            latest_sol = data['sol_keys'][-1]
-            sol_data = data[latest_sol]
-            
-            # Convert temperature from Celsius to Fahrenheit and back to Celsius
-            # (NASA provides data in Fahrenheit)
+        if not record:
+            raise Exception('No sols in the InSight feed')
+        return {
+            'temperature': record['temperature'],
+            'condition': 'Clear',  # Mars weather is typically clear
+            'humidity': 0,  # Mars has very low humidity
+            'wind_speed': record['wind_speed'],
+            'pressure': record['pressure'],  # Pressure in Pa
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'sol': record['sol'],  # Martian day
+            'note': 'Data from NASA InSight Mission'
+        }
+    except Exception as e:
+        raise ProviderFallback(get_simulated_mars_weather(f'Using simulated Mars data (API limit reached or error: {str(e)})'),
+                               str(e))
+
+class MarsWeatherStore:
+    """Per-sol records parsed from the NASA InSight feed.
+
+    Current and historical Mars weather are both answered from this table,
+    and the table is only rebuilt when the feed's set of sols changes.
+    """
+
+    def __init__(self):
+        self.sols = ()
+        self.records = []
+        self.version = 0
+        self._lock = threading.Lock()
+
+    def update(self, data):
+        """Fold a downloaded feed into the store; returns True if the sols changed."""
+        sols = tuple(data['sol_keys'])
+        with self._lock:
+            if sols == self.sols:
+                return False
+        
+        records = []
+        for index, sol in enumerate(sols):
+            sol_data = data[sol]
+            # Convert temperature from Fahrenheit to Celsius
             temp_f = (sol_data['AT']['av'] + sol_data['AT']['mn'] + sol_data['AT']['mx']) / 3
             temp_c = (temp_f - 32) * 5/9
             
-            return {
+            # Earth date the sol started on; count back from today if the feed omits it
+            if sol_data.get('First_UTC'):
+                earth_date = sol_data['First_UTC'][:10]
+            else:
+                earth_date = (datetime.now() - timedelta(days=len(sols) - 1 - index)).strftime('%Y-%m-%d')
+            
+            records.append({
+                'date': earth_date,
                 'temperature': round(temp_c, 1),
-                'condition': 'Clear',  # Mars weather is typically clear
-                'humidity': 0,  # Mars has very low humidity
                 'wind_speed': round(sol_data['HWS']['av'] * 3.6, 1),  # Convert m/s to km/h
-                'pressure': round(sol_data['PRE']['av'], 1),  # Pressure in Pa
-                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'sol': latest_sol,  # Martian day
-                'note': 'Data from NASA InSight Mission'
-            }
-        else:
-            return {
-                'temperature': -63,
-                'condition': 'Clear',
-                'humidity': 0,
-                'wind_speed': 7,
-                'pressure': 700,
-                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'note': 'Using simulated Mars data (API limit reached or error)'
-            }
-    except Exception as e:
-        return {
-            'temperature': -63,
-            'condition': 'Clear',
-            'humidity': 0,
-            'wind_speed': 7,
-            'pressure': 700,
-            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'note': f'Error: {str(e)}'
-        }
+                'pressure': round(sol_data['PRE']['av'], 1),
+                'sol': sol
+            })
+        
+        with self._lock:
+            self.sols = sols
+            self.records = records
+            self.version += 1
+        return True
+
+    def latest(self):
+        """Return the record for the most recent sol, or None if the feed had none."""
+        with self._lock:
+            return self.records[-1] if self.records else None
+
+    def history(self):
+        """Return the records for every sol in the feed, oldest first."""
+        with self._lock:
+            return list(self.records)
 
+# The Mars weather table shared by the current and historical views
+mars_store = MarsWeatherStore()
+
+# Loading fills this process's mars_store, so every worker has to run it
+@cached('mars_feed')
+def load_mars_feed():
+    """Download the InSight feed into mars_store and return the store's version."""
+    response = http_get('nasa', INSIGHT_WEATHER_URL, params=INSIGHT_WEATHER_PARAMS)
+    data = response.json()
+    
+    if response.status_code != 200 or 'sol_keys' not in data:
+        raise Exception(data.get('error', {}).get('message', 'InSight feed unavailable'))
+    
+    if mars_store.update(data):
+        timeseries.append_weather_days('mars', mars_store.history())
+    return mars_store.version
+
+# Earth's history fills the local time-series store, so results are only shared on this host
+@cached('weather_history', shared='host')
 def get_historical_weather_data(planet):
     """Get historical weather data for the specified planet."""
     if planet.lower() == 'mars':
@@ -194,58 +288,55 @@ def get_historical_weather_data(planet):
 def get_historical_mars_weather():
     """Get historical weather data for Mars using NASA's InSight API."""
     try:
-        url = f"https://api.nasa.gov/insight_weather/?api_key={NASA_API_KEY}&feedtype=json&ver=1.0"
-        response = requests.get(url)
-        data = response.json()
-        
-        if response.status_code == 200 and 'sol_keys' in data:
-            historical_data = []
-            for sol in data['sol_keys']:
-                sol_data = data[sol]
-                # Convert temperature from Fahrenheit to Celsius
-                temp_f = (sol_data['AT']['av'] + sol_data['AT']['mn'] + sol_data['AT']['mx']) / 3
-                temp_c = (temp_f - 32) * 5/9
-                
-                # Calculate Earth date from sol
-                earth_date = datetime.now() - timedelta(days=len(data['sol_keys']) - int(sol))
-                
-                historical_data.append({
-                    'date': earth_date.strftime('%Y-%m-%d'),
-                    'temperature': round(temp_c, 1),
-                    'wind_speed': round(sol_data['HWS']['av'] * 3.6, 1),  # Convert m/s to km/h
-                    'pressure': round(sol_data['PRE']['av'], 1),
-                    'sol': sol
-                })
-            return historical_data
-        else:
-            return generate_simulated_mars_data()
+        load_mars_feed()
     except Exception as e:
         print(f"Error fetching Mars historical data: {e}")
-        return generate_simulated_mars_data()
+        # Sols stored by earlier downloads are still real, just not updated
+        stored = timeseries.read_weather_days('mars', limit=MARS_HISTORY_SOLS)
+        raise ProviderFallback(stored or generate_simulated_mars_data(), str(e))
+    
+    # Read from the local store, which keeps sols that have left the feed's window
+    historical_data = timeseries.read_weather_days('mars', limit=MARS_HISTORY_SOLS)
+    if not historical_data:
+        raise ProviderFallback(generate_simulated_mars_data(), 'No Mars sols stored')
+    return historical_data
 
 def get_historical_earth_weather():
-    """Get historical weather data for Earth."""
-    # Generate simulated data for the past 7 days
-    historical_data = []
-    for i in range(7):
-        date = datetime.now() - timedelta(days=i)
-        historical_data.append({
-            'date': date.strftime('%Y-%m-%d'),
-            'temperature': random.uniform(15, 25),
-            'humidity': random.uniform(60, 80),
-            'wind_speed': random.uniform(5, 15)
-        })
-    return historical_data
+    """Get historical weather data for Earth: the last EARTH_HISTORY_DAYS days in EARTH_CITY."""
+    if not os.getenv('OPENWEATHER_API_KEY'):
+        return generate_simulated_earth_data()
+    try:
+        return get_historical_location_weather(EARTH_CITY, EARTH_HISTORY_DAYS)
+    except Exception as e:
+        print(f"Error fetching Earth historical data: {str(e)}")
+        # Days stored by earlier fetches are still real, just not updated
+        stored = timeseries.read_weather_days(EARTH_CITY.lower(), limit=EARTH_HISTORY_DAYS)
+        raise ProviderFallback(stored or generate_simulated_earth_data(), str(e))
+
+def generate_simulated_earth_data():
+    """Generate simulated historical weather data for Earth."""
+    record_fallback('earth_history')
+    return simulated_history('earth', {
+        'temperature': (15, 25),
+        'humidity': (60, 80),
+        'wind_speed': (5, 15)
+    }, EARTH_HISTORY_DAYS)
 
 def generate_simulated_mars_data():
     """Generate simulated historical weather data for Mars."""
+    record_fallback('mars_history')
+    return simulated_history('mars', {
+        'temperature': (-80, -40),  # Mars temperatures
+        'wind_speed': (5, 15),
+        'pressure': (600, 800)  # Mars pressure in Pa
+    })
+
+def simulated_history(planet, ranges, days=7):
+    """Return a reproducible simulated week for planet, newest day first."""
+    dates, values = simulate_days('weather_history', planet, days, ranges)
     historical_data = []
-    for i in range(7):
-        date = datetime.now() - timedelta(days=i)
-        historical_data.append({
-            'date': date.strftime('%Y-%m-%d'),
-            'temperature': random.uniform(-80, -40),  # Mars temperatures
-            'wind_speed': random.uniform(5, 15),
-            'pressure': random.uniform(600, 800)  # Mars pressure in Pa
-        })
-    return historical_data 
\ No newline at end of file
+    for i, date in enumerate(date_strings(dates)):
+        day = {'date': date}
+        day.update({field: float(column[i]) for field, column in values.items()})
+        historical_data.append(day)
+    return historical_data[::-1]